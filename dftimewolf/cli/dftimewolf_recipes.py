@@ -3,49 +3,51 @@
 """dftimewolf main entrypoint."""
 
 import argparse
+import hashlib
 import logging
-# Some AttributeErrors occured when trying to access logging.handlers, so
-# we import them separately
-from logging import handlers
 import os
 import signal
 import sys
 
-# Make dftimewolf faster by only importing modules if we're not actually
-# just asking for help
-_ASKING_FOR_HELP = '-h' in sys.argv or '--help' in sys.argv or len(sys.argv) < 2
-
-# pylint: disable=wrong-import-position
 from dftimewolf import config
 
 from dftimewolf.lib import errors
 from dftimewolf.lib import utils
-
-if not _ASKING_FOR_HELP:
-  # Import the collector modules.
-  # These will be registered automatically upon import
-  # pylint: disable=unused-import
-  from dftimewolf.lib import collectors
-  from dftimewolf.lib.collectors import aws
-  from dftimewolf.lib.collectors import filesystem
-  from dftimewolf.lib.collectors import gcloud
-  from dftimewolf.lib.collectors import gcp_logging
-  from dftimewolf.lib.collectors import grr_hosts
-  from dftimewolf.lib.collectors import grr_hunt
-  from dftimewolf.lib.exporters import local_filesystem
-  from dftimewolf.lib.exporters import scp_ex
-  from dftimewolf.lib.exporters import timesketch
-  from dftimewolf.lib.processors import gcp_logging_timesketch
-  from dftimewolf.lib.processors import grepper
-  from dftimewolf.lib.processors import localplaso
-  from dftimewolf.lib.processors import turbinia
-
+from dftimewolf.lib.modules import manager as modules_manager
 from dftimewolf.lib.recipes import manager as recipes_manager
 from dftimewolf.lib.state import DFTimewolfState
 from dftimewolf.lib import logging_utils
 
 logger = logging.getLogger('dftimewolf')
 
+# Python modules defining each module class. They are only imported, with
+# their dependencies, when a recipe uses one of their module classes.
+MODULES = {
+    'AWSCollector': 'dftimewolf.lib.collectors.aws',
+    'FilesystemCollector': 'dftimewolf.lib.collectors.filesystem',
+    'GCPLoggingTimesketch': 'dftimewolf.lib.processors.gcp_logging_timesketch',
+    'GCPLogsCollector': 'dftimewolf.lib.collectors.gcp_logging',
+    'GRRArtifactCollector': 'dftimewolf.lib.collectors.grr_hosts',
+    'GRRFileCollector': 'dftimewolf.lib.collectors.grr_hosts',
+    'GRRFlowCollector': 'dftimewolf.lib.collectors.grr_hosts',
+    'GRRHuntArtifactCollector': 'dftimewolf.lib.collectors.grr_hunt',
+    'GRRHuntDownloader': 'dftimewolf.lib.collectors.grr_hunt',
+    'GRRHuntFileCollector': 'dftimewolf.lib.collectors.grr_hunt',
+    'GRRTimelineCollector': 'dftimewolf.lib.collectors.grr_hosts',
+    'GRRTimelineTimesketch':
+        'dftimewolf.lib.processors.grr_timeline_timesketch',
+    'GoogleCloudCollector': 'dftimewolf.lib.collectors.gcloud',
+    'GoogleCloudDiskExport': 'dftimewolf.lib.exporters.gce_disk_export',
+    'GrepperSearch': 'dftimewolf.lib.processors.grepper',
+    'LocalFilesystemCopy': 'dftimewolf.lib.exporters.local_filesystem',
+    'LocalPlasoProcessor': 'dftimewolf.lib.processors.localplaso',
+    'SCPExporter': 'dftimewolf.lib.exporters.scp_ex',
+    'TimesketchExporter': 'dftimewolf.lib.exporters.timesketch',
+    'TurbiniaProcessor': 'dftimewolf.lib.processors.turbinia'
+}
+
+modules_manager.ModulesManager.RegisterModuleImportPaths(MODULES)
+
 
 class DFTimewolfTool(object):
   """DFTimewolf tool."""
@@ -64,31 +66,35 @@ class DFTimewolfTool(object):
 
     self._DetermineDataFilesPath()
 
-  def _AddRecipeOptions(self, argument_parser):
-    """Adds the recipe options to the argument group.
+  def _CreateRecipeArgumentParser(self, recipe, prog):
+    """Creates the argument parser of a recipe's options.
+
+    Only the parser of the recipe being run is created.
 
     Args:
-      argument_parser (argparse.ArgumentParser): argparse argument parser.
+      recipe (Recipe): recipe.
+      prog (str): name of the program, shown in usage messages.
+
+    Returns:
+      argparse.ArgumentParser: argparse argument parser.
     """
-    subparsers = argument_parser.add_subparsers()
-
-    for recipe in self._recipes_manager.GetRecipes():
-      description = recipe.description
-      subparser = subparsers.add_parser(
-          recipe.name, formatter_class=utils.DFTimewolfFormatterClass,
-          description=description)
-      subparser.set_defaults(recipe=recipe.contents)
-
-      for switch, help_text, default in recipe.args:
-        if isinstance(default, bool):
-          subparser.add_argument(switch, help=help_text, default=default,
-                                 action='store_true')
-        else:
-          subparser.add_argument(switch, help=help_text, default=default)
-
-      # Override recipe defaults with those specified in Config
-      # so that they can in turn be overridden in the commandline
-      subparser.set_defaults(**config.Config.GetExtra())
+    argument_parser = argparse.ArgumentParser(
+        prog='{0:s} {1:s}'.format(prog, recipe.name),
+        formatter_class=utils.DFTimewolfFormatterClass,
+        description=recipe.description)
+    argument_parser.set_defaults(recipe=recipe.contents)
+
+    for switch, help_text, default in recipe.args:
+      if isinstance(default, bool):
+        argument_parser.add_argument(switch, help=help_text, default=default,
+                                     action='store_true')
+      else:
+        argument_parser.add_argument(switch, help=help_text, default=default)
+
+    # Override recipe defaults with those specified in Config
+    # so that they can in turn be overridden in the commandline
+    argument_parser.set_defaults(**config.Config.GetExtra())
+    return argument_parser
 
   def _DetermineDataFilesPath(self):
     """Determines the data files path."""
@@ -173,6 +179,7 @@ class DFTimewolfTool(object):
       arguments (list[str]): command line arguments.
 
     Raises:
+      CheckpointError: If the checkpoint to resume from could not be read.
       CommandLineParseError: If arguments could not be parsed.
     """
     help_text = self._GenerateHelpText()
@@ -180,11 +187,44 @@ class DFTimewolfTool(object):
     argument_parser = argparse.ArgumentParser(
         formatter_class=argparse.RawDescriptionHelpFormatter,
         description=help_text)
-
-    self._AddRecipeOptions(argument_parser)
+    argument_parser.add_argument(
+        '--run_dir', dest='run_dir', default=None, metavar='RUN_DIR',
+        help='Directory where a checkpoint is saved as modules complete.')
+    argument_parser.add_argument(
+        '--resume', dest='resume', default=None, metavar='RUN_DIR',
+        help=('Resume the run checkpointed in RUN_DIR, skipping the modules '
+              'that completed. The recipe and its arguments are read from '
+              'the checkpoint.'))
+    argument_parser.add_argument(
+        'recipe_name', nargs='?', metavar='recipe', help='Recipe to run.')
+    argument_parser.add_argument(
+        'recipe_arguments', nargs=argparse.REMAINDER, metavar='...',
+        help='Arguments of the recipe, see: recipe --help')
 
     self._command_line_options = argument_parser.parse_args(arguments)
 
+    recipe_name = self._command_line_options.recipe_name
+    if recipe_name:
+      recipe = self._recipes_manager.GetRecipe(recipe_name)
+      if not recipe:
+        error_message = '\nUnknown recipe: {0:s}\n{1:s}'.format(
+            recipe_name, help_text)
+        raise errors.CommandLineParseError(error_message)
+
+      recipe_argument_parser = self._CreateRecipeArgumentParser(
+          recipe, argument_parser.prog)
+      recipe_argument_parser.parse_args(
+          self._command_line_options.recipe_arguments,
+          namespace=self._command_line_options)
+    del self._command_line_options.recipe_arguments
+
+    if self._command_line_options.resume:
+      self._state = DFTimewolfState(config.Config)
+      # Raises errors.CheckpointError or errors.RecipeParseError on error.
+      self._state.LoadCheckpoint(self._command_line_options.resume)
+      self._recipe = self._state.recipe
+      return
+
     if not getattr(self._command_line_options, 'recipe', None):
       error_message = '\nPlease specify a recipe.\n' + help_text
       raise errors.CommandLineParseError(error_message)
@@ -192,6 +232,7 @@ class DFTimewolfTool(object):
     self._recipe = self._command_line_options.recipe
 
     self._state = DFTimewolfState(config.Config)
+    self._state.run_directory = self._command_line_options.run_dir
     logger.info('Loading recipe {0:s}...'.format(self._recipe['name']))
     # Raises errors.RecipeParseError on error.
     self._state.LoadRecipe(self._recipe)
@@ -207,12 +248,34 @@ class DFTimewolfTool(object):
     logger.info('Running preflights...')
     self._state.RunPreflights()
 
+  def _GetRecipeIndexPath(self, recipes_path):
+    """Determines the path of the index caching the recipes of a directory.
+
+    Args:
+      recipes_path (str): path of the directory containing the recipes.
+
+    Returns:
+      str: path of the recipe index, in the user's cache directory.
+    """
+    cache_directory = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+        os.path.expanduser('~'), '.cache')
+    directory_hash = hashlib.sha256(
+        os.path.abspath(recipes_path).encode('utf-8')).hexdigest()
+    return os.path.join(
+        cache_directory, 'dftimewolf',
+        'recipes-{0:s}.json'.format(directory_hash[:16]))
+
   def ReadRecipes(self):
-    """Reads the recipe files."""
+    """Reads the recipe files.
+
+    Parsed recipes are cached in an index in the user's cache directory, so
+    that unchanged recipe files are not parsed again.
+    """
     if os.path.isdir(self._data_files_path):
       recipes_path = os.path.join(self._data_files_path, 'recipes')
       if os.path.isdir(recipes_path):
-        self._recipes_manager.ReadRecipesFromDirectory(recipes_path)
+        self._recipes_manager.ReadRecipesFromDirectory(
+            recipes_path, index_path=self._GetRecipeIndexPath(recipes_path))
 
   def RunModules(self):
     """Runs the modules."""
@@ -223,8 +286,6 @@ class DFTimewolfTool(object):
 
   def SetupModules(self):
     """Sets up the modules."""
-    # TODO: refactor to only load modules that are used by the recipe.
-
     logger.info('Setting up modules...')
     self._state.SetupModules()
     logger.info('Modules successfully set up!')
@@ -252,19 +313,15 @@ def SetupLogging():
   # TODO(tomchop): Consider making this a parameter in the future.
   logger.setLevel(logging.DEBUG)
 
-  # File handler needs go be added first because it doesn't format messages
-  # with color
-  file_handler = handlers.RotatingFileHandler(
-      logging_utils.DEFAULT_LOG_FILE,
-      maxBytes=logging_utils.MAX_BYTES,
-      backupCount=logging_utils.BACKUP_COUNT)
-  file_handler.setFormatter(logging_utils.WolfFormatter(colorize=False))
-  logger.addHandler(file_handler)
-
-  console_handler = logging.StreamHandler()
+  # A single listener thread owns the file and console handlers. Module names
+  # get a random color on the console, dftimewolf's own messages none.
   colorize = not bool(os.environ.get('DFTIMEWOLF_NO_RAINBOW'))
-  console_handler.setFormatter(logging_utils.WolfFormatter(colorize=colorize))
-  logger.addHandler(console_handler)
+  logging_utils.StartQueueListener(logging_utils.CreateHandlers(
+      colorize=colorize, logger_colors={logger.name: ''}))
+
+  queue_handler = logging_utils.GetQueueHandler()
+  if queue_handler not in logger.handlers:
+    logger.addHandler(queue_handler)
   logger.info(
       'Logging to stdout and {0:s}'.format(logging_utils.DEFAULT_LOG_FILE))
 
@@ -296,7 +353,8 @@ def Main():
 
   try:
     tool.ParseArguments(sys.argv[1:])
-  except (errors.CommandLineParseError, errors.RecipeParseError) as exception:
+  except (errors.CheckpointError, errors.CommandLineParseError,
+          errors.RecipeParseError) as exception:
     sys.stderr.write('{0!s}'.format(exception))
     return False
 
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""Content-addressed store deduplicating collected files.
+
+Files collected from many hosts, such as system binaries or configuration
+files, often have the same content. The store keeps a single copy of each
+content, named after its SHA-256 digest, and replaces the collected files by
+hard links to it. Collected directory trees are unchanged, but files with the
+same content share their disk space and their inode, which lets processors
+recognize content they have already processed.
+
+The store must be on the same file system as the collected files, since hard
+links cannot cross file systems. Files that cannot be linked are left as they
+are.
+"""
+
+import hashlib
+import logging
+import os
+
+_READ_SIZE = 1024 * 1024
+
+logger = logging.getLogger('dftimewolf')
+
+
+class BlobStore(object):
+  """Content-addressed store of files, keyed by SHA-256 digest.
+
+  The store only holds its path, and can be shared by threads and modules,
+  since blobs are created and linked with atomic file system operations.
+
+  Attributes:
+    path (str): path of the directory holding the blobs.
+  """
+
+  def __init__(self, path):
+    """Initializes a blob store.
+
+    Args:
+      path (str): path of the directory holding the blobs, created if needed.
+    """
+    super(BlobStore, self).__init__()
+    self.path = os.path.abspath(path)
+    os.makedirs(self.path, exist_ok=True)
+
+  def _GetBlobPath(self, digest):
+    """Determines the path of a blob.
+
+    Blobs are spread across subdirectories named after the first two
+    characters of their digests, to keep directories small.
+
+    Args:
+      digest (str): hexadecimal SHA-256 digest of the blob.
+
+    Returns:
+      str: path of the blob.
+    """
+    return os.path.join(self.path, digest[:2], digest)
+
+  def _HashFile(self, path):
+    """Computes the SHA-256 digest of a file.
+
+    Args:
+      path (str): path of the file.
+
+    Returns:
+      str: hexadecimal SHA-256 digest of the file.
+
+    Raises:
+      OSError: if the file cannot be read.
+    """
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as file_object:
+      data = file_object.read(_READ_SIZE)
+      while data:
+        sha256.update(data)
+        data = file_object.read(_READ_SIZE)
+    return sha256.hexdigest()
+
+  def AddFile(self, path):
+    """Adds a file to the store.
+
+    The first file with a given content becomes the blob of that content.
+    Files with the same content as an existing blob are replaced by a hard
+    link to the blob.
+
+    Args:
+      path (str): path of the file.
+
+    Returns:
+      tuple[str, int]: hexadecimal SHA-256 digest of the file, and number of
+          bytes saved by deduplicating it.
+
+    Raises:
+      OSError: if the file cannot be read or linked.
+    """
+    digest = self._HashFile(path)
+    blob_path = self._GetBlobPath(digest)
+    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+    try:
+      os.link(path, blob_path)
+      return digest, 0
+    except FileExistsError:
+      pass
+
+    if os.path.samefile(path, blob_path):
+      return digest, 0
+
+    # The file is replaced atomically, so that it never goes missing.
+    size = os.path.getsize(path)
+    link_path = '{0:s}.blob'.format(path)
+    if os.path.lexists(link_path):
+      os.remove(link_path)
+    os.link(blob_path, link_path)
+    os.replace(link_path, path)
+    return digest, size
+
+  def AddFiles(self, paths):
+    """Adds files to the store.
+
+    Files that cannot be added, for instance because they are on another
+    file system than the store, are logged and left as they are.
+
+    Args:
+      paths (iterable[str]): paths of the files.
+
+    Returns:
+      tuple[int, int]: number of files replaced by links to existing blobs,
+          and number of bytes saved.
+    """
+    number_of_files = 0
+    saved_size = 0
+    for path in paths:
+      if os.path.islink(path) or not os.path.isfile(path):
+        continue
+      try:
+        _, size = self.AddFile(path)
+      except OSError as exception:
+        logger.debug('Unable to add {0:s} to blob store: {1!s}'.format(
+            path, exception))
+        continue
+      if size:
+        number_of_files += 1
+        saved_size += size
+    return number_of_files, saved_size
+
+  def AddDirectory(self, directory):
+    """Adds the files of a directory and its subdirectories to the store.
+
+    Args:
+      directory (str): path of the directory.
+
+    Returns:
+      tuple[int, int]: number of files replaced by links to existing blobs,
+          and number of bytes saved.
+    """
+    paths = (
+        os.path.join(root, filename)
+        for root, _, filenames in os.walk(directory)
+        for filename in filenames)
+    return self.AddFiles(paths)
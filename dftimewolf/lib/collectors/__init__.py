@@ -1,7 +1,2 @@
 # -*- coding: utf-8 -*-
-"""This file contains an import statement for each collector module."""
-
-from dftimewolf.lib.collectors import filesystem
-from dftimewolf.lib.collectors import gcloud
-from dftimewolf.lib.collectors import grr_hosts
-from dftimewolf.lib.collectors import grr_hunt
+"""Collector modules, imported when a recipe uses them."""
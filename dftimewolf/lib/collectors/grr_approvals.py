@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""Coalesces the GRR approvals requested and waited for by GRR modules."""
+
+from concurrent import futures
+import threading
+import time
+
+
+class _PendingApproval(object):
+  """Approval being waited for.
+
+  Attributes:
+    approval (object): GRR approval object, or None if no approval was
+        requested yet.
+    future (futures.Future): future resolved once the approval is granted,
+        or None if nobody is waiting for the approval.
+    grant_time (float): time the approval was granted, in number of seconds
+        since epoch, or None if it was not granted yet.
+  """
+
+  def __init__(self):
+    """Initializes a pending approval."""
+    super(_PendingApproval, self).__init__()
+    self.approval = None
+    self.future = None
+    self.grant_time = None
+
+
+class GRRApprovalManager(object):
+  """Requests GRR approvals once and waits for them on behalf of all callers.
+
+  Approvals are tracked per GRR server, user and client or hunt. The first
+  thread needing an approval requests it and polls it, at intervals growing
+  from a minimum to a maximum interval. The other threads needing the same
+  approval wait for the same future, and all of them proceed as soon as the
+  approval is granted. Once granted, an approval is only requested again if
+  access is denied to a request sent after the grant, for instance because
+  the approval expired or was revoked.
+  """
+
+  def __init__(self, backoff_factor=1.5):
+    """Initializes a GRR approval manager.
+
+    Args:
+      backoff_factor (Optional[float]): factor the interval between checks of
+          an approval grows by after each check.
+    """
+    super(GRRApprovalManager, self).__init__()
+    self._approvals = {}
+    self._backoff_factor = backoff_factor
+    self._lock = threading.Lock()
+
+  @staticmethod
+  def GetApprovalKey(grr_url, grr_username, grr_object):
+    """Builds the key approvals for a GRR object are tracked under.
+
+    Args:
+      grr_url (str): GRR server URL.
+      grr_username (str): GRR username.
+      grr_object (object): GRR client or hunt object.
+
+    Returns:
+      tuple[str, str, str]: GRR server URL, GRR username and identifier of
+          the client or hunt.
+    """
+    object_identifier = (
+        getattr(grr_object, 'client_id', None) or
+        getattr(grr_object, 'hunt_id', None) or str(grr_object))
+    return grr_url, grr_username, object_identifier
+
+  def _PollApproval(self, pending_approval, minimum_interval, maximum_interval,
+                    logger):
+    """Polls an approval until it is granted.
+
+    Args:
+      pending_approval (_PendingApproval): approval to poll.
+      minimum_interval (float): number of seconds before the first check.
+      maximum_interval (float): maximum number of seconds between checks.
+      logger (logging.Logger): logger of the calling module.
+    """
+    interval = min(minimum_interval, maximum_interval)
+    while True:
+      logger.info('Approval not yet granted, waiting {0:.0f}s'.format(
+          interval))
+      time.sleep(interval)
+      if pending_approval.approval.Get().data.is_valid:
+        return
+      interval = min(interval * self._backoff_factor, maximum_interval)
+
+  def WaitForApproval(
+      self, key, grr_object, reason, approvers, logger,
+      minimum_interval=1.0, maximum_interval=10.0, request_time=None):
+    """Waits until access to a GRR client or hunt is approved.
+
+    The approval is only requested by the first caller for the key. If the
+    approval was already granted, the caller returns immediately when the
+    denied request was sent before the grant, so that it is retried. A new
+    approval is only requested when access was denied to a request sent
+    after the grant.
+
+    Args:
+      key (tuple[str, str, str]): key the approval is tracked under, as
+          returned by GetApprovalKey.
+      grr_object (object): GRR client or hunt object to request the approval
+          on.
+      reason (str): justification for GRR access.
+      approvers (list[str]): GRR approval recipients.
+      logger (logging.Logger): logger of the calling module.
+      minimum_interval (Optional[float]): number of seconds before the first
+          check of the approval.
+      maximum_interval (Optional[float]): maximum number of seconds between
+          two checks of the approval.
+      request_time (Optional[float]): time the denied request was sent, in
+          number of seconds since epoch, or None if unknown, in which case
+          the request is considered sent after any grant.
+
+    Raises:
+      Exception: the exception raised when requesting or polling the
+          approval, if any.
+    """
+    with self._lock:
+      pending_approval = self._approvals.get(key)
+      if (pending_approval and pending_approval.grant_time is not None and
+          not pending_approval.future):
+        if (request_time is not None and
+            request_time < pending_approval.grant_time):
+          return
+        logger.info('{0!s}: approval no longer valid'.format(grr_object))
+        del self._approvals[key]
+        pending_approval = None
+      if not pending_approval:
+        pending_approval = _PendingApproval()
+        self._approvals[key] = pending_approval
+      future = pending_approval.future
+      is_polling_thread = future is None
+      if is_polling_thread:
+        future = futures.Future()
+        pending_approval.future = future
+
+    if not is_polling_thread:
+      future.result()
+      return
+
+    try:
+      if not pending_approval.approval:
+        pending_approval.approval = grr_object.CreateApproval(
+            reason=reason, notified_users=approvers)
+        logger.info(
+            '{0!s}: approval request sent to: {1!s} (reason: {2:s})'.format(
+                grr_object, approvers, reason))
+      self._PollApproval(
+          pending_approval, minimum_interval, maximum_interval, logger)
+    except Exception as exception:  # pylint: disable=broad-except
+      with self._lock:
+        pending_approval.future = None
+      future.set_exception(exception)
+      raise
+
+    with self._lock:
+      pending_approval.future = None
+      pending_approval.grant_time = time.time()
+    future.set_result(None)
@@ -1,12 +1,49 @@
 """Base GRR module class. GRR modules should extend it."""
 import abc
+from concurrent import futures
+import contextvars
 import tempfile
+import threading
 import time
 
-from grr_api_client import api as grr_api
 from grr_api_client import errors as grr_errors
 
+from dftimewolf.lib import blob_store
 from dftimewolf.lib import module
+from dftimewolf.lib import rate_limit
+from dftimewolf.lib.collectors import grr_approvals
+from dftimewolf.lib.collectors import grr_connection
+from dftimewolf.lib.errors import DFTimewolfError
+
+# Serializes the creation of the objects shared by the GRR modules.
+_SHARED_OBJECTS_LOCK = threading.Lock()
+
+
+class GRRRequestLimits(object):
+  """Limits on the requests the GRR modules of a run send to GRR.
+
+  Attributes:
+    in_flight_semaphore (threading.BoundedSemaphore): semaphore limiting the
+        number of clients processed at once.
+    max_in_flight (int): maximum number of clients processed at once.
+    request_bucket (rate_limit.TokenBucket): token bucket limiting the rate
+        of GRR API requests, or None if the rate is not limited.
+  """
+
+  def __init__(self, max_in_flight, requests_per_second=None):
+    """Initializes GRR request limits.
+
+    Args:
+      max_in_flight (int): maximum number of clients processed at once.
+      requests_per_second (Optional[float]): maximum number of GRR API
+          requests per second, or None to not limit the rate.
+    """
+    super(GRRRequestLimits, self).__init__()
+    self.in_flight_semaphore = threading.BoundedSemaphore(max_in_flight)
+    self.max_in_flight = max_in_flight
+    self.request_bucket = None
+    if requests_per_second:
+      self.request_bucket = rate_limit.TokenBucket(requests_per_second)
 
 
 class GRRBaseModule(module.BaseModule):
@@ -14,13 +51,33 @@ class GRRBaseModule(module.BaseModule):
 
   Attributes:
     output_path (str): path to store collected artifacts.
-    grr_api: GRR HTTP API client.
+    grr_api: GRR HTTP API client, shared by the GRR modules of the run that
+        use the same GRR server, user and certificate verification.
+    grr_url (str): GRR server URL.
+    grr_username (str): GRR username.
     reason (str): justification for GRR access.
     approvers: list of GRR approval recipients.
+    request_limits (GRRRequestLimits): limits on the requests sent to GRR,
+        shared by the GRR modules of the run.
+    blob_store (blob_store.BlobStore): store deduplicating the collected
+        files, shared by the GRR modules of the run, or None if collected
+        files are not deduplicated.
   """
 
+  # Approvals are first checked after the minimum interval, then at growing
+  # intervals up to the maximum interval.
+  _MIN_CHECK_APPROVAL_INTERVAL_SEC = 1
   _CHECK_APPROVAL_INTERVAL_SEC = 10
 
+  _APPROVAL_MANAGER_CACHE_NAME = 'grr_approval_manager'
+  _BLOB_STORE_CACHE_NAME = 'grr_blob_store'
+  _GRR_API_CACHE_NAME = 'grr_api:{0:s}:{1:s}:{2!s}'
+
+  # Default maximum number of clients processed at once by all the GRR
+  # modules of a run, overridden by "grr_max_in_flight" in the configuration.
+  _DEFAULT_MAX_IN_FLIGHT = 10
+  _REQUEST_LIMITS_CACHE_NAME = 'grr_request_limits'
+
   def __init__(self, state, critical=False):
     """Initializes a GRR hunt or flow module.
 
@@ -32,8 +89,12 @@ class GRRBaseModule(module.BaseModule):
     super(GRRBaseModule, self).__init__(state, critical=critical)
     self.reason = None
     self.grr_api = None
+    self.grr_url = None
+    self.grr_username = None
     self.approvers = None
     self.output_path = None
+    self.request_limits = None
+    self.blob_store = None
 
   # pylint: disable=arguments-differ
   def SetUp(
@@ -54,18 +115,208 @@ class GRRBaseModule(module.BaseModule):
     self.approvers = []
     if approvers:
       self.approvers = [item.strip() for item in approvers.split(',')]
-    self.grr_api = grr_api.InitHttp(api_endpoint=grr_server_url,
-                                    auth=grr_auth,
-                                    verify=verify)
+    self.request_limits = self._GetRequestLimits()
+    self.grr_api = self._GetGRRApi(grr_server_url, grr_auth, verify)
+    self.grr_url = grr_server_url
+    self.grr_username = grr_username
     self.output_path = tempfile.mkdtemp()
     self.reason = reason
+    self.blob_store = self._GetBlobStore()
+
+  def _GetBlobStore(self):
+    """Retrieves the blob store shared by the GRR modules of the run.
+
+    The store is created by the first GRR module set up, in the directory
+    set by "grr_blob_store" in the configuration, and kept in the state's
+    cache.
+
+    Returns:
+      blob_store.BlobStore: blob store, or None if "grr_blob_store" is not
+          set.
+    """
+    blob_store_path = self.state.config.GetExtra('grr_blob_store')
+    if not blob_store_path:
+      return None
+
+    with _SHARED_OBJECTS_LOCK:
+      store = self.state.GetFromCache(self._BLOB_STORE_CACHE_NAME)
+      if not store:
+        store = blob_store.BlobStore(blob_store_path)
+        self.state.AddToCache(self._BLOB_STORE_CACHE_NAME, store)
+    return store
+
+  def _DeduplicateFiles(self, directory, paths=None):
+    """Replaces collected files by links to the blob store, if enabled.
+
+    Args:
+      directory (str): directory of the collected files.
+      paths (Optional[list[str]]): paths of the collected files, by default
+          all the files of the directory.
+    """
+    if not self.blob_store:
+      return
+
+    with self.state.tracer.Span(
+        'deduplicate', category='grr', path=directory):
+      if paths is None:
+        number_of_files, saved_size = self.blob_store.AddDirectory(directory)
+      else:
+        number_of_files, saved_size = self.blob_store.AddFiles(paths)
+    if number_of_files:
+      self.logger.info(
+          '{0:s}: {1:d} files already collected, {2:d} bytes saved'.format(
+              directory, number_of_files, saved_size))
+
+  def _GetGRRApi(self, grr_server_url, grr_auth, verify):
+    """Retrieves the GRR API client shared by the GRR modules of the run.
+
+    The client is created by the first GRR module set up for a GRR server,
+    user and certificate verification, and kept in the state's cache. Its
+    requests go through a pool of "grr_http_pool_size" connections, the
+    maximum number of clients in flight by default, which are kept alive
+    between requests unless "grr_http_keep_alive" is false in the
+    configuration.
+
+    Args:
+      grr_server_url (str): GRR server URL.
+      grr_auth (tuple[str, str]): GRR username and password.
+      verify (bool): True to indicate GRR server's x509 certificate should be
+          verified.
+
+    Returns:
+      grr_api_client.api.GrrApi: GRR API client.
+    """
+    cache_name = self._GRR_API_CACHE_NAME.format(
+        grr_server_url, grr_auth[0], verify)
+    with _SHARED_OBJECTS_LOCK:
+      grr_api = self.state.GetFromCache(cache_name)
+      if not grr_api:
+        keep_alive = self.state.config.GetExtra('grr_http_keep_alive')
+        grr_api = grr_connection.InitHttp(
+            grr_server_url, auth=grr_auth, verify=verify,
+            pool_size=(self.state.config.GetExtra('grr_http_pool_size') or
+                       self.request_limits.max_in_flight),
+            keep_alive=keep_alive is None or bool(keep_alive))
+        self.state.AddToCache(cache_name, grr_api)
+    return grr_api
+
+  def _GetRequestLimits(self):
+    """Retrieves the request limits shared by the GRR modules of the run.
+
+    The limits are created by the first GRR module set up, from the
+    "grr_max_in_flight" and "grr_requests_per_second" configuration values,
+    and kept in the state's cache.
+
+    Returns:
+      GRRRequestLimits: request limits.
+    """
+    with _SHARED_OBJECTS_LOCK:
+      request_limits = self.state.GetFromCache(
+          self._REQUEST_LIMITS_CACHE_NAME)
+      if not request_limits:
+        request_limits = GRRRequestLimits(
+            self.state.config.GetExtra('grr_max_in_flight') or
+            self._DEFAULT_MAX_IN_FLIGHT,
+            requests_per_second=self.state.config.GetExtra(
+                'grr_requests_per_second'))
+        self.state.AddToCache(self._REQUEST_LIMITS_CACHE_NAME, request_limits)
+    return request_limits
+
+  def _GetApprovalManager(self):
+    """Retrieves the approval manager shared by the GRR modules of the run.
+
+    Returns:
+      grr_approvals.GRRApprovalManager: approval manager.
+    """
+    with _SHARED_OBJECTS_LOCK:
+      approval_manager = self.state.GetFromCache(
+          self._APPROVAL_MANAGER_CACHE_NAME)
+      if not approval_manager:
+        approval_manager = grr_approvals.GRRApprovalManager()
+        self.state.AddToCache(
+            self._APPROVAL_MANAGER_CACHE_NAME, approval_manager)
+    return approval_manager
+
+  def _WaitForRequestToken(self):
+    """Waits until a GRR API request is allowed by the rate limit."""
+    if self.request_limits and self.request_limits.request_bucket:
+      queued_seconds = self.request_limits.request_bucket.Acquire()
+      if queued_seconds:
+        self.state.RecordQueuedTime(queued_seconds)
+
+  def _SubmitInContext(self, executor, function, *args):
+    """Submits a function to an executor in a copy of the current context.
+
+    The function then runs as part of the calling module, so that the state
+    attributes the time it spends queued behind request limits to it.
+
+    Args:
+      executor (futures.Executor): executor to run the function.
+      function (function): function to run.
+      args (list[object]): positional arguments to pass to the function.
+
+    Returns:
+      futures.Future: future of the function's result.
+    """
+    return executor.submit(contextvars.copy_context().run, function, *args)
+
+  # TODO: change object to more specific GRR type information.
+  def _ProcessClientWithinLimit(self, callback, client, queued_time):
+    """Processes a client once fewer clients than the limit are in flight.
+
+    Args:
+      callback (function): function processing a client.
+      client (object): GRR Client object.
+      queued_time (float): time the client was queued for processing.
+    """
+    with self.request_limits.in_flight_semaphore:
+      self.state.RecordQueuedTime(time.time() - queued_time)
+      callback(client)
+
+  # TODO: change object to more specific GRR type information.
+  def _ProcessClients(self, callback, clients):
+    """Processes clients in threads, within the limit of clients in flight.
+
+    The limit is shared by all the GRR modules of the run. Errors raised
+    while processing a client, including unexpected exceptions, are
+    declared as non-critical errors unless they were already declared to
+    the state, so that a failing client does not stop the others.
+
+    Args:
+      callback (function): function processing a client, which takes the GRR
+          Client object as its only argument.
+      clients (list[object]): GRR Client objects.
+    """
+    if not clients:
+      return
+
+    max_workers = min(len(clients), self.request_limits.max_in_flight)
+    with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+      client_futures = [
+          self._SubmitInContext(
+              executor, self._ProcessClientWithinLimit, callback, client,
+              time.time())
+          for client in clients]
+      for future in futures.as_completed(client_futures):
+        try:
+          future.result()
+        except DFTimewolfError as exception:
+          if not self.state.HasError(exception):
+            self.ModuleError(exception.message, critical=False)
+        except Exception as exception:  # pylint: disable=broad-except
+          self.ModuleError(
+              'Unexpected error processing client: {0!s}'.format(exception),
+              critical=False)
 
   # TODO: change object to more specific GRR type information.
   def _WrapGRRRequestWithApproval(
       self, grr_object, grr_function, *args, **kwargs):
     """Wraps a GRR request with approval.
 
-    This method will request the approval if not yet granted.
+    This method will request the approval if not yet granted. Approvals are
+    requested and waited for through the approval manager shared by the GRR
+    modules of the run, so that threads needing access to the same client or
+    hunt send a single approval request and all proceed once it is granted.
 
     Args:
       grr_object (object): GRR object to create the eventual approval on.
@@ -78,20 +329,18 @@ class GRRBaseModule(module.BaseModule):
     Returns:
       object: return value of the execution of grr_function(*args, **kwargs).
     """
-    approval_sent = False
+    approval_manager = self._GetApprovalManager()
+    approval_key = approval_manager.GetApprovalKey(
+        self.grr_url, self.grr_username, grr_object)
 
     while True:
+      self._WaitForRequestToken()
+      request_time = time.time()
       try:
         return grr_function(*args, **kwargs)
 
       except grr_errors.AccessForbiddenError as exception:
         self.logger.info('No valid approval found: {0!s}'.format(exception))
-        # If approval was already sent, just wait a bit more.
-        if approval_sent:
-          self.logger.info('Approval not yet granted, waiting {0:d}s'.format(
-              self._CHECK_APPROVAL_INTERVAL_SEC))
-          time.sleep(self._CHECK_APPROVAL_INTERVAL_SEC)
-          continue
 
         # If no approvers were specified, abort.
         if not self.approvers:
@@ -99,13 +348,15 @@ class GRRBaseModule(module.BaseModule):
                      '(hint: use --approvers)')
           self.ModuleError(message, critical=True)
 
-        # Otherwise, send a request for approval
-        grr_object.CreateApproval(
-            reason=self.reason, notified_users=self.approvers)
-        approval_sent = True
-        self.logger.info(
-            '{0!s}: approval request sent to: {1!s} (reason: {2:s})'.format(
-                grr_object, self.approvers, self.reason))
+        # Otherwise, request the approval if not yet requested, and wait for
+        # it to be granted. A request sent before the approval was granted is
+        # retried without requesting a new approval.
+        approval_manager.WaitForApproval(
+            approval_key, grr_object, self.reason, self.approvers,
+            self.logger,
+            minimum_interval=self._MIN_CHECK_APPROVAL_INTERVAL_SEC,
+            maximum_interval=self._CHECK_APPROVAL_INTERVAL_SEC,
+            request_time=request_time)
 
   @abc.abstractmethod
   def Process(self):
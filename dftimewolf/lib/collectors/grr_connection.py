@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""GRR API connections pooled across the threads and modules of a run.
+
+The GRR API client's HTTP connector opens a new HTTP session, and thus a new
+TCP connection and TLS handshake, for every request. The connector defined
+here sends all requests through a single session, whose connection pool is
+sized for the number of threads sending requests at once, so that
+connections are reused across threads and modules.
+
+The connector relies on the public interface of the HTTP connector of
+grr-api-client 3.4.2.post1, which has no session of its own to pool
+connections with.
+"""
+
+import json
+import socket
+import threading
+
+import requests
+from requests import adapters
+from urllib3 import connection
+
+from google.protobuf import json_format
+from grr_api_client import api as grr_api
+from grr_api_client import connector as grr_connector
+from grr_api_client import errors as grr_errors
+from grr_api_client import utils as grr_utils
+from grr_api_client.connectors import http_connector
+
+
+# Errors of the GRR API per HTTP status code, other status codes than 200
+# being unknown errors.
+_ERRORS_BY_STATUS_CODE = {
+    403: grr_errors.AccessForbiddenError,
+    404: grr_errors.ResourceNotFoundError,
+    422: grr_errors.InvalidArgumentError,
+    501: grr_errors.ApiNotImplementedError}
+
+
+class _KeepAliveHTTPAdapter(adapters.HTTPAdapter):
+  """HTTP adapter enabling TCP keep-alive on its pooled connections.
+
+  TCP keep-alive prevents idle pooled connections from being dropped by
+  firewalls and proxies, for instance while waiting for approvals or flows.
+  """
+
+  def init_poolmanager(self, *args, **kwargs):
+    """Initializes the pool manager with TCP keep-alive enabled."""
+    kwargs['socket_options'] = (
+        connection.HTTPConnection.default_socket_options +
+        [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)])
+    super(_KeepAliveHTTPAdapter, self).init_poolmanager(*args, **kwargs)
+
+
+class PooledHttpConnector(grr_connector.Connector):
+  """GRR API connector sending requests through a connection pool.
+
+  Requests are built by a GRR API HTTP connector, and sent through a single
+  session instead of the new session the HTTP connector opens for every
+  request. Only the public interface of the HTTP connector is used.
+
+  The connector holds the GRR credentials and a lock, and is therefore never
+  saved in checkpoints.
+  """
+
+  def __init__(self, http_connector, pool_size=10, keep_alive=True):
+    """Initializes a pooled HTTP connector.
+
+    Args:
+      http_connector (grr_api_client.connectors.http_connector.HttpConnector):
+          GRR API HTTP connector building the requests.
+      pool_size (Optional[int]): maximum number of connections kept open to
+          the GRR server.
+      keep_alive (Optional[bool]): True to keep connections open between
+          requests, False to close them after each request.
+    """
+    super(PooledHttpConnector, self).__init__()
+    self._build_lock = threading.Lock()
+    self._http_connector = http_connector
+    self._session = requests.Session()
+    self._session.trust_env = http_connector.trust_env
+    adapter_class = (
+        _KeepAliveHTTPAdapter if keep_alive else adapters.HTTPAdapter)
+    adapter = adapter_class(pool_connections=1, pool_maxsize=pool_size)
+    self._session.mount('https://', adapter)
+    self._session.mount('http://', adapter)
+    if not keep_alive:
+      self._session.headers['Connection'] = 'close'
+
+  @property
+  def page_size(self):
+    """int: number of items per page of the GRR API list methods."""
+    return self._http_connector.page_size
+
+  def _GetResponseError(self, response):
+    """Determines the error returned by the GRR API.
+
+    Args:
+      response (requests.Response): response to a request.
+
+    Returns:
+      grr_api_client.errors.Error: error matching the status of the response.
+    """
+    content = response.content
+    try:
+      parsed_json = json.loads(
+          content[len(self._http_connector.JSON_PREFIX):])
+      message = '\n'.join([
+          parsed_json['message'], parsed_json.get('traceBack', '')])
+    except (KeyError, TypeError, ValueError):
+      message = content
+    error_class = _ERRORS_BY_STATUS_CODE.get(
+        response.status_code, grr_errors.UnknownError)
+    return error_class(message)
+
+  def _SendPreparedRequest(self, handler_name, args, stream=False):
+    """Sends a request to the GRR API through the connection pool.
+
+    Args:
+      handler_name (str): name of the GRR API method.
+      args (object): arguments of the GRR API method, as a protobuf.
+      stream (Optional[bool]): True to not download the response content
+          immediately.
+
+    Returns:
+      tuple[object, requests.Response]: descriptor of the GRR API method and
+          response to the request.
+
+    Raises:
+      grr_api_client.errors.Error: if the GRR API returned an error.
+    """
+    # Building the first request fetches the CSRF token and routing map of
+    # the HTTP connector, which is only done once for all threads.
+    with self._build_lock:
+      request = self._http_connector.BuildRequest(handler_name, args)
+    method_descriptor = self._http_connector.api_methods[handler_name]
+
+    prepped_request = self._session.prepare_request(request)
+    options = self._session.merge_environment_settings(
+        prepped_request.url, self._http_connector.proxies or {}, stream,
+        self._http_connector.verify, self._http_connector.cert)
+    response = self._session.send(prepped_request, **options)
+    if response.status_code != 200:
+      error = self._GetResponseError(response)
+      response.close()
+      raise error
+    return method_descriptor, response
+
+  def SendRequest(self, handler_name, args):
+    """Sends a request to the GRR API.
+
+    Args:
+      handler_name (str): name of the GRR API method.
+      args (object): arguments of the GRR API method, as a protobuf.
+
+    Returns:
+      object: result of the GRR API method, as a protobuf, or None if the
+          method has no result.
+    """
+    method_descriptor, response = self._SendPreparedRequest(
+        handler_name, args)
+    json_str = response.content[len(self._http_connector.JSON_PREFIX):]
+
+    if method_descriptor.result_type_descriptor.name:
+      default_value = method_descriptor.result_type_descriptor.default
+      result = grr_utils.TypeUrlToMessage(default_value.type_url)
+      json_format.Parse(json_str, result, ignore_unknown_fields=True)
+      return result
+    return None
+
+  def SendStreamingRequest(self, handler_name, args):
+    """Sends a request to the GRR API returning binary data.
+
+    Args:
+      handler_name (str): name of the GRR API method.
+      args (object): arguments of the GRR API method, as a protobuf.
+
+    Returns:
+      grr_api_client.utils.BinaryChunkIterator: chunks of the binary data.
+    """
+    _, response = self._SendPreparedRequest(handler_name, args, stream=True)
+    return grr_utils.BinaryChunkIterator(
+        chunks=response.iter_content(
+            self._http_connector.DEFAULT_BINARY_CHUNK_SIZE),
+        on_close=response.close)
+
+
+def InitHttp(api_endpoint, auth=None, verify=True, pool_size=10,
+             keep_alive=True):
+  """Initializes a GRR API object with a pooled HTTP connector.
+
+  Args:
+    api_endpoint (str): GRR server URL.
+    auth (Optional[tuple[str, str]]): GRR username and password.
+    verify (Optional[bool]): True to indicate GRR server's x509 certificate
+        should be verified.
+    pool_size (Optional[int]): maximum number of connections kept open to the
+        GRR server.
+    keep_alive (Optional[bool]): True to keep connections open between
+        requests, False to close them after each request.
+
+  Returns:
+    grr_api_client.api.GrrApi: GRR API object.
+  """
+  connector = http_connector.HttpConnector(
+      api_endpoint=api_endpoint, auth=auth, verify=verify)
+  return grr_api.GrrApi(connector=PooledHttpConnector(
+      connector, pool_size=pool_size, keep_alive=keep_alive))
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""Tracks the completion of the GRR flows of a module from a single thread."""
+
+from concurrent import futures
+import contextvars
+import threading
+import time
+
+from grr_response_proto import flows_pb2
+
+
+class _WatchedFlow(object):
+  """GRR flow whose completion is being waited for.
+
+  Attributes:
+    client (object): GRR Client object the flow runs on.
+    flow_id (str): GRR identifier of the flow.
+    future (futures.Future): future resolved with the status of the flow
+        once it has completed.
+    interval (float): number of seconds until the next status check.
+    next_check_time (float): time of the next status check.
+  """
+
+  def __init__(self, client, flow_id, next_check_time, interval):
+    """Initializes a watched flow.
+
+    Args:
+      client (object): GRR Client object the flow runs on.
+      flow_id (str): GRR identifier of the flow.
+      next_check_time (float): time of the first status check.
+      interval (float): number of seconds between the first and the second
+          status checks.
+    """
+    super(_WatchedFlow, self).__init__()
+    self.client = client
+    self.flow_id = flow_id
+    self.future = futures.Future()
+    self.interval = interval
+    self.next_check_time = next_check_time
+
+
+class GRRFlowMonitor(object):
+  """Checks the status of outstanding GRR flows with an adaptive interval.
+
+  A single thread checks the status of all the flows being waited for, so
+  that the number of status requests sent to the GRR server does not grow
+  with the number of threads waiting. The status of a flow is first checked
+  right away, then at intervals that grow from the minimum interval up to
+  the maximum interval, so that short flows complete quickly and long flows
+  are not polled needlessly. The flows of a client that are due at the same
+  time are checked with a single request listing the client's flows. The
+  thread stops when no flow is outstanding.
+  """
+
+  def __init__(
+      self, minimum_interval=1.0, maximum_interval=10.0, backoff_factor=1.5,
+      request_callback=None):
+    """Initializes a GRR flow monitor.
+
+    Args:
+      minimum_interval (Optional[float]): number of seconds between the first
+          and the second status checks of a flow.
+      maximum_interval (Optional[float]): maximum number of seconds between
+          two status checks of a flow.
+      backoff_factor (Optional[float]): factor the interval between status
+          checks of a flow grows by after each check.
+      request_callback (Optional[function]): function called before each
+          status request, such as to wait until the request is allowed by a
+          rate limit.
+    """
+    super(GRRFlowMonitor, self).__init__()
+    self._backoff_factor = backoff_factor
+    self._condition = threading.Condition()
+    self._flows = {}
+    self._maximum_interval = maximum_interval
+    self._minimum_interval = minimum_interval
+    self._request_callback = request_callback
+    self._thread = None
+
+  def _SendRequest(self, function, *args):
+    """Sends a status request, once allowed by the request callback.
+
+    Args:
+      function (function): function sending the request.
+      args (list[object]): positional arguments to pass to the function.
+
+    Returns:
+      object: return value of the function.
+    """
+    if self._request_callback:
+      self._request_callback()
+    return function(*args)
+
+  def _UpdateFlow(self, watched_flow, status):
+    """Resolves the future of a flow if it completed.
+
+    Args:
+      watched_flow (_WatchedFlow): flow that was checked.
+      status (flow_pb2.ApiFlow): status of the flow.
+
+    Returns:
+      bool: True if the flow completed.
+    """
+    if status.state != flows_pb2.FlowContext.RUNNING:
+      watched_flow.future.set_result(status)
+      return True
+
+    watched_flow.next_check_time = time.time() + watched_flow.interval
+    watched_flow.interval = min(
+        watched_flow.interval * self._backoff_factor, self._maximum_interval)
+    return False
+
+  def _CheckFlow(self, watched_flow):
+    """Checks the status of a flow, resolving its future if it completed.
+
+    Args:
+      watched_flow (_WatchedFlow): flow to check.
+
+    Returns:
+      bool: True if the flow completed, or its status could not be checked.
+    """
+    try:
+      status = self._SendRequest(
+          watched_flow.client.Flow(watched_flow.flow_id).Get).data
+    except Exception as exception:  # pylint: disable=broad-except
+      watched_flow.future.set_exception(exception)
+      return True
+
+    return self._UpdateFlow(watched_flow, status)
+
+  def _CheckClientFlows(self, watched_flows):
+    """Checks the status of several flows of the same client.
+
+    The client's flows are listed until all the watched flows were found.
+    Flows that are not listed, such as child flows, are checked
+    individually.
+
+    Args:
+      watched_flows (list[_WatchedFlow]): flows of the client to check.
+
+    Returns:
+      list[_WatchedFlow]: flows that completed, or whose status could not be
+          checked.
+    """
+    client = watched_flows[0].client
+    remaining_flows = {
+        watched_flow.flow_id: watched_flow for watched_flow in watched_flows}
+    completed_flows = []
+    try:
+      for listed_flow in self._SendRequest(client.ListFlows):
+        watched_flow = remaining_flows.pop(listed_flow.data.flow_id, None)
+        if watched_flow and self._UpdateFlow(watched_flow, listed_flow.data):
+          completed_flows.append(watched_flow)
+        if not remaining_flows:
+          break
+    except Exception as exception:  # pylint: disable=broad-except
+      for watched_flow in remaining_flows.values():
+        watched_flow.future.set_exception(exception)
+      return completed_flows + list(remaining_flows.values())
+
+    completed_flows.extend(
+        watched_flow for watched_flow in remaining_flows.values()
+        if self._CheckFlow(watched_flow))
+    return completed_flows
+
+  def _CheckFlows(self):
+    """Checks the status of the outstanding flows until none is left."""
+    while True:
+      with self._condition:
+        if not self._flows:
+          self._thread = None
+          return
+
+        current_time = time.time()
+        due_flows_per_client = {}
+        for (client_id, _), watched_flow in self._flows.items():
+          if watched_flow.next_check_time <= current_time:
+            due_flows_per_client.setdefault(client_id, []).append(
+                watched_flow)
+        if not due_flows_per_client:
+          next_check_time = min(
+              watched_flow.next_check_time
+              for watched_flow in self._flows.values())
+          self._condition.wait(timeout=next_check_time - current_time)
+          continue
+
+      completed_flows = []
+      for due_flows in due_flows_per_client.values():
+        if len(due_flows) == 1:
+          if self._CheckFlow(due_flows[0]):
+            completed_flows.append(due_flows[0])
+        else:
+          completed_flows.extend(self._CheckClientFlows(due_flows))
+
+      with self._condition:
+        for watched_flow in completed_flows:
+          del self._flows[(watched_flow.client.client_id,
+                           watched_flow.flow_id)]
+
+  def _Run(self):
+    """Runs the monitor thread.
+
+    If the thread stops on an unexpected error, the outstanding flows are
+    failed with that error, so that no thread waits for them forever.
+    """
+    error = None
+    try:
+      self._CheckFlows()
+    except Exception as exception:  # pylint: disable=broad-except
+      error = exception
+    finally:
+      with self._condition:
+        # The thread is only still registered if it did not stop normally.
+        if self._thread is threading.current_thread():
+          error = error or RuntimeError('GRR flow monitor stopped')
+          for watched_flow in self._flows.values():
+            if not watched_flow.future.done():
+              watched_flow.future.set_exception(error)
+          self._flows = {}
+          self._thread = None
+
+  def Watch(self, client, flow_id):
+    """Starts waiting for a flow to complete.
+
+    Args:
+      client (object): GRR Client object the flow runs on.
+      flow_id (str): GRR identifier of the flow.
+
+    Returns:
+      futures.Future: future resolved with the status of the flow once it has
+          completed, or with the exception raised when checking its status.
+    """
+    key = (client.client_id, flow_id)
+    with self._condition:
+      watched_flow = self._flows.get(key)
+      if not watched_flow:
+        watched_flow = _WatchedFlow(
+            client, flow_id, time.time(), self._minimum_interval)
+        self._flows[key] = watched_flow
+        self._condition.notify()
+
+      if not self._thread:
+        # The thread runs in the caller's context, so that the time its
+        # requests are queued is attributed to the calling module.
+        self._thread = threading.Thread(
+            target=contextvars.copy_context().run, args=(self._Run,),
+            name='GRRFlowMonitor', daemon=True)
+        self._thread.start()
+
+    return watched_flow.future
@@ -1,16 +1,22 @@
 # -*- coding: utf-8 -*-
 """Definition of modules for collecting data from GRR hosts."""
 
+from concurrent import futures
 import datetime
 import os
 import re
+import stat
 import threading
 import time
 import zipfile
 
 from grr_api_client import errors as grr_errors
-from grr_response_proto import flows_pb2, timeline_pb2
+from grr_response_proto import flows_pb2, jobs_pb2, timeline_pb2
 
+from dftimewolf.lib import grr_timeline
+from dftimewolf.lib import tracing
+from dftimewolf.lib import zip_stream
+from dftimewolf.lib.collectors import grr_flow_monitor
 from dftimewolf.lib.collectors.grr_base import GRRBaseModule
 from dftimewolf.lib.containers import containers
 from dftimewolf.lib.errors import DFTimewolfError
@@ -28,7 +34,16 @@ class GRRFlow(GRRBaseModule):  # pylint: disable=abstract-method
     keepalive (bool): True if the GRR keepalive functionality should be used.
   """
   _CHECK_APPROVAL_INTERVAL_SEC = 10
+  # Flows are checked right away, then at intervals growing from the minimum
+  # to the maximum interval.
   _CHECK_FLOW_INTERVAL_SEC = 10
+  _MIN_CHECK_FLOW_INTERVAL_SEC = 1
+
+  # Number of seconds resolved clients are cached in the state, so that other
+  # GRR modules of the recipe do not search for the same hosts again.
+  _CLIENT_CACHE_TTL_SEC = 300
+  # Maximum number of hostnames searched for concurrently.
+  _MAX_CLIENT_SEARCH_WORKERS = 10
 
   _CLIENT_ID_REGEX = re.compile(r'^c\.[0-9a-f]{16}$', re.IGNORECASE)
 
@@ -42,6 +57,10 @@ class GRRFlow(GRRBaseModule):  # pylint: disable=abstract-method
     """
     super(GRRFlow, self).__init__(state, critical=critical)
     self.keepalive = False
+    self._flow_monitor = grr_flow_monitor.GRRFlowMonitor(
+        minimum_interval=self._MIN_CHECK_FLOW_INTERVAL_SEC,
+        maximum_interval=self._CHECK_FLOW_INTERVAL_SEC,
+        request_callback=self._WaitForRequestToken)
 
   # TODO: change object to more specific GRR type information.
   def _GetClientByHostname(self, hostname):
@@ -56,14 +75,58 @@ class GRRFlow(GRRBaseModule):  # pylint: disable=abstract-method
     Raises:
       DFTimewolfError: if no client ID found for hostname.
     """
+    try:
+      return self._SearchClientByHostname(hostname)
+    except DFTimewolfError as exception:
+      self.ModuleError(exception.message, critical=True)
+
+  def _GetClientCacheKey(self, hostname):
+    """Builds the name under which a hostname's client is cached.
+
+    Clients are bound to the GRR server and user of the module that found
+    them, so both are part of the name.
+
+    Args:
+      hostname (str): hostname.
+
+    Returns:
+      str: name of the cached client in the state's cache.
+    """
+    return 'grr_client:{0!s}:{1!s}:{2:s}'.format(
+        self.grr_url, self.grr_username, hostname.lower())
+
+  # TODO: change object to more specific GRR type information.
+  def _SearchClientByHostname(self, hostname):
+    """Searches GRR by hostname and get the latest active client.
+
+    Clients found are cached in the state for a short time.
+
+    Args:
+      hostname (str): hostname to search for.
+
+    Returns:
+      object: GRR API Client object
+
+    Raises:
+      DFTimewolfError: if the search failed or no client ID found for
+          hostname. The error is not added to the state.
+    """
+    cache_key = self._GetClientCacheKey(hostname)
+    client = self.state.GetFromCache(cache_key)
+    if client:
+      self.logger.info('Found cached client {0:s} for {1:s}'.format(
+          client.client_id, hostname))
+      return client
+
     # Search for the hostname in GRR
     self.logger.info('Searching for client: {0:s}'.format(hostname))
+    self._WaitForRequestToken()
     try:
       search_result = self.grr_api.SearchClients(hostname)
     except grr_errors.UnknownError as exception:
-      self.ModuleError('Could not search for host {0:s}: {1!s}'.format(
+      raise DFTimewolfError('Could not search for host {0:s}: {1!s}'.format(
           hostname, exception
-      ), critical=True)
+      ), name=self.name, critical=True)
 
     result = []
     for client in search_result:
@@ -71,10 +134,22 @@ class GRRFlow(GRRBaseModule):  # pylint: disable=abstract-method
         result.append((client.data.last_seen_at, client))
 
     if not result:
-      self.ModuleError('Could not get client_id for {0:s}'.format(
-          hostname), critical=True)
+      raise DFTimewolfError('Could not get client_id for {0:s}'.format(
+          hostname), name=self.name, critical=True)
 
-    last_seen, client = sorted(result, key=lambda x: x[0], reverse=True)[0]
+    _, client = sorted(result, key=lambda x: x[0], reverse=True)[0]
+    self._AddClientToCache(hostname, client)
+    return client
+
+  # TODO: change object to more specific GRR type information.
+  def _AddClientToCache(self, hostname, client):
+    """Caches the client found for a hostname in the state.
+
+    Args:
+      hostname (str): hostname the client was found for.
+      client (object): GRR API Client object.
+    """
+    last_seen = client.data.last_seen_at
     # Remove microseconds and create datetime object
     last_seen_datetime = datetime.datetime.utcfromtimestamp(
         last_seen / 1000000)
@@ -90,25 +165,63 @@ class GRRFlow(GRRBaseModule):  # pylint: disable=abstract-method
         last_seen_datetime.strftime('%Y-%m-%dT%H:%M:%S+0000'),
         last_seen_minutes))
 
-    return client
+    self.state.AddToCache(
+        self._GetClientCacheKey(hostname), client,
+        ttl=self._CLIENT_CACHE_TTL_SEC)
 
   # TODO: change object to more specific GRR type information.
   def _FindClients(self, hosts):
     """Finds GRR clients given a list of hosts.
 
+    Hosts are searched for individually and concurrently, since GRR ANDs
+    the keywords of a search query and indexes FQDNs by prefix, so that one
+    query cannot match several hosts. Hostnames are case-insensitive, so a
+    host listed several times is only searched for, and its client only
+    returned, once. Hosts that cannot be found are reported as non-critical
+    errors, once all the hosts have been searched for.
+
     Args:
       hosts (list[str]): FQDNs of hosts.
 
     Returns:
-      list[object]: GRR client objects.
+      list[object]: GRR client objects, in the order of the hosts.
+
+    Raises:
+      DFTimewolfError: if no client was found for any of the hosts.
     """
-    # TODO(tomchop): Thread this
-    clients = []
+    unique_hosts = {}
     for host in hosts:
-      clients.append(self._GetClientByHostname(host))
-    return [client for client in clients if client is not None]
+      unique_hosts.setdefault(host.lower(), host)
+    hosts = list(unique_hosts.values())
+    if not hosts:
+      return []
+
+    clients = {}
+    search_errors = []
+    max_workers = min(len(hosts), self._MAX_CLIENT_SEARCH_WORKERS)
+    with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+      future_to_host = {
+          self._SubmitInContext(
+              executor, self._SearchClientByHostname, host): host
+          for host in hosts}
+      for future in futures.as_completed(future_to_host):
+        host = future_to_host[future]
+        try:
+          clients[host] = future.result()
+        except DFTimewolfError as exception:
+          search_errors.append(exception.message)
+
+    for message in search_errors:
+      self.ModuleError(message, critical=False)
+    if not clients:
+      self.ModuleError(
+          'Could not find any GRR client for: {0:s}'.format(', '.join(hosts)),
+          critical=True)
+
+    return [clients[host] for host in hosts if host in clients]
 
   # TODO: change object to more specific GRR type information.
+  @tracing.TraceMethod(category='grr')
   def _LaunchFlow(self, client, name, args):
     """Creates the specified flow, setting KeepAlive if requested.
 
@@ -140,9 +253,13 @@ class GRRFlow(GRRBaseModule):  # pylint: disable=abstract-method
     return flow_id
 
   # TODO: change object to more specific GRR type information.
+  @tracing.TraceMethod(category='grr')
   def _AwaitFlow(self, client, flow_id):
     """Waits for a specific GRR flow to complete.
 
+    The flow is tracked by the module's flow monitor, along with the other
+    flows the module waits for.
+
     Args:
       client (object): GRR Client object in which to await the flow.
       flow_id (str): GRR identifier of the flow to await.
@@ -151,35 +268,40 @@ class GRRFlow(GRRBaseModule):  # pylint: disable=abstract-method
       DFTimewolfError: if flow error encountered.
     """
     self.logger.info('{0:s}: Waiting to finish'.format(flow_id))
-    while True:
-      try:
-        status = client.Flow(flow_id).Get().data
-      except grr_errors.UnknownError:
-        msg = 'Unable to stat flow {0:s} for host {1:s}'.format(
-            flow_id, client.data.os_info.fqdn.lower())
-        self.ModuleError(msg, critical=True)
-
-      if status.state == flows_pb2.FlowContext.ERROR:
-        # TODO(jbn): If one artifact fails, what happens? Test.
-        message = status.context.backtrace
-        if 'ArtifactNotRegisteredError' in status.context.backtrace:
-          message = status.context.backtrace.split('\n')[-2]
-        raise DFTimewolfError(
-            '{0:s}: FAILED! Message from GRR:\n{1:s}'.format(
-                flow_id, message))
-
-      if status.state == flows_pb2.FlowContext.TERMINATED:
-        self.logger.info('{0:s}: Complete'.format(flow_id))
-        break
-      time.sleep(self._CHECK_FLOW_INTERVAL_SEC)
+    try:
+      status = self._flow_monitor.Watch(client, flow_id).result()
+    except grr_errors.UnknownError:
+      msg = 'Unable to stat flow {0:s} for host {1:s}'.format(
+          flow_id, client.data.os_info.fqdn.lower())
+      self.ModuleError(msg, critical=True)
+
+    if status.state == flows_pb2.FlowContext.ERROR:
+      # TODO(jbn): If one artifact fails, what happens? Test.
+      message = status.context.backtrace
+      if 'ArtifactNotRegisteredError' in status.context.backtrace:
+        message = status.context.backtrace.split('\n')[-2]
+      raise DFTimewolfError(
+          '{0:s}: FAILED! Message from GRR:\n{1:s}'.format(
+              flow_id, message))
+
+    self.logger.info('{0:s}: Complete'.format(flow_id))
 
   # TODO: change object to more specific GRR type information.
-  def _DownloadFiles(self, client, flow_id):
+  @tracing.TraceMethod(category='grr')
+  def _DownloadFiles(self, client, flow_id, output_directory=None):
     """Download files from the specified flow.
 
+    The flow archive is extracted as it is downloaded. Archives that cannot
+    be extracted from a stream are downloaded again to a temporary ZIP file,
+    and extracted from it. Extracted files are deduplicated by the blob store,
+    if enabled.
+
     Args:
       client (object): GRR Client object to which to download flow data from.
       flow_id (str): GRR identifier of the flow.
+      output_directory (Optional[str]): directory to extract the files to,
+          by default a directory of the output path named after the client
+          FQDN.
 
     Returns:
       str: path of downloaded files.
@@ -192,19 +314,40 @@ class GRRFlow(GRRBaseModule):  # pylint: disable=abstract-method
           '{0:s} already exists: Skipping'.format(output_file_path))
       return None
 
+    client_output_file = output_directory
+    if not client_output_file:
+      fqdn = client.data.os_info.fqdn.lower()
+      client_output_file = os.path.join(self.output_path, fqdn)
+    if not os.path.isdir(client_output_file):
+      os.makedirs(client_output_file)
+
+    self._WaitForRequestToken()
     flow = client.Flow(flow_id)
+    try:
+      extracted_paths = zip_stream.ExtractZipStream(
+          flow.GetFilesArchive(), client_output_file)
+      self._DeduplicateFiles(client_output_file, paths=extracted_paths)
+      return client_output_file
+    except zipfile.BadZipFile as exception:
+      self.logger.warning(
+          '{0:s}: Unable to extract archive while downloading it: {1!s}'
+          .format(flow_id, exception))
+
+    self._WaitForRequestToken()
     file_archive = flow.GetFilesArchive()
     file_archive.WriteToFile(output_file_path)
 
     # Unzip archive for processing and remove redundant zip
-    fqdn = client.data.os_info.fqdn.lower()
-    client_output_file = os.path.join(self.output_path, fqdn)
-    if not os.path.isdir(client_output_file):
-      os.makedirs(client_output_file)
-
     with zipfile.ZipFile(output_file_path) as archive:
+      # Existing files are replaced rather than overwritten, since they can
+      # be hard links to blobs.
+      for name in archive.namelist():
+        path = zip_stream.GetOutputPath(client_output_file, name)
+        if path and os.path.isfile(path):
+          os.remove(path)
       archive.extractall(path=client_output_file)
     os.remove(output_file_path)
+    self._DeduplicateFiles(client_output_file)
 
     return client_output_file
 
@@ -218,8 +361,32 @@ class GRRArtifactCollector(GRRFlow):
     hostnames (list[str]): FDQNs of the GRR client hosts.
     use_tsk (bool): True if GRR should use Sleuthkit (TSK) to collect file
         system artifacts.
+    max_artifact_flows (int): maximum number of flows collecting the
+        artifacts of a host at once.
   """
 
+  # Expected number of seconds it takes to collect artifacts known to be
+  # slow, for instance because of the size of their files. Other artifacts are
+  # expected to take _DEFAULT_ARTIFACT_COST_SEC. The expected costs are
+  # replaced by the durations of the flows that collected the artifacts, as
+  # flows complete.
+  _ARTIFACT_COSTS_SEC = {
+      'LinuxAuditLogs': 120,
+      'MacOSAppleSystemLogFiles': 300,
+      'MacOSSystemLogFiles': 300,
+      'WindowsEventLogs': 300,
+      'WindowsSearchDatabase': 900,
+      'WindowsSuperFetchFiles': 120,
+      'WindowsSystemRegistryFiles': 120,
+      'WindowsUserRegistryFiles': 120
+  }
+  _DEFAULT_ARTIFACT_COST_SEC = 30
+
+  # Expected number of seconds of the artifacts collected by a same flow, when
+  # artifacts are split across several flows. Artifacts expected to take
+  # longer are collected by flows of their own.
+  _ARTIFACT_FLOW_COST_SEC = 120
+
   _DEFAULT_ARTIFACTS_LINUX = [
       'LinuxAuditLogs', 'LinuxAuthLogs', 'LinuxCronLogs', 'LinuxWtmp',
       'AllUsersShellHistory', 'ZeitgeistDatabase'
@@ -253,12 +420,15 @@ class GRRArtifactCollector(GRRFlow):
     self.extra_artifacts = []
     self.hostnames = None
     self.use_tsk = False
+    self.max_artifact_flows = 1
+    self._artifact_costs = dict(self._ARTIFACT_COSTS_SEC)
+    self._artifact_costs_lock = threading.Lock()
 
   # pylint: disable=arguments-differ,too-many-arguments
   def SetUp(self,
             hosts, artifacts, extra_artifacts, use_tsk,
             reason, grr_server_url, grr_username, grr_password, approvers=None,
-            verify=True):
+            verify=True, max_artifact_flows=1):
     """Initializes a GRR artifact collector.
 
     Args:
@@ -274,6 +444,11 @@ class GRRArtifactCollector(GRRFlow):
       approvers (Optional[str]): list of GRR approval recipients.
       verify (Optional[bool]): True to indicate GRR server's x509 certificate
           should be verified.
+      max_artifact_flows (Optional[int]): maximum number of flows collecting
+          the artifacts of a host at once. Artifacts are split across flows
+          by expected cost, so that the files of quick artifacts are
+          downloaded without waiting for slow ones, and a failing artifact
+          only fails its flow. 1 collects all artifacts with a single flow.
     """
     super(GRRArtifactCollector, self).SetUp(
         reason, grr_server_url, grr_username, grr_password, approvers=approvers,
@@ -288,12 +463,123 @@ class GRRArtifactCollector(GRRFlow):
 
     self.hostnames = [item.strip() for item in hosts.strip().split(',')]
     self.use_tsk = use_tsk
+    self.max_artifact_flows = max(int(max_artifact_flows or 1), 1)
+
+  def _GetArtifactCost(self, artifact):
+    """Retrieves the expected cost of collecting an artifact.
+
+    Args:
+      artifact (str): artifact definition name.
+
+    Returns:
+      float: expected number of seconds it takes to collect the artifact.
+    """
+    with self._artifact_costs_lock:
+      return self._artifact_costs.get(
+          artifact, self._DEFAULT_ARTIFACT_COST_SEC)
+
+  def _RecordArtifactCosts(self, artifact_list, duration):
+    """Records the duration of a flow collecting artifacts.
+
+    The duration is shared between the artifacts in proportion to their
+    expected costs, and averaged with their expected costs.
+
+    Args:
+      artifact_list (list[str]): artifact definition names collected by the
+          flow.
+      duration (float): number of seconds the flow took.
+    """
+    costs = {
+        artifact: self._GetArtifactCost(artifact)
+        for artifact in artifact_list}
+    total_cost = sum(costs.values())
+    with self._artifact_costs_lock:
+      for artifact, cost in costs.items():
+        measured_cost = duration * cost / total_cost
+        self._artifact_costs[artifact] = (cost + measured_cost) / 2
+
+  def _GroupArtifacts(self, artifact_list):
+    """Groups artifacts to be collected by the same flows.
+
+    Artifacts are sorted by expected cost, and quick artifacts are grouped
+    until a group's expected cost reaches _ARTIFACT_FLOW_COST_SEC. Slow
+    artifacts are in groups of their own. If there are more groups than
+    max_artifact_flows, the two quickest groups are merged until there are
+    not, so that the slowest artifacts keep flows of their own.
+
+    Args:
+      artifact_list (list[str]): artifact definition names.
+
+    Returns:
+      list[list[str]]: groups of artifact definition names, quickest first.
+    """
+    groups = []
+    group_cost = 0
+    for artifact in sorted(artifact_list, key=self._GetArtifactCost):
+      cost = self._GetArtifactCost(artifact)
+      if not groups or group_cost + cost > self._ARTIFACT_FLOW_COST_SEC:
+        groups.append([])
+        group_cost = 0
+      groups[-1].append(artifact)
+      group_cost += cost
+
+    def _GetGroupCost(group):
+      return sum(self._GetArtifactCost(artifact) for artifact in group)
+
+    while len(groups) > self.max_artifact_flows:
+      groups.sort(key=_GetGroupCost)
+      groups[:2] = [groups[0] + groups[1]]
+    return sorted(groups, key=_GetGroupCost)
+
+  # TODO: change object to more specific GRR type information.
+  def _CollectArtifacts(self, client, artifact_list, output_directory=None):
+    """Collects artifacts from a client with a flow, and stores their files.
+
+    Args:
+      client (object): GRR client object to act on.
+      artifact_list (list[str]): artifact definition names.
+      output_directory (Optional[str]): directory to download the files to,
+          by default a directory named after the client FQDN.
+
+    Raises:
+      DFTimewolfError: if the flow could not be launched or failed.
+    """
+    flow_args = flows_pb2.ArtifactCollectorFlowArgs(
+        artifact_list=artifact_list,
+        use_tsk=self.use_tsk,
+        ignore_interpolation_errors=True,
+        apply_parsers=False)
+    # The flow may be queued by the GRR server before it starts, so its
+    # duration is measured from its launch.
+    start_time = time.time()
+    flow_id = self._LaunchFlow(client, 'ArtifactCollectorFlow', flow_args)
+    if not flow_id:
+      msg = 'Flow could not be launched on {0:s}.'.format(client.client_id)
+      msg += '\nArtifactCollectorFlow args: {0!s}'.format(flow_args)
+      self.ModuleError(msg, critical=True)
+    self._AwaitFlow(client, flow_id)
+    self._RecordArtifactCosts(artifact_list, time.time() - start_time)
+
+    collected_flow_data = self._DownloadFiles(
+        client, flow_id, output_directory=output_directory)
+
+    if collected_flow_data:
+      self.logger.info(
+          '{0!s}: Downloaded: {1:s}'.format(flow_id, collected_flow_data))
+      container = containers.File(
+          name=client.data.os_info.fqdn.lower(),
+          path=collected_flow_data
+      )
+      self.state.StoreContainer(container)
 
   # TODO: change object to more specific GRR type information.
   def _ProcessThread(self, client):
     """Processes a single GRR client.
 
-    This function is used as a callback for the processing thread.
+    This function is used as a callback for the processing thread. When
+    max_artifact_flows is more than 1, groups of artifacts are collected by
+    concurrent flows, and the files of each group are stored as soon as its
+    flow completes.
 
     Args:
       client (object): a GRR client object.
@@ -323,27 +609,32 @@ class GRRArtifactCollector(GRRFlow):
     if not artifact_list:
       return
 
-    flow_args = flows_pb2.ArtifactCollectorFlowArgs(
-        artifact_list=artifact_list,
-        use_tsk=self.use_tsk,
-        ignore_interpolation_errors=True,
-        apply_parsers=False)
-    flow_id = self._LaunchFlow(client, 'ArtifactCollectorFlow', flow_args)
-    if not flow_id:
-      msg = 'Flow could not be launched on {0:s}.'.format(client.client_id)
-      msg += '\nArtifactCollectorFlow args: {0!s}'.format(flow_args)
-      self.ModuleError(msg, critical=True)
-    self._AwaitFlow(client, flow_id)
-    collected_flow_data = self._DownloadFiles(client, flow_id)
+    groups = self._GroupArtifacts(artifact_list)
+    if len(groups) == 1:
+      self._CollectArtifacts(client, artifact_list)
+      return
 
-    if collected_flow_data:
-      self.logger.info(
-          '{0!s}: Downloaded: {1:s}'.format(flow_id, collected_flow_data))
-      container = containers.File(
-          name=client.data.os_info.fqdn.lower(),
-          path=collected_flow_data
-      )
-      self.state.StoreContainer(container)
+    fqdn = client.data.os_info.fqdn.lower()
+    with futures.ThreadPoolExecutor(max_workers=len(groups)) as executor:
+      group_futures = {}
+      for index, group in enumerate(groups):
+        # Each group is downloaded to a directory of its own, so that every
+        # file container holds the files of a single flow.
+        output_directory = os.path.join(
+            self.output_path, '{0:s}.{1:d}'.format(fqdn, index))
+        future = self._SubmitInContext(
+            executor, self._CollectArtifacts, client, group, output_directory)
+        group_futures[future] = group
+      for future in futures.as_completed(group_futures):
+        try:
+          future.result()
+        except DFTimewolfError as exception:
+          if exception.critical:
+            raise
+          if not self.state.HasError(exception):
+            self.ModuleError('{0:s}: collection of {1:s} failed: {2:s}'.format(
+                client.client_id, ', '.join(group_futures[future]),
+                exception.message), critical=False)
 
   def Process(self):
     """Collects artifacts from a host with GRR.
@@ -351,15 +642,10 @@ class GRRArtifactCollector(GRRFlow):
     Raises:
       DFTimewolfError: if no artifacts specified nor resolved by platform.
     """
-    threads = []
-    for client in self._FindClients(self.hostnames):
+    clients = self._FindClients(self.hostnames)
+    for client in clients:
       self.logger.info(client)
-      thread = threading.Thread(target=self._ProcessThread, args=(client, ))
-      threads.append(thread)
-      thread.start()
-
-    for thread in threads:
-      thread.join()
+    self._ProcessClients(self._ProcessThread, clients)
 
 
 class GRRFileCollector(GRRFlow):
@@ -457,14 +743,8 @@ class GRRFileCollector(GRRFlow):
     Raises:
       DFTimewolfError: if no files specified.
     """
-    threads = []
-    for client in self._FindClients(self.hostnames):
-      thread = threading.Thread(target=self._ProcessThread, args=(client, ))
-      threads.append(thread)
-      thread.start()
-
-    for thread in threads:
-      thread.join()
+    self._ProcessClients(
+        self._ProcessThread, self._FindClients(self.hostnames))
 
 
 class GRRFlowCollector(GRRFlow):
@@ -527,15 +807,25 @@ class GRRFlowCollector(GRRFlow):
 
 class GRRTimelineCollector(GRRFlow):
   """Timeline collector for GRR flows.
+
+  The timelines of several root paths of a host are collected by flows
+  running in parallel, and merged into a single timeline of the host.
+
   Attributes:
-    root_path (str): root path.
+    root_paths (list[bytes]): paths to start the recursive timelines from, or
+        an empty list to collect the timeline of the host's root directory.
     hostnames (list[str]): FDQNs of the GRR client hosts.
   """
 
+  # Root directories of the timelines collected when no root paths are
+  # specified, per OS.
+  _ROOT_DIRECTORIES = {'Windows': 'C:\\'}
+  _DEFAULT_ROOT_DIRECTORY = '/'
+
   def __init__(self, state):
     super(GRRTimelineCollector, self).__init__(state)
     self._clients = []
-    self.root_path = None
+    self.root_paths = []
     self.hostnames = None
     self._timeline_format = None
 
@@ -549,7 +839,8 @@ class GRRTimelineCollector(GRRFlow):
     """Initializes a GRR timeline collector.
     Args:
       hosts (str): comma-separated hostnames to launch the flow on.
-      root_path (str): path to start the recursive timeline.
+      root_path (str): comma-separated paths to start the recursive timelines
+          from, or None to use the default root paths of each host's OS.
       reason (str): justification for GRR access.
       timeline_format (str): Timeline format (1 is BODY, 2 is RAW).
       grr_server_url (str): GRR server URL.
@@ -563,26 +854,110 @@ class GRRTimelineCollector(GRRFlow):
         reason, grr_server_url, grr_username, grr_password,
         approvers=approvers, verify=verify)
 
-    if root_path is not None:
-      self.root_path = root_path.strip()
+    if root_path:
+      self.root_paths = [
+          item.strip().encode() for item in root_path.split(',')
+          if item.strip()]
 
     self.hostnames = [item.strip() for item in hosts.strip().split(',')]
     self._timeline_format = int(timeline_format)
-    self.root_path = root_path.encode()
     if self._timeline_format not in [1, 2]:
       self.ModuleError('Timeline format must be 1 (BODY) or 2 (RAW).',
                        critical=True)
 
   # TODO: change object to more specific GRR type information.
-  def _ProcessThread(self, client):
-    """Processes a single client.
-    This function is used as a callback for the processing thread.
+  def _ListDirectory(self, client, path):
+    """Lists the entries of a directory of a client.
+
     Args:
       client (object): GRR client object to act on.
+      path (str): path of the directory.
+
+    Returns:
+      list[jobs_pb2.StatEntry]: entries of the directory.
+
+    Raises:
+      DFTimewolfError: if the directory could not be listed.
+    """
+    list_directory_args = flows_pb2.ListDirectoryArgs(
+        pathspec=jobs_pb2.PathSpec(
+            path=path, pathtype=jobs_pb2.PathSpec.OS))
+    flow_id = self._LaunchFlow(client, 'ListDirectory', list_directory_args)
+    if not flow_id:
+      raise DFTimewolfError('Unable to list {0:s}'.format(path))
+    self._AwaitFlow(client, flow_id)
+    return [result.payload for result in client.Flow(flow_id).ListResults()]
+
+  # TODO: change object to more specific GRR type information.
+  def _GetRootPaths(self, client):
+    """Determines the root paths of the timelines of a client.
+
+    Without root paths specified, the root directory of the client is listed,
+    and the timeline of each of its subdirectories is collected separately.
+    The other entries of the root directory are written to a timeline of
+    their own, so that the timelines cover the whole root directory. The
+    timeline of the root directory is collected at once if it cannot be
+    listed.
+
+    Args:
+      client (object): GRR client object.
+
+    Returns:
+      tuple[list[bytes], str]: root paths, and path of the timeline of the
+          entries of the root directory that are not directories, or None if
+          there are none.
+    """
+    if self.root_paths:
+      return self.root_paths, None
+
+    root_directory = self._ROOT_DIRECTORIES.get(
+        client.data.os_info.system, self._DEFAULT_ROOT_DIRECTORY)
+    try:
+      stat_entries = self._ListDirectory(client, root_directory)
+    except DFTimewolfError as exception:
+      self.logger.warning(
+          '{0:s}: Unable to list {1:s}, collecting its timeline at once: '
+          '{2:s}'.format(client.client_id, root_directory, exception.message))
+      return [root_directory.encode()], None
+
+    root_paths = []
+    timeline_entries = []
+    for stat_entry in stat_entries:
+      name = stat_entry.pathspec.path.rstrip('/').rsplit('/', 1)[-1]
+      path = (root_directory + name).encode()
+      if stat.S_ISDIR(stat_entry.st_mode):
+        root_paths.append(path)
+        continue
+      timeline_entries.append(timeline_pb2.TimelineEntry(
+          path=path, mode=stat_entry.st_mode, size=stat_entry.st_size,
+          dev=stat_entry.st_dev, ino=stat_entry.st_ino,
+          uid=stat_entry.st_uid, gid=stat_entry.st_gid,
+          atime_ns=stat_entry.st_atime * 1000000000,
+          mtime_ns=stat_entry.st_mtime * 1000000000,
+          ctime_ns=stat_entry.st_ctime * 1000000000))
+
+    if not timeline_entries:
+      return root_paths, None
+
+    extension = 'body' if self._timeline_format == 1 else 'raw'
+    timeline_path = os.path.join(self.output_path, '{0:s}_root.{1:s}'.format(
+        client.client_id, extension))
+    grr_timeline.WriteTimeline(
+        timeline_entries, timeline_path, self._timeline_format)
+    return root_paths, timeline_path
+
+  # TODO: change object to more specific GRR type information.
+  def _CollectTimeline(self, client, root_path):
+    """Collects the timeline of a root path of a client.
+
+    Args:
+      client (object): GRR client object to act on.
+      root_path (bytes): path to start the recursive timeline from.
+
+    Returns:
+      str: path of the downloaded timeline, or None if it was already
+          downloaded.
     """
-    root_path = self.root_path
-    if not root_path:
-      return
     self.logger.info(
         'Timeline to start from "{0:s}" items'.format(root_path.decode()))
 
@@ -593,9 +968,82 @@ class GRRTimelineCollector(GRRFlow):
     if collected_flow_data:
       self.logger.info(
           '{0!s}: Downloaded: {1:s}'.format(flow_id, collected_flow_data))
+    return collected_flow_data
+
+  # TODO: change object to more specific GRR type information.
+  def _MergeTimelines(self, client, timeline_paths):
+    """Merges the timelines of the root paths of a client.
+
+    Args:
+      client (object): GRR client object the timelines were collected from.
+      timeline_paths (list[str]): paths of the timelines.
+
+    Returns:
+      str: path of the merged timeline, or None if the timelines could not be
+          merged.
+    """
+    extension = 'body' if self._timeline_format == 1 else 'raw'
+    output_file_path = os.path.join(
+        self.output_path, '.'.join((client.client_id, extension)))
+    try:
+      with self.state.tracer.Span(
+          'Merge GRR timelines', category='grr', path=output_file_path):
+        grr_timeline.MergeTimelines(
+            timeline_paths, output_file_path, self._timeline_format)
+    except OSError as exception:
+      self.ModuleError(
+          'Unable to merge the timelines of {0:s}: {1!s}'.format(
+              client.client_id, exception), critical=False)
+      if os.path.exists(output_file_path):
+        os.remove(output_file_path)
+      return None
+
+    for timeline_path in timeline_paths:
+      os.remove(timeline_path)
+    return output_file_path
+
+  # TODO: change object to more specific GRR type information.
+  def _ProcessThread(self, client):
+    """Processes a single client.
+
+    This function is used as a callback for the processing thread. The
+    timelines of the root paths are collected in parallel, and merged into a
+    single timeline. The timelines are kept separate if they cannot be
+    merged.
+
+    Args:
+      client (object): GRR client object to act on.
+    """
+    root_paths, root_timeline_path = self._GetRootPaths(client)
+    timeline_paths = [root_timeline_path] if root_timeline_path else []
+    with futures.ThreadPoolExecutor(
+        max_workers=max(len(root_paths), 1)) as executor:
+      timeline_futures = {
+          self._SubmitInContext(
+              executor, self._CollectTimeline, client, root_path): root_path
+          for root_path in root_paths}
+      for future in futures.as_completed(timeline_futures):
+        try:
+          timeline_path = future.result()
+        except DFTimewolfError as exception:
+          if not self.state.HasError(exception):
+            self.ModuleError('{0:s}: timeline of {1:s} failed: {2:s}'.format(
+                client.client_id, timeline_futures[future].decode(),
+                exception.message), critical=False)
+          continue
+        if timeline_path:
+          timeline_paths.append(timeline_path)
+
+    if len(timeline_paths) > 1:
+      merged_timeline_path = self._MergeTimelines(
+          client, sorted(timeline_paths))
+      if merged_timeline_path:
+        timeline_paths = [merged_timeline_path]
+
+    for timeline_path in timeline_paths:
       container = containers.File(
           name=client.data.os_info.fqdn.lower(),
-          path=collected_flow_data
+          path=timeline_path
       )
       self.state.StoreContainer(container)
 
@@ -604,14 +1052,8 @@ class GRRTimelineCollector(GRRFlow):
     Raises:
       DFTimewolfError: if no files specified.
     """
-    threads = []
-    for client in self._FindClients(self.hostnames):
-      thread = threading.Thread(target=self._ProcessThread, args=(client, ))
-      threads.append(thread)
-      thread.start()
-
-    for thread in threads:
-      thread.join()
+    self._ProcessClients(
+        self._ProcessThread, self._FindClients(self.hostnames))
 
 
   def _DownloadTimeline(self, client, flow_id):
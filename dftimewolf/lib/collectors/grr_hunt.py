@@ -1,12 +1,25 @@
 # -*- coding: utf-8 -*-
 """Definition of modules for collecting data from GRR Hunts."""
 
+from concurrent import futures
+import functools
+import json
 import os
+import shutil
+import stat
 import tempfile
+import threading
+import time
 import zipfile
 
+import requests
 import yaml
+from grr_api_client import errors as grr_errors
+from grr_api_client import hunt as grr_api_hunt
+from grr_api_client import utils as grr_utils
 from grr_response_proto import flows_pb2 as grr_flows
+from grr_response_proto import jobs_pb2
+from grr_response_proto.api import hunt_pb2
 
 from dftimewolf.lib.collectors import grr_base
 from dftimewolf.lib.containers import containers
@@ -19,8 +32,36 @@ class GRRHunt(grr_base.GRRBaseModule):  # pylint: disable=abstract-method
   """This class groups functions generic to all GRR Hunt modules.
 
   Should be extended by the modules that interact with GRR hunts.
+
+  Attributes:
+    follow_timeout (int): number of seconds to follow a started hunt for,
+        fetching the results of its clients as they complete, or 0 to only
+        start the hunt.
   """
 
+  # Number of seconds between checks of the clients that completed a followed
+  # hunt.
+  _CHECK_HUNT_INTERVAL_SEC = 60
+
+  # Prefixes of the VFS paths of files, per type of their path specification.
+  _VFS_PREFIXES = {
+      jobs_pb2.PathSpec.NTFS: 'fs/ntfs',
+      jobs_pb2.PathSpec.OS: 'fs/os',
+      jobs_pb2.PathSpec.REGISTRY: 'registry',
+      jobs_pb2.PathSpec.TMPFILE: 'temp',
+      jobs_pb2.PathSpec.TSK: 'fs/tsk'}
+
+  def __init__(self, state, critical=False):
+    """Initializes a GRR hunt module.
+
+    Args:
+      state (DFTimewolfState): recipe state.
+      critical (Optional[bool]): True if the module is critical, which causes
+          the entire recipe to fail if the module encounters an error.
+    """
+    super(GRRHunt, self).__init__(state, critical=critical)
+    self.follow_timeout = 0
+
   # TODO: change object to more specific GRR type information.
   def _CreateHunt(self, name, args):
     """Creates a GRR hunt.
@@ -44,6 +85,311 @@ class GRRHunt(grr_base.GRRBaseModule):  # pylint: disable=abstract-method
     self._WrapGRRRequestWithApproval(hunt, hunt.Start)
     return hunt
 
+  def _GetClientFQDN(self, client_info_contents):
+    """Extracts a GRR client's FQDN from its client_info.yaml file.
+
+    Args:
+      client_info_contents (str): contents of the client_info.yaml file.
+
+    Returns:
+      tuple[str, str]: client identifier and client FQDN.
+    """
+    # TODO: handle incorrect file contents.
+    yamldict = yaml.safe_load(client_info_contents)
+    fqdn = yamldict['os_info']['fqdn']
+    client_id = yamldict['client_id']
+    return client_id, fqdn
+
+  # TODO: change object to more specific GRR type information.
+  def _ListCompletedClients(self, hunt, offset=0):
+    """Lists the clients that completed the hunt.
+
+    Function is necessary for the _WrapGRRRequestWithApproval to work. The
+    request is sent through the hunt's API context, since the GRR API client
+    only lists clients from the first one.
+
+    Args:
+      hunt (object): GRR hunt object.
+      offset (Optional[int]): number of completed clients to skip.
+
+    Returns:
+      list[object]: GRR HuntClient objects.
+    """
+    args = hunt_pb2.ApiListHuntClientsArgs(
+        hunt_id=hunt.hunt_id, offset=offset,
+        client_status=hunt_pb2.ApiListHuntClientsArgs.COMPLETED)
+    # pylint: disable=protected-access
+    items = hunt._context.SendIteratorRequest('ListHuntClients', args)
+    return [
+        grr_api_hunt.HuntClient(data=data, context=hunt._context)
+        for data in items]
+
+  def _GetClientDirectory(self, hunt_id, client_id):
+    """Determines the directory the results of a client are fetched to.
+
+    Args:
+      hunt_id (str): GRR identifier of the hunt.
+      client_id (str): GRR identifier of the client.
+
+    Returns:
+      str: path of the directory.
+    """
+    return os.path.join(
+        self.output_path, 'hunt_{0:s}'.format(hunt_id.replace(':', '_')),
+        client_id)
+
+  # TODO: change object to more specific GRR type information.
+  def _ListResultsPerClient(self, hunt, offset=0):
+    """Lists the results of a hunt, grouped by client.
+
+    Function is necessary for the _WrapGRRRequestWithApproval to work. The
+    results are listed with the hunt's approval. The request is sent through
+    the hunt's API context, since the GRR API client only lists results from
+    the first one.
+
+    Args:
+      hunt (object): GRR hunt object.
+      offset (Optional[int]): number of results to skip.
+
+    Returns:
+      tuple[dict[str, list[hunt_pb2.ApiHuntResult]], int]: results per GRR
+          client identifier, and number of results listed.
+    """
+    args = hunt_pb2.ApiListHuntResultsArgs(hunt_id=hunt.hunt_id, offset=offset)
+    # pylint: disable=protected-access
+    items = hunt._context.SendIteratorRequest('ListHuntResults', args)
+    results_per_client = {}
+    number_of_results = 0
+    for result in items:
+      client_id = grr_utils.UrnStringToClientId(result.client_id)
+      results_per_client.setdefault(client_id, []).append(result)
+      number_of_results += 1
+    return results_per_client, number_of_results
+
+  def _GetResultVFSPath(self, result):
+    """Determines the VFS path of the file collected by a hunt result.
+
+    Args:
+      result (hunt_pb2.ApiHuntResult): hunt result.
+
+    Returns:
+      str: VFS path of the file, such as "fs/os/etc/passwd", or None if the
+          result is not a collected file.
+    """
+    payload = grr_utils.UnpackAny(result.payload)
+    if isinstance(payload, jobs_pb2.StatEntry):
+      stat_entry = payload
+    elif isinstance(payload, grr_flows.FileFinderResult):
+      stat_entry = payload.stat_entry
+    elif isinstance(payload, grr_flows.ArtifactFilesDownloaderResult):
+      stat_entry = payload.downloaded_file
+    else:
+      return None
+    if (not stat_entry.HasField('pathspec') or
+        stat.S_ISDIR(stat_entry.st_mode)):
+      return None
+
+    pathspecs = []
+    pathspec = stat_entry.pathspec
+    while True:
+      pathspecs.append(pathspec)
+      if not pathspec.HasField('nested_path'):
+        break
+      pathspec = pathspec.nested_path
+
+    # As in GRR, a device opened with TSK or NTFS is stored in their branch.
+    if (len(pathspecs) > 1 and pathspecs[0].pathtype == jobs_pb2.PathSpec.OS
+        and pathspecs[1].pathtype in (
+            jobs_pb2.PathSpec.TSK, jobs_pb2.PathSpec.NTFS)):
+      prefix = self._VFS_PREFIXES[pathspecs[1].pathtype]
+    else:
+      prefix = self._VFS_PREFIXES.get(pathspecs[0].pathtype)
+    if not prefix:
+      return None
+
+    components = [prefix]
+    for pathspec in pathspecs:
+      components.extend(
+          component for component in pathspec.path.split('/') if component)
+    return '/'.join(components)
+
+  # TODO: change object to more specific GRR type information.
+  def _WriteHuntFile(self, hunt, client_id, vfs_path, timestamp, output_path):
+    """Retrieves and writes a file collected by a hunt.
+
+    Function is necessary for the _WrapGRRRequestWithApproval to work. The
+    file is retrieved with the hunt's approval, rather than with an approval
+    for the client.
+
+    Args:
+      hunt (object): GRR hunt object.
+      client_id (str): GRR identifier of the client the file was collected
+          from.
+      vfs_path (str): VFS path of the file.
+      timestamp (int): timestamp of the hunt result that collected the file,
+          which GRR needs to find the file.
+      output_path (str): path to write the file to.
+    """
+    args = hunt_pb2.ApiGetHuntFileArgs(
+        hunt_id=hunt.hunt_id, client_id=client_id, vfs_path=vfs_path,
+        timestamp=timestamp)
+    # pylint: disable=protected-access
+    chunks = hunt._context.SendStreamingRequest('GetHuntFile', args)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, 'wb') as file_object:
+      for chunk in chunks:
+        file_object.write(chunk)
+
+  def _GetClientFQDNById(self, client_id):
+    """Retrieves the FQDN of a GRR client.
+
+    Client metadata is readable without an approval.
+
+    Args:
+      client_id (str): GRR identifier of the client.
+
+    Returns:
+      str: FQDN of the client, or its identifier if unknown.
+    """
+    try:
+      fqdn = self.grr_api.Client(client_id).Get().data.os_info.fqdn
+    except grr_errors.Error as exception:
+      self.logger.warning('Could not get FQDN of client {0:s}: {1!s}'.format(
+          client_id, exception))
+      return client_id
+    return fqdn or client_id
+
+  # TODO: change object to more specific GRR type information.
+  def _DownloadClientResults(self, hunt, results_per_client, hunt_client):
+    """Fetches the results of a client of a hunt.
+
+    The files collected from the client are fetched one by one with the
+    hunt's approval, so that no approval is needed per client, and a File
+    container is stored for them. Errors are reported as non-critical.
+
+    Args:
+      hunt (object): GRR hunt object.
+      results_per_client (dict[str, list[hunt_pb2.ApiHuntResult]]): results
+          of the hunt per GRR client identifier.
+      hunt_client (object): GRR HuntClient object.
+
+    Returns:
+      str: FQDN of the client, or its identifier if unknown, or None if its
+          results could not be fetched.
+    """
+    client_id = hunt_client.client_id
+    client_directory = self._GetClientDirectory(hunt.hunt_id, client_id)
+    extracted_paths = []
+    try:
+      for result in results_per_client.get(client_id, []):
+        vfs_path = self._GetResultVFSPath(result)
+        if not vfs_path:
+          continue
+        path = os.path.join(client_directory, *vfs_path.split('/'))
+        self._WrapGRRRequestWithApproval(
+            hunt, self._WriteHuntFile, hunt, client_id, vfs_path,
+            result.timestamp, path)
+        extracted_paths.append(path)
+    except (OSError, grr_errors.Error) as exception:
+      shutil.rmtree(client_directory, ignore_errors=True)
+      self.ModuleError('Could not fetch results of client {0:s}: {1!s}'.format(
+          client_id, exception), critical=False)
+      return None
+
+    if not extracted_paths:
+      self.logger.info('{0:s}: No files collected from {1:s}'.format(
+          hunt.hunt_id, client_id))
+      return None
+
+    fqdn = self._GetClientFQDNById(client_id)
+    self._DeduplicateFiles(client_directory, paths=extracted_paths)
+
+    container = containers.File(name=fqdn, path=client_directory)
+    self.state.StoreContainer(container)
+    return fqdn
+
+  # TODO: change object to more specific GRR type information.
+  def _FollowHunt(self, hunt):
+    """Fetches the results of the clients of a running hunt as they complete.
+
+    The hunt is checked every _CHECK_HUNT_INTERVAL_SEC seconds, and the
+    results of the clients that completed it since the previous check are
+    fetched in parallel, so that modules processing them can start before
+    the hunt ends. The results are fetched with the hunt's approval. The hunt
+    is followed until it is stopped or completed, or for follow_timeout
+    seconds.
+
+    Each check only lists the clients and results after those listed by the
+    previous checks. Completed clients are not necessarily listed in the
+    order they completed, so they are all listed again once the hunt ended.
+
+    Args:
+      hunt (object): GRR hunt object.
+    """
+    deadline = time.time() + self.follow_timeout
+    fetched_client_ids = set()
+    clients_offset = 0
+    results_offset = 0
+    pending_results_per_client = {}
+    while True:
+      hunt_data = self._WrapGRRRequestWithApproval(hunt, hunt.Get).data
+      hunt_ended = hunt_data.state in (
+          hunt_pb2.ApiHunt.STOPPED, hunt_pb2.ApiHunt.COMPLETED)
+      if hunt_ended:
+        clients_offset = 0
+      hunt_clients = self._WrapGRRRequestWithApproval(
+          hunt, self._ListCompletedClients, hunt, clients_offset)
+      clients_offset += len(hunt_clients)
+      new_clients = [
+          hunt_client for hunt_client in hunt_clients
+          if hunt_client.client_id not in fetched_client_ids]
+      if new_clients:
+        # Results are listed after the clients, so that the completed clients
+        # have all their results listed. Results are listed in the order they
+        # were received, so the results of clients that have not completed
+        # yet are kept for the next checks.
+        results_per_client, number_of_results = (
+            self._WrapGRRRequestWithApproval(
+                hunt, self._ListResultsPerClient, hunt, results_offset))
+        results_offset += number_of_results
+        for client_id, results in results_per_client.items():
+          if client_id not in fetched_client_ids:
+            pending_results_per_client.setdefault(client_id, []).extend(
+                results)
+      self.logger.info(
+          '{0:s}: {1:d} of {2:d} clients completed, {3:d} of them new'.format(
+              hunt.hunt_id, hunt_data.completed_clients_count,
+              hunt_data.all_clients_count, len(new_clients)))
+
+      # Clients whose results could not be fetched are not fetched again, so
+      # that their errors are only reported once.
+      fetched_client_ids.update(
+          hunt_client.client_id for hunt_client in new_clients)
+      results_per_client = {
+          hunt_client.client_id: pending_results_per_client.pop(
+              hunt_client.client_id, [])
+          for hunt_client in new_clients}
+      self._ProcessClients(
+          functools.partial(
+              self._DownloadClientResults, hunt, results_per_client),
+          new_clients)
+
+      # Clients are listed after the state is read, so no client completes
+      # the hunt after the last listing.
+      if hunt_ended:
+        self.logger.info('{0:s}: Hunt {1:s}'.format(
+            hunt.hunt_id, hunt_pb2.ApiHunt.State.Name(hunt_data.state).lower()))
+        return
+
+      remaining_time = deadline - time.time()
+      if remaining_time <= 0:
+        self.logger.info((
+            '{0:s}: Stopped following the hunt after {1:d} seconds, fetch '
+            'the results of later clients with GRRHuntDownloader').format(
+                hunt.hunt_id, self.follow_timeout))
+        return
+      time.sleep(min(self._CHECK_HUNT_INTERVAL_SEC, remaining_time))
+
 
 class GRRHuntArtifactCollector(GRRHunt):
   """Artifact collector for GRR hunts.
@@ -73,7 +419,7 @@ class GRRHuntArtifactCollector(GRRHunt):
   def SetUp(self,
             artifacts, use_tsk,
             reason, grr_server_url, grr_username, grr_password, approvers=None,
-            verify=True):
+            verify=True, follow_timeout=None):
     """Initializes a GRR Hunt artifact collector.
 
     Args:
@@ -87,6 +433,10 @@ class GRRHuntArtifactCollector(GRRHunt):
       approvers (Optional[str]): comma-separated GRR approval recipients.
       verify (Optional[bool]): True to indicate GRR server's x509 certificate
           should be verified.
+      follow_timeout (Optional[int]): number of seconds to follow the hunt
+          for once started, fetching the results of its clients as they
+          complete and storing them as File containers. If not set, the hunt
+          is only started.
     """
     super(GRRHuntArtifactCollector, self).SetUp(
         reason, grr_server_url, grr_username, grr_password,
@@ -96,9 +446,10 @@ class GRRHuntArtifactCollector(GRRHunt):
     if not artifacts:
       self.ModuleError('No artifacts were specified.', critical=True)
     self.use_tsk = use_tsk
+    self.follow_timeout = int(follow_timeout or 0)
 
   def Process(self):
-    """Starts a new Artifact Collection GRR hunt.
+    """Starts a new Artifact Collection GRR hunt, and follows it if needed.
 
     Raises:
       RuntimeError: if no items specified for collection.
@@ -109,7 +460,9 @@ class GRRHuntArtifactCollector(GRRHunt):
         use_tsk=self.use_tsk,
         ignore_interpolation_errors=True,
         apply_parsers=False,)
-    self._CreateHunt('ArtifactCollectorFlow', hunt_args)
+    self.hunt = self._CreateHunt('ArtifactCollectorFlow', hunt_args)
+    if self.follow_timeout:
+      self._FollowHunt(self.hunt)
 
 
 class GRRHuntFileCollector(GRRHunt):
@@ -136,7 +489,7 @@ class GRRHuntFileCollector(GRRHunt):
   def SetUp(self,
             file_path_list,
             reason, grr_server_url, grr_username, grr_password, approvers=None,
-            verify=True):
+            verify=True, follow_timeout=None):
     """Initializes a GRR Hunt file collector.
 
     Args:
@@ -148,6 +501,10 @@ class GRRHuntFileCollector(GRRHunt):
       approvers (Optional[str]): comma-separated GRR approval recipients.
       verify (Optional[bool]): True to indicate GRR server's x509 certificate
           should be verified.
+      follow_timeout (Optional[int]): number of seconds to follow the hunt
+          for once started, fetching the results of its clients as they
+          complete and storing them as File containers. If not set, the hunt
+          is only started.
     """
     super(GRRHuntFileCollector, self).SetUp(
         reason, grr_server_url, grr_username, grr_password,
@@ -156,10 +513,11 @@ class GRRHuntFileCollector(GRRHunt):
                            in file_path_list.strip().split(',')]
     if not file_path_list:
       self.ModuleError('Files must be specified for hunts', critical=True)
+    self.follow_timeout = int(follow_timeout or 0)
 
   # TODO: this method does not raise itself, indicate what function call does.
   def Process(self):
-    """Starts a new File Finder GRR hunt.
+    """Starts a new File Finder GRR hunt, and follows it if needed.
 
     Raises:
       RuntimeError: if no items specified for collection.
@@ -172,7 +530,9 @@ class GRRHuntFileCollector(GRRHunt):
         action_type=grr_flows.FileFinderAction.DOWNLOAD)
     hunt_args = grr_flows.FileFinderArgs(
         paths=self.file_path_list, action=hunt_action)
-    self._CreateHunt('FileFinder', hunt_args)
+    hunt = self._CreateHunt('FileFinder', hunt_args)
+    if self.follow_timeout:
+      self._FollowHunt(hunt)
 
 
 class GRRHuntDownloader(GRRHunt):
@@ -181,8 +541,16 @@ class GRRHuntDownloader(GRRHunt):
   Attributes:
     reason (str): justification for GRR access.
     approvers (str): comma-separated GRR approval recipients.
+    incremental (bool): True if the results of each client are fetched
+        separately, skipping the clients fetched by previous runs.
   """
 
+  # Maximum number of times the download of a hunt archive is attempted.
+  _MAX_DOWNLOAD_ATTEMPTS = 5
+  # Name of the manifest of the clients fetched in incremental mode, in JSON
+  # lines format, formatted with the hunt identifier.
+  _MANIFEST_FILENAME = '{0:s}.manifest.jsonl'
+
   def __init__(self, state, critical=False):
     """Initializes a GRR hunt results downloader.
 
@@ -193,13 +561,15 @@ class GRRHuntDownloader(GRRHunt):
     """
     super(GRRHuntDownloader, self).__init__(state, critical=critical)
     self.hunt_id = None
+    self.incremental = False
     self.output_path = None
+    self._manifest_lock = threading.Lock()
 
   # pylint: disable=arguments-differ
   def SetUp(self,
             hunt_id,
             reason, grr_server_url, grr_username, grr_password, approvers=None,
-            verify=True):
+            verify=True, incremental_directory=None):
     """Initializes a GRR Hunt file collector.
 
     Args:
@@ -211,12 +581,23 @@ class GRRHuntDownloader(GRRHunt):
       approvers (Optional[str]): comma-separated GRR approval recipients.
       verify (Optional[bool]): True to indicate GRR server's x509 certificate
           should be verified.
+      incremental_directory (Optional[str]): directory to fetch the results
+          of each client of the hunt to separately, along with a manifest of
+          the clients fetched, so that later runs only fetch the results of
+          new clients. If not set, the results of all the clients are
+          downloaded in a single hunt archive.
     """
     super(GRRHuntDownloader, self).SetUp(
         reason, grr_server_url, grr_username, grr_password,
         approvers=approvers, verify=verify)
     self.hunt_id = hunt_id
-    self.output_path = tempfile.mkdtemp()
+    self.incremental = bool(incremental_directory)
+    if incremental_directory:
+      if not os.path.isdir(incremental_directory):
+        os.makedirs(incremental_directory)
+      self.output_path = incremental_directory
+    else:
+      self.output_path = tempfile.mkdtemp()
 
   # TODO: change object to more specific GRR type information.
   def _CollectHuntResults(self, hunt):
@@ -239,13 +620,12 @@ class GRRHuntDownloader(GRRHunt):
     output_file_path = os.path.join(
         self.output_path, '.'.join((self.hunt_id, 'zip')))
 
-    if os.path.exists(output_file_path):
-      self.logger.info(
-          '{0:s} already exists: Skipping'.format(output_file_path))
-      return None
-
-    self._WrapGRRRequestWithApproval(
-        hunt, self._GetAndWriteArchive, hunt, output_file_path)
+    try:
+      self._WrapGRRRequestWithApproval(
+          hunt, self._GetAndWriteArchive, hunt, output_file_path)
+    except (OSError, grr_errors.Error) as exception:
+      self.ModuleError('Could not download {0:s}: {1!s}'.format(
+          output_file_path, exception), critical=True)
 
     results = self._ExtractHuntResults(output_file_path)
     self.logger.info('Wrote results of {0:s} to {1:s}'.format(
@@ -256,33 +636,99 @@ class GRRHuntDownloader(GRRHunt):
   def _GetAndWriteArchive(self, hunt, output_file_path):
     """Retrieves and writes a hunt archive.
 
-    Function is necessary for the _WrapGRRRequestWithApproval to work.
+    Function is necessary for the _WrapGRRRequestWithApproval to work. The
+    archive is written to a partial file, and only moved to the output path
+    once complete. The download is retried from the beginning after network
+    and GRR server errors, since GRR builds archives on the fly and cannot
+    resume them. Local I/O errors, such as a full disk, are not retried.
 
     Args:
       hunt (object): GRR hunt object.
       output_file_path (str): output path where to write the Hunt Archive.
     """
-    hunt_archive = hunt.GetFilesArchive()
-    hunt_archive.WriteToFile(output_file_path)
+    partial_path = '{0:s}.part'.format(output_file_path)
+    for attempt in range(1, self._MAX_DOWNLOAD_ATTEMPTS + 1):
+      try:
+        with open(partial_path, 'wb') as file_object:
+          for chunk in hunt.GetFilesArchive():
+            file_object.write(chunk)
+        break
+      except (OSError, grr_errors.UnknownError) as exception:
+        if os.path.exists(partial_path):
+          os.remove(partial_path)
+        # Errors of the requests library are also OSErrors.
+        is_transport_error = isinstance(
+            exception, (requests.RequestException, grr_errors.UnknownError))
+        if not is_transport_error or attempt == self._MAX_DOWNLOAD_ATTEMPTS:
+          raise
+        self.logger.warning(
+            'Download of {0:s} interrupted (attempt {1:d}): {2!s}'.format(
+                output_file_path, attempt, exception))
+
+    os.replace(partial_path, output_file_path)
+
+  def _IndexHuntArchive(self, archive):
+    """Groups the members of a hunt archive by GRR client.
 
-  def _GetClientFQDN(self, client_info_contents):
-    """Extracts a GRR client's FQDN from its client_info.yaml file.
+    Args:
+      archive (zipfile.ZipFile): hunt results archive.
+
+    Returns:
+      tuple[str, dict[str, list[zipfile.ZipInfo]], dict[str, str]]: name of
+          the hunt directory in the archive, members of the archive per GRR
+          client identifier, and GRR client FQDNs per identifier.
+    """
+    hunt_dir = None
+    members_per_client = {}
+    client_id_to_fqdn = {}
+    for member in archive.infolist():
+      path_segments = member.filename.split('/')
+      if not hunt_dir:
+        hunt_dir = path_segments[0]
+
+      # If we're dealing with client_info.yaml, use it to build a client
+      # ID to FQDN correspondence table & skip extraction.
+      if path_segments[-1] == 'client_info.yaml':
+        client_id, fqdn = self._GetClientFQDN(archive.read(member))
+        client_id_to_fqdn[client_id] = fqdn
+        continue
+
+      if len(path_segments) > 1 and path_segments[1].startswith('C.'):
+        members_per_client.setdefault(path_segments[1], []).append(member)
+
+    return hunt_dir, members_per_client, client_id_to_fqdn
+
+  def _ExtractClientResults(self, archive, members, fqdn, client_directory):
+    """Extracts the results of a GRR client from a hunt archive.
 
     Args:
-      client_info_contents (str): contents of the client_info.yaml file.
+      archive (zipfile.ZipFile): hunt results archive.
+      members (list[zipfile.ZipInfo]): members of the archive holding the
+          results of the client.
+      fqdn (str): FQDN of the client, or its identifier if unknown.
+      client_directory (str): path the results of the client are extracted
+          to.
 
     Returns:
-      tuple[str, str]: client identifier and client FQDN.
+      tuple[str, str]: FQDN of the client and path its results were
+          extracted to.
     """
-    # TODO: handle incorrect file contents.
-    yamldict = yaml.safe_load(client_info_contents)
-    fqdn = yamldict['os_info']['fqdn']
-    client_id = yamldict['client_id']
-    return client_id, fqdn
+    for member in members:
+      archive.extract(member, self.output_path)
+    self._DeduplicateFiles(client_directory)
+    container = containers.File(name=fqdn, path=client_directory)
+    self.state.StoreContainer(container)
+    return fqdn, client_directory
 
   def _ExtractHuntResults(self, output_file_path):
     """Opens a hunt output archive and extract files.
 
+    The archive is indexed in a single pass, then the results of each client
+    are extracted in parallel. A File container is stored for each client as
+    soon as its results are extracted. Clients whose results cannot be
+    extracted are reported as non-critical errors, in which case the archive
+    is kept.
+
     Args:
       output_file_path (str): path where the hunt results archive file is
           downloaded to.
@@ -291,38 +737,38 @@ class GRRHuntDownloader(GRRHunt):
       list[tuple[str, str]]: pairs of names of the GRR clients, from which
           the files were collected, and path where the files were downloaded to.
     """
-    # Extract items from archive by host for processing
-    collection_paths = []
-    client_ids = set()
-    client_id_to_fqdn = {}
-    hunt_dir = None
+    fqdn_collection_paths = []
+    extraction_errors = []
     try:
       with zipfile.ZipFile(output_file_path) as archive:
-        items = archive.infolist()
-        for f in items:
-
-          if not hunt_dir:
-            hunt_dir = f.filename.split('/')[0]
-
-          # If we're dealing with client_info.yaml, use it to build a client
-          # ID to FQDN correspondence table & skip extraction.
-          if f.filename.split('/')[-1] == 'client_info.yaml':
-            client_id, fqdn = self._GetClientFQDN(archive.read(f))
-            client_id_to_fqdn[client_id] = fqdn
-            continue
-
-          client_id = f.filename.split('/')[1]
-          if client_id.startswith('C.'):
-            if client_id not in client_ids:
-              client_directory = os.path.join(self.output_path,
-                                              hunt_dir, client_id)
-              collection_paths.append((client_id, client_directory))
-              client_ids.add(client_id)
+        hunt_dir, members_per_client, client_id_to_fqdn = (
+            self._IndexHuntArchive(archive))
+        if members_per_client:
+          # Created beforehand, as threads creating it at once would fail.
+          os.makedirs(os.path.join(self.output_path, hunt_dir), exist_ok=True)
+
+        with futures.ThreadPoolExecutor() as executor:
+          future_to_client_id = {}
+          for client_id, members in members_per_client.items():
+            # Translate GRR client IDs to FQDNs with the information
+            # retrieved earlier
+            fqdn = client_id_to_fqdn.get(client_id, client_id)
+            client_directory = os.path.join(
+                self.output_path, hunt_dir, client_id)
+            future = self._SubmitInContext(
+                executor, self._ExtractClientResults, archive, members, fqdn,
+                client_directory)
+            future_to_client_id[future] = client_id
+
+          for future in futures.as_completed(future_to_client_id):
             try:
-              archive.extract(f, self.output_path)
-            except KeyError as exception:
-              self.logger.info('Extraction error: {0:s}'.format(exception))
-              return []
+              fqdn_collection_paths.append(future.result())
+            except Exception as exception:  # pylint: disable=broad-except
+              # Corrupt members can raise anything from zlib.error to
+              # EOFError, which must not stop the other clients.
+              extraction_errors.append(
+                  'Could not extract results of client {0:s}: {1!s}'.format(
+                      future_to_client_id[future], exception))
 
     except OSError as exception:
       msg = 'Error manipulating file {0:s}: {1!s}'.format(
@@ -333,18 +779,19 @@ class GRRHuntDownloader(GRRHunt):
           output_file_path, exception)
       self.ModuleError(msg, critical=True)
 
-    try:
-      os.remove(output_file_path)
-    except OSError as exception:
-      self.logger.info('Output path {0:s} could not be removed: {1:s}'.format(
-          output_file_path, exception))
+    for message in extraction_errors:
+      self.ModuleError(message, critical=False)
 
-    # Translate GRR client IDs to FQDNs with the information retrieved
-    # earlier
-    fqdn_collection_paths = []
-    for client_id, path in collection_paths:
-      fqdn = client_id_to_fqdn.get(client_id, client_id)
-      fqdn_collection_paths.append((fqdn, path))
+    if extraction_errors:
+      self.logger.info('Keeping {0:s}, some results were not extracted'.format(
+          output_file_path))
+    else:
+      try:
+        os.remove(output_file_path)
+      except OSError as exception:
+        self.logger.info(
+            'Output path {0:s} could not be removed: {1!s}'.format(
+                output_file_path, exception))
 
     if not fqdn_collection_paths:
       self.ModuleError(
@@ -352,6 +799,90 @@ class GRRHuntDownloader(GRRHunt):
 
     return fqdn_collection_paths
 
+  def _ReadManifest(self, manifest_path):
+    """Reads the manifest of the clients fetched by previous runs.
+
+    Args:
+      manifest_path (str): path of the manifest.
+
+    Returns:
+      dict[str, dict[str, str]]: manifest entries per GRR client identifier.
+    """
+    manifest = {}
+    if not os.path.exists(manifest_path):
+      return manifest
+
+    with open(manifest_path, 'r') as file_object:
+      for line in file_object:
+        try:
+          entry = json.loads(line)
+        except ValueError:
+          # The last line is incomplete if a previous run was interrupted
+          # while writing it.
+          continue
+        manifest[entry['client_id']] = entry
+    return manifest
+
+  # TODO: change object to more specific GRR type information.
+  def _FetchClientResults(
+      self, hunt, results_per_client, manifest_path, hunt_client):
+    """Fetches the results of a client of the hunt and adds it to the manifest.
+
+    Errors are reported as non-critical, so that the results of the client
+    are fetched again by the next run.
+
+    Args:
+      hunt (object): GRR hunt object.
+      results_per_client (dict[str, list[hunt_pb2.ApiHuntResult]]): results
+          of the hunt per GRR client identifier.
+      manifest_path (str): path of the manifest.
+      hunt_client (object): GRR HuntClient object.
+    """
+    fqdn = self._DownloadClientResults(hunt, results_per_client, hunt_client)
+    if not fqdn:
+      return
+
+    entry = {
+        'client_id': hunt_client.client_id,
+        'flow_id': hunt_client.data.flow_id,
+        'fqdn': fqdn,
+        'path': self._GetClientDirectory(self.hunt_id, hunt_client.client_id)}
+    with self._manifest_lock:
+      with open(manifest_path, 'a') as file_object:
+        file_object.write(json.dumps(entry) + '\n')
+
+  # TODO: change object to more specific GRR type information.
+  def _CollectNewClientResults(self, hunt):
+    """Fetches the results of the clients not fetched by previous runs.
+
+    The files collected from each client that completed the hunt are
+    fetched with the hunt's approval, in parallel. A File container is stored
+    for each client as soon as its files are fetched.
+
+    Args:
+      hunt (object): GRR hunt object to fetch results from.
+    """
+    manifest_path = os.path.join(
+        self.output_path, self._MANIFEST_FILENAME.format(self.hunt_id))
+    manifest = self._ReadManifest(manifest_path)
+    hunt_clients = self._WrapGRRRequestWithApproval(
+        hunt, self._ListCompletedClients, hunt)
+    new_clients = [
+        hunt_client for hunt_client in hunt_clients
+        if hunt_client.client_id not in manifest]
+    self.logger.info(
+        '{0:d} clients completed hunt {1:s}, {2:d} of them new'.format(
+            len(hunt_clients), self.hunt_id, len(new_clients)))
+    if not new_clients:
+      return
+
+    results_per_client, _ = self._WrapGRRRequestWithApproval(
+        hunt, self._ListResultsPerClient, hunt)
+    self._ProcessClients(
+        functools.partial(
+            self._FetchClientResults, hunt, results_per_client, manifest_path),
+        new_clients)
+
   def Process(self):
     """Downloads the results of a GRR hunt.
 
@@ -359,9 +890,12 @@ class GRRHuntDownloader(GRRHunt):
       RuntimeError: if no items specified for collection.
     """
     hunt = self.grr_api.Hunt(self.hunt_id).Get()
-    for description, path in self._CollectHuntResults(hunt):
-      container = containers.File(name=description, path=path)
-      self.state.StoreContainer(container)
+    if self.incremental:
+      self._CollectNewClientResults(hunt)
+      return
+
+    # File containers are stored as the results of each client are extracted.
+    self._CollectHuntResults(hunt)
 
 
 modules_manager.ModulesManager.RegisterModules([
@@ -16,7 +16,28 @@ class AttributeContainer(object):
   """
   CONTAINER_TYPE = None
 
-  # TODO: note that this method is only used by tests.
+  def CopyFromDict(self, attributes):
+    """Copies the attribute container from a dictionary.
+
+    Args:
+      attributes (dict[str, object]): attribute values per name.
+    """
+    for attribute_name, attribute_value in attributes.items():
+      # Not using startswith to improve performance.
+      if attribute_name[0] == '_':
+        continue
+      setattr(self, attribute_name, attribute_value)
+
+  def CopyToDict(self):
+    """Copies the attribute container to a dictionary.
+
+    Returns:
+      dict[str, object]: attribute values per name.
+    """
+    return {
+        attribute_name: getattr(self, attribute_name)
+        for attribute_name in self.GetAttributeNames()}
+
   def GetAttributeNames(self):
     """Retrieves the names of all attributes.
 
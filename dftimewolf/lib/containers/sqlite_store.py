@@ -0,0 +1,457 @@
+# -*- coding: utf-8 -*-
+"""Container store that spills containers to an SQLite file."""
+
+import logging
+import os
+import pickle
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+
+from dftimewolf.lib.containers import store
+
+logger = logging.getLogger('dftimewolf')
+
+DEFAULT_MAX_CONTAINERS = 10000
+DEFAULT_MAX_MEMORY_BYTES = 256 * 1024 * 1024
+
+
+class SQLiteContainerView(store.BaseContainerView):
+  """Immutable snapshot of containers that were spilled to disk.
+
+  Containers are read lazily, a chunk at a time, so iterating over the view
+  does not load all the containers in memory.
+  """
+
+  def __init__(self, container_store, container_type, first_row, last_row,
+               length):
+    """Initializes a view on spilled containers.
+
+    Args:
+      container_store (SQLiteContainerStore): store the containers were
+          spilled to.
+      container_type (str): container type, such as "file".
+      first_row (int): identifier of the row preceding the first container.
+      last_row (int): identifier of the row of the last container.
+      length (int): number of containers in the snapshot.
+    """
+    super(SQLiteContainerView, self).__init__()
+    self._container_store = container_store
+    self._container_type = container_type
+    self._first_row = first_row
+    self._last_row = last_row
+    self._length = length
+
+  def __getitem__(self, index):
+    """Retrieves a container, or a list of containers for slices."""
+    if isinstance(index, slice):
+      start, stop, step = index.indices(self._length)
+      if step < 0:
+        # Negative steps go from the end, read the rows they cover in order.
+        start, stop = stop + 1, start + 1
+      if start >= stop:
+        return []
+      rows = self._container_store.ReadRows(
+          self._container_type, self._first_row, self._last_row,
+          limit=stop - start, offset=start)
+      containers = [container for _, container in rows]
+      if step < 0:
+        return containers[::-1][::-step]
+      return containers[::step]
+    if index < 0:
+      index += self._length
+    if not 0 <= index < self._length:
+      raise IndexError('Container view index out of range')
+    rows = self._container_store.ReadRows(
+        self._container_type, self._first_row, self._last_row, limit=1,
+        offset=index)
+    return rows[0][1]
+
+  def __iter__(self):
+    """Iterates over the containers in the snapshot, reading them lazily."""
+    first_row = self._first_row
+    while True:
+      rows = self._container_store.ReadRows(
+          self._container_type, first_row, self._last_row)
+      if not rows:
+        return
+      for _, container in rows:
+        yield container
+      first_row = rows[-1][0]
+
+  def __len__(self):
+    """Returns the number of containers in the snapshot."""
+    return self._length
+
+
+# pylint: disable=protected-access
+class _SpillableTypedContainers(store._TypedContainers):
+  """Containers of a single type that can be spilled to disk.
+
+  Attributes:
+    first_row (int): identifier of the row preceding the first spilled
+        container that has not been popped.
+    last_row (int): identifier of the row of the last spilled container.
+    memory_size (int): estimated size of the containers in memory, in bytes.
+    spilled (bool): True if the containers are stored on disk.
+    spilled_count (int): number of spilled containers that have not been
+        popped.
+    unspillable (bool): True if the containers cannot be serialized.
+  """
+
+  def __init__(self):
+    """Initializes the typed containers."""
+    super(_SpillableTypedContainers, self).__init__()
+    self.first_row = 0
+    self.last_row = 0
+    self.memory_size = 0
+    self.spilled = False
+    self.spilled_count = 0
+    self.unspillable = False
+
+
+class SQLiteContainerStore(store.ContainerStore):
+  """Container store that spills containers to an SQLite file.
+
+  Containers are kept in memory until the number of containers in memory,
+  or their estimated size, crosses a threshold. From then on, all the
+  containers of the type being stored are written to the SQLite file.
+  Containers are serialized from their public attributes, see
+  AttributeContainer.GetAttributeNames. Container types that cannot be
+  serialized stay in memory.
+  """
+
+  _TYPED_CONTAINERS_CLASS = _SpillableTypedContainers
+
+  # Number of containers read from disk at a time.
+  _READ_CHUNK_SIZE = 1000
+
+  def __init__(self, max_containers=DEFAULT_MAX_CONTAINERS,
+               max_memory_bytes=DEFAULT_MAX_MEMORY_BYTES, path=None):
+    """Initializes a spilling container store.
+
+    Args:
+      max_containers (Optional[int]): number of containers kept in memory
+          above which containers are spilled to disk.
+      max_memory_bytes (Optional[int]): estimated size of the containers
+          kept in memory above which containers are spilled to disk.
+      path (Optional[str]): path of the SQLite file. A temporary file is
+          created if not set.
+    """
+    super(SQLiteContainerStore, self).__init__()
+    self._connection = None
+    self._connection_lock = threading.Lock()
+    self._max_containers = max_containers
+    self._max_memory_bytes = max_memory_bytes
+    self._path = path
+    self._temporary_directory = None
+
+  @staticmethod
+  def _EstimateSize(container):
+    """Estimates the memory used by a container.
+
+    Args:
+      container (AttributeContainer): container.
+
+    Returns:
+      int: estimated size in bytes.
+    """
+    size = sys.getsizeof(container) + sys.getsizeof(container.__dict__)
+    for value in container.__dict__.values():
+      size += sys.getsizeof(value)
+    return size
+
+  def _GetConnection(self):
+    """Retrieves the SQLite connection, creating the database if needed.
+
+    Must be called with the connection lock held.
+
+    Returns:
+      sqlite3.Connection: connection to the SQLite file.
+    """
+    if not self._connection:
+      if not self._path:
+        self._temporary_directory = tempfile.mkdtemp()
+        self._path = os.path.join(
+            self._temporary_directory, 'containers.sqlite')
+      logger.info('Spilling containers to {0:s}'.format(self._path))
+      self._connection = sqlite3.connect(self._path, check_same_thread=False)
+      self._connection.execute(
+          'CREATE TABLE IF NOT EXISTS containers ('
+          'row INTEGER PRIMARY KEY AUTOINCREMENT, container_type TEXT, '
+          'container_class TEXT, data BLOB)')
+      self._connection.execute(
+          'CREATE INDEX IF NOT EXISTS containers_type_row '
+          'ON containers (container_type, row)')
+    return self._connection
+
+  def _GetMemoryUsage(self):
+    """Sums the number and size of the containers kept in memory.
+
+    Returns:
+      tuple[int, int]: number of containers and their estimated size in
+          bytes.
+    """
+    number_of_containers = 0
+    memory_size = 0
+    for typed_containers in list(self._typed_containers.values()):
+      number_of_containers += len(typed_containers.containers)
+      memory_size += typed_containers.memory_size
+    return number_of_containers, memory_size
+
+  @staticmethod
+  def _Serialize(container):
+    """Serializes a container from its public attributes.
+
+    Args:
+      container (AttributeContainer): container.
+
+    Returns:
+      tuple[str, bytes]: container class path and serialized attributes.
+    """
+    class_path, attributes = store.SerializeContainer(container)
+    data = pickle.dumps(attributes, protocol=pickle.HIGHEST_PROTOCOL)
+    return class_path, data
+
+  def _Spill(self, container_type, typed_containers):
+    """Writes the in-memory containers of a type to disk.
+
+    Must be called with the type's lock held.
+
+    Args:
+      container_type (str): container type, such as "file".
+      typed_containers (_SpillableTypedContainers): containers of that type.
+    """
+    try:
+      rows = [
+          (container_type,) + self._Serialize(container)
+          for container in typed_containers.containers]
+    except (AttributeError, TypeError, pickle.PicklingError) as exception:
+      logger.warning(
+          'Unable to spill {0:s} containers to disk: {1!s}'.format(
+              container_type, exception))
+      typed_containers.unspillable = True
+      return
+
+    self._WriteRows(typed_containers, rows)
+    typed_containers.spilled = True
+    # Views on the previous list remain valid since nothing is appended to it
+    # anymore.
+    typed_containers.containers = []
+    typed_containers.indexes = {}
+    typed_containers.memory_size = 0
+
+  def _WriteRows(self, typed_containers, rows):
+    """Writes serialized containers to disk.
+
+    Must be called with the type's lock held.
+
+    Args:
+      typed_containers (_SpillableTypedContainers): containers the rows
+          belong to.
+      rows (list[tuple[str, str, bytes]]): container type, container class
+          path and serialized attributes of each container.
+    """
+    if not rows:
+      return
+
+    with self._connection_lock:
+      connection = self._GetConnection()
+      with connection:
+        for row in rows:
+          cursor = connection.execute(
+              'INSERT INTO containers (container_type, container_class, data) '
+              'VALUES (?, ?, ?)', row)
+          typed_containers.last_row = cursor.lastrowid
+    typed_containers.spilled_count += len(rows)
+
+  def AddContainer(self, container):
+    """Adds a container to the store, spilling to disk if needed.
+
+    Args:
+      container (AttributeContainer): container to add.
+    """
+    container_type = container.CONTAINER_TYPE
+    typed_containers = self._GetTypedContainers(container_type)
+    with typed_containers.lock:
+      if typed_containers.spilled:
+        row = (container_type,) + self._Serialize(container)
+        self._WriteRows(typed_containers, [row])
+        return
+
+      typed_containers.containers.append(container)
+      typed_containers.AddToIndexes(container)
+      typed_containers.memory_size += self._EstimateSize(container)
+
+      if typed_containers.unspillable:
+        return
+
+      number_of_containers, memory_size = self._GetMemoryUsage()
+      if (number_of_containers > self._max_containers or
+          memory_size > self._max_memory_bytes):
+        self._Spill(container_type, typed_containers)
+
+  def BackUp(self, path):
+    """Copies the spilled containers to another SQLite file.
+
+    The copy is made with SQLite's online backup, so that it is consistent
+    while containers are being added.
+
+    Args:
+      path (str): path of the copy.
+
+    Returns:
+      dict[str, tuple[int, int, int]]: per spilled container type, the
+          identifier of the row preceding the first container, the
+          identifier of the row of the last container and the number of
+          containers, to pass to Restore.
+    """
+    spilled_types = {}
+    for container_type, typed_containers in list(
+        self._typed_containers.items()):
+      with typed_containers.lock:
+        if typed_containers.spilled:
+          spilled_types[container_type] = (
+              typed_containers.first_row, typed_containers.last_row,
+              typed_containers.spilled_count)
+    if not spilled_types:
+      return spilled_types
+
+    # Rows added after their bounds were read are in the copy, but outside
+    # the bounds.
+    backup_connection = sqlite3.connect(path)
+    try:
+      with self._connection_lock:
+        self._GetConnection().backup(backup_connection)
+    finally:
+      backup_connection.close()
+    return spilled_types
+
+  def Restore(self, path, spilled_types):
+    """Restores spilled containers copied by BackUp.
+
+    The copy becomes the store's SQLite file, so that the containers are not
+    read into memory. Must be called before containers are added.
+
+    Args:
+      path (str): path of the copy.
+      spilled_types (dict[str, tuple[int, int, int]]): per spilled container
+          type, the row bounds and number of containers returned by BackUp.
+    """
+    with self._connection_lock:
+      if self._connection:
+        self._connection.close()
+        self._connection = None
+      if not self._temporary_directory:
+        self._temporary_directory = tempfile.mkdtemp()
+      self._path = os.path.join(self._temporary_directory, 'containers.sqlite')
+      shutil.copyfile(path, self._path)
+
+    for container_type, (first_row, last_row, spilled_count) in (
+        spilled_types.items()):
+      typed_containers = self._GetTypedContainers(container_type)
+      with typed_containers.lock:
+        typed_containers.first_row = first_row
+        typed_containers.last_row = last_row
+        typed_containers.spilled = True
+        typed_containers.spilled_count = spilled_count
+
+  def Close(self):
+    """Closes the SQLite file and removes it if it is temporary."""
+    with self._connection_lock:
+      if self._connection:
+        self._connection.close()
+        self._connection = None
+      if self._temporary_directory:
+        os.remove(self._path)
+        os.rmdir(self._temporary_directory)
+        self._path = None
+        self._temporary_directory = None
+
+  def GetContainers(self, container_type, pop=False):
+    """Retrieves a snapshot of the containers of a type.
+
+    Args:
+      container_type (str): container type, such as "file".
+      pop (Optional[bool]): True if the containers should be removed from
+          the store.
+
+    Returns:
+      BaseContainerView: containers of that type. Containers that were
+          spilled to disk are read lazily.
+    """
+    typed_containers = self._typed_containers.get(container_type)
+    if typed_containers is None:
+      return store.ContainerView([])
+
+    with typed_containers.lock:
+      if not typed_containers.spilled:
+        view = store.ContainerView(typed_containers.containers)
+        if pop:
+          typed_containers.containers = []
+          typed_containers.indexes = {}
+          typed_containers.memory_size = 0
+        return view
+
+      view = SQLiteContainerView(
+          self, container_type, typed_containers.first_row,
+          typed_containers.last_row, typed_containers.spilled_count)
+      if pop:
+        # Popped rows are only hidden so that existing views remain valid.
+        typed_containers.first_row = typed_containers.last_row
+        typed_containers.spilled_count = 0
+      return view
+
+  def GetContainersByAttribute(self, container_type, attribute_name, value):
+    """Retrieves a snapshot of the containers that have an attribute value.
+
+    Containers that were spilled to disk are not indexed: they are scanned.
+
+    Args:
+      container_type (str): container type, such as "file".
+      attribute_name (str): name of the attribute, such as "name".
+      value (object): hashable value the attribute must have.
+
+    Returns:
+      BaseContainerView: containers of that type with that attribute value.
+    """
+    typed_containers = self._typed_containers.get(container_type)
+    if typed_containers is None or not typed_containers.spilled:
+      return super(SQLiteContainerStore, self).GetContainersByAttribute(
+          container_type, attribute_name, value)
+
+    return store.ContainerView([
+        container for container in self.GetContainers(container_type)
+        if getattr(container, attribute_name, None) == value])
+
+  def ReadRows(self, container_type, first_row, last_row, limit=None,
+               offset=0):
+    """Reads spilled containers from disk.
+
+    Args:
+      container_type (str): container type, such as "file".
+      first_row (int): identifier of the row preceding the first container
+          to read.
+      last_row (int): identifier of the row of the last container to read.
+      limit (Optional[int]): maximum number of containers to read, defaults
+          to the read chunk size.
+      offset (Optional[int]): number of containers to skip.
+
+    Returns:
+      list[tuple[int, AttributeContainer]]: row identifiers and containers.
+    """
+    with self._connection_lock:
+      rows = self._GetConnection().execute(
+          'SELECT row, container_class, data FROM containers '
+          'WHERE container_type = ? AND row > ? AND row <= ? '
+          'ORDER BY row LIMIT ? OFFSET ?',
+          (container_type, first_row, last_row,
+           limit or self._READ_CHUNK_SIZE, offset)).fetchall()
+
+    results = []
+    for row, class_path, data in rows:
+      container = store.DeserializeContainer(class_path, pickle.loads(data))
+      results.append((row, container))
+    return results
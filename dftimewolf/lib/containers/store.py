@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""Indexed, typed attribute container store."""
+
+import collections.abc
+import importlib
+import threading
+
+
+_container_classes = {}
+
+
+def DeserializeContainer(class_path, attributes):
+  """Recreates a container from its class path and public attributes.
+
+  Args:
+    class_path (str): module and class name of the container, separated by
+        a colon.
+    attributes (dict[str, object]): public attribute values per name.
+
+  Returns:
+    AttributeContainer: container.
+  """
+  container_class = _container_classes.get(class_path)
+  if not container_class:
+    module_name, _, class_name = class_path.partition(':')
+    container_class = getattr(importlib.import_module(module_name), class_name)
+    _container_classes[class_path] = container_class
+
+  container = container_class.__new__(container_class)
+  container.CopyFromDict(attributes)
+  return container
+
+
+def SerializeContainer(container):
+  """Retrieves the class path and public attributes of a container.
+
+  Args:
+    container (AttributeContainer): container.
+
+  Returns:
+    tuple[str, dict[str, object]]: module and class name of the container,
+        separated by a colon, and its public attribute values per name.
+  """
+  class_path = '{0:s}:{1:s}'.format(
+      container.__class__.__module__, container.__class__.__name__)
+  return class_path, container.CopyToDict()
+
+
+class BaseContainerView(collections.abc.Sequence):
+  """Base class for immutable snapshots of stored containers."""
+
+  def __eq__(self, other):
+    """Compares the view with another sequence, item by item."""
+    if not isinstance(other, collections.abc.Sequence):
+      return NotImplemented
+    return len(self) == len(other) and all(
+        container == other_container
+        for container, other_container in zip(self, other))
+
+  def __getitem__(self, index):
+    """Retrieves a container, or a list of containers for slices."""
+    raise NotImplementedError
+
+  def __len__(self):
+    """Returns the number of containers in the snapshot."""
+    raise NotImplementedError
+
+  def __repr__(self):
+    """Returns a representation of the view."""
+    return '{0:s}({1!r})'.format(self.__class__.__name__, list(self))
+
+
+class ContainerView(BaseContainerView):
+  """Immutable snapshot of stored containers.
+
+  Containers are only ever appended to the underlying list, so a view only
+  needs to remember the list and its length at the time the snapshot was
+  taken: no containers are copied.
+  """
+
+  def __init__(self, containers, length=None):
+    """Initializes a container view.
+
+    Args:
+      containers (list[AttributeContainer]): append-only list of containers.
+      length (Optional[int]): number of containers in the snapshot, defaults
+          to the current length of the list.
+    """
+    super(ContainerView, self).__init__()
+    self._containers = containers
+    self._length = len(containers) if length is None else length
+
+  def __getitem__(self, index):
+    """Retrieves a container, or a list of containers for slices."""
+    if isinstance(index, slice):
+      return [self._containers[i] for i in range(*index.indices(self._length))]
+    if index < 0:
+      index += self._length
+    if not 0 <= index < self._length:
+      raise IndexError('Container view index out of range')
+    return self._containers[index]
+
+  def __iter__(self):
+    """Iterates over the containers in the snapshot."""
+    for index in range(self._length):
+      yield self._containers[index]
+
+  def __len__(self):
+    """Returns the number of containers in the snapshot."""
+    return self._length
+
+
+class _TypedContainers(object):
+  """Containers of a single type, with their own lock and indexes.
+
+  Attributes:
+    containers (list[AttributeContainer]): append-only list of containers.
+    indexes (dict[str, dict[object, list[AttributeContainer]]]): containers
+        indexed per attribute name and attribute value.
+    lock (threading.Lock): lock protecting the containers and indexes.
+  """
+
+  def __init__(self):
+    """Initializes the typed containers."""
+    super(_TypedContainers, self).__init__()
+    self.containers = []
+    self.indexes = {}
+    self.lock = threading.Lock()
+
+  def AddToIndexes(self, container):
+    """Adds a container to all the existing indexes.
+
+    Args:
+      container (AttributeContainer): container to index.
+    """
+    for attribute_name, index in self.indexes.items():
+      self.AddToIndex(index, attribute_name, container)
+
+  @staticmethod
+  def AddToIndex(index, attribute_name, container):
+    """Adds a container to an index.
+
+    Containers that do not have the attribute, or whose value is not
+    hashable, are not indexed.
+
+    Args:
+      index (dict[object, list[AttributeContainer]]): index to add to.
+      attribute_name (str): name of the indexed attribute.
+      container (AttributeContainer): container to index.
+    """
+    value = getattr(container, attribute_name, None)
+    try:
+      index.setdefault(value, []).append(container)
+    except TypeError:
+      pass
+
+
+class ContainerStore(object):
+  """Thread-safe store of attribute containers, grouped by container type.
+
+  Each container type has its own lock, so that producers of different
+  container types do not contend with each other. Lookups by attribute value
+  go through indexes, which are built the first time an attribute is queried
+  and kept up to date as containers are added.
+  """
+
+  _TYPED_CONTAINERS_CLASS = _TypedContainers
+
+  def __init__(self):
+    """Initializes a container store."""
+    super(ContainerStore, self).__init__()
+    self._lock = threading.Lock()
+    self._typed_containers = {}
+
+  def __contains__(self, container_type):
+    """Checks if containers of a type were ever stored.
+
+    Args:
+      container_type (str): container type, such as "file".
+
+    Returns:
+      bool: True if containers of that type were stored.
+    """
+    return container_type in self._typed_containers
+
+  def __getitem__(self, container_type):
+    """Retrieves a snapshot of the containers of a type.
+
+    Args:
+      container_type (str): container type, such as "file".
+
+    Returns:
+      BaseContainerView: containers of that type.
+
+    Raises:
+      KeyError: if no containers of that type were ever stored.
+    """
+    if container_type not in self._typed_containers:
+      raise KeyError(container_type)
+    return self.GetContainers(container_type)
+
+  def __len__(self):
+    """Returns the number of container types that were ever stored."""
+    return len(self._typed_containers)
+
+  def _GetTypedContainers(self, container_type):
+    """Retrieves the containers of a type, creating them if needed.
+
+    Args:
+      container_type (str): container type, such as "file".
+
+    Returns:
+      _TypedContainers: containers of that type.
+    """
+    typed_containers = self._typed_containers.get(container_type)
+    if typed_containers is None:
+      with self._lock:
+        typed_containers = self._typed_containers.setdefault(
+            container_type, self._TYPED_CONTAINERS_CLASS())
+    return typed_containers
+
+  def AddContainer(self, container):
+    """Adds a container to the store.
+
+    Args:
+      container (AttributeContainer): container to add.
+    """
+    typed_containers = self._GetTypedContainers(container.CONTAINER_TYPE)
+    with typed_containers.lock:
+      typed_containers.containers.append(container)
+      typed_containers.AddToIndexes(container)
+
+  def BackUp(self, unused_path):
+    """Copies the containers spilled to disk to another file.
+
+    Args:
+      unused_path (str): path of the copy.
+
+    Returns:
+      dict[str, object]: per spilled container type, the information needed
+          to restore its containers from the copy.
+    """
+    # Containers kept in memory are never spilled.
+    return {}
+
+  def Close(self):
+    """Releases the resources used by the store."""
+    # Nothing to release for containers kept in memory.
+    return
+
+  def GetContainerTypes(self):
+    """Retrieves the container types that were ever stored.
+
+    Returns:
+      list[str]: container types.
+    """
+    return list(self._typed_containers.keys())
+
+  def GetContainers(self, container_type, pop=False):
+    """Retrieves a snapshot of the containers of a type.
+
+    Args:
+      container_type (str): container type, such as "file".
+      pop (Optional[bool]): True if the containers should be removed from
+          the store.
+
+    Returns:
+      ContainerView: containers of that type.
+    """
+    typed_containers = self._typed_containers.get(container_type)
+    if typed_containers is None:
+      return ContainerView([])
+
+    with typed_containers.lock:
+      view = ContainerView(typed_containers.containers)
+      if pop:
+        # Views on the previous list remain valid since nothing is appended
+        # to it anymore.
+        typed_containers.containers = []
+        typed_containers.indexes = {}
+      return view
+
+  def GetContainersByAttribute(self, container_type, attribute_name, value):
+    """Retrieves a snapshot of the containers that have an attribute value.
+
+    Args:
+      container_type (str): container type, such as "file".
+      attribute_name (str): name of the attribute, such as "name".
+      value (object): hashable value the attribute must have.
+
+    Returns:
+      ContainerView: containers of that type with that attribute value.
+    """
+    typed_containers = self._typed_containers.get(container_type)
+    if typed_containers is None:
+      return ContainerView([])
+
+    with typed_containers.lock:
+      index = typed_containers.indexes.get(attribute_name)
+      if index is None:
+        index = {}
+        for container in typed_containers.containers:
+          typed_containers.AddToIndex(index, attribute_name, container)
+        typed_containers.indexes[attribute_name] = index
+      return ContainerView(index.get(value, []))
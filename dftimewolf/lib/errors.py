@@ -33,3 +33,7 @@ class RecipeParseError(DFTimewolfError):
 
 class CommandLineParseError(DFTimewolfError):
   """Error when parsing the command-line arguments."""
+
+
+class CheckpointError(DFTimewolfError):
+  """Error when reading a checkpoint."""
@@ -1,3 +1,2 @@
 # -*- coding: utf-8 -*-
-"""This file contains an import statement for exporters modules."""
-from dftimewolf.lib.exporters import gce_disk_export
+"""Exporter modules, imported when a recipe uses them."""
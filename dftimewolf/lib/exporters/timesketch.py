@@ -96,13 +96,13 @@ class TimesketchExporter(module.BaseModule):
     Returns:
       int: the sketch idenifier, or None if one was not available.
     """
-    attributes = self.state.GetContainers(containers.TicketAttribute)
+    attributes = self.state.GetContainersByAttribute(
+        containers.TicketAttribute, 'name', self._SKETCH_ATTRIBUTE_NAME)
     for attribute in attributes:
-      if attribute.name == self._SKETCH_ATTRIBUTE_NAME:
-        sketch_match = re.search(r'sketch/(\d+)/', attribute.value)
-        if sketch_match:
-          sketch_id = int(sketch_match.group(1), 10)
-          return sketch_id
+      sketch_match = re.search(r'sketch/(\d+)/', attribute.value)
+      if sketch_match:
+        sketch_id = int(sketch_match.group(1), 10)
+        return sketch_id
     return None
 
   def Process(self):
@@ -137,7 +137,9 @@ class TimesketchExporter(module.BaseModule):
 
       for file_container in self.state.GetContainers(containers.File):
         path = file_container.path
-        streamer.add_file(path)
+        with self.state.tracer.Span(
+            'Timesketch add_file', category='timesketch', path=path):
+          streamer.add_file(path)
 
     api_root = sketch.api.api_root
     host_url = api_root.partition('api/v1')[0]
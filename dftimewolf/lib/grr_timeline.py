@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+"""Reading and merging of GRR timelines.
+
+GRR timelines are either Sleuthkit body files (BODY format) or streams of
+TimelineEntry protobufs (RAW format). A RAW timeline is a sequence of gzip
+members, each holding TimelineEntry protobufs prefixed with their size as a
+big-endian 64-bit integer.
+
+Timelines are read record by record, so that the memory used does not depend
+on their size, and are merged by concatenating them.
+"""
+
+import collections
+import csv
+import gzip
+import io
+import os
+import shutil
+import stat
+import struct
+
+from google.protobuf import message as protobuf_message
+from grr_response_proto import timeline_pb2
+
+BODY_FORMAT = 1
+RAW_FORMAT = 2
+
+BODY_EXTENSION = '.body'
+RAW_EXTENSION = '.raw'
+
+# Size of the RAW timeline entry size prefixes.
+_RAW_ENTRY_SIZE = struct.Struct('>Q')
+
+# Largest RAW timeline entry, to detect corrupted size prefixes before trying
+# to read them.
+_MAXIMUM_RAW_ENTRY_SIZE = 16 * 1024 * 1024
+
+TimelineEntry = collections.namedtuple('TimelineEntry', [
+    'path', 'inode', 'mode', 'uid', 'gid', 'size', 'mtime', 'atime', 'ctime',
+    'crtime'])
+
+
+def GetTimelineFormat(path):
+  """Determines the format of a timeline from its extension.
+
+  Args:
+    path (str): path of the timeline.
+
+  Returns:
+    int: BODY_FORMAT or RAW_FORMAT, or None if the path is not a timeline.
+  """
+  if path.endswith(BODY_EXTENSION):
+    return BODY_FORMAT
+  if path.endswith(RAW_EXTENSION):
+    return RAW_FORMAT
+  return None
+
+
+def _OpenTimeline(path, timeline_format, mode):
+  """Opens a timeline file.
+
+  Args:
+    path (str): path of the timeline.
+    timeline_format (int): BODY_FORMAT or RAW_FORMAT.
+    mode (str): 'r' to read the timeline, 'w' to write it.
+
+  Returns:
+    file: timeline file object.
+  """
+  if timeline_format == RAW_FORMAT:
+    # The default compression level of zlib is much faster than gzip's.
+    return gzip.open(path, mode + 'b', compresslevel=6)
+  return open(path, mode, encoding='utf-8', errors='surrogateescape',
+              newline='')
+
+
+def _ReadBodyRecords(file_object):
+  """Reads the lines of a BODY timeline.
+
+  Args:
+    file_object (file): BODY timeline, opened in text mode.
+
+  Yields:
+    str: lines of the timeline, without their line separator.
+
+  Raises:
+    ValueError: if the timeline ends in a quoted path.
+  """
+  for line in file_object:
+    # Paths containing separators, quotes or newlines are quoted, and quoted
+    # newlines continue the line.
+    while '"' in line and line.count('"') % 2:
+      next_line = file_object.readline()
+      if not next_line:
+        raise ValueError('Unterminated quoted path: {0:s}'.format(line))
+      line += next_line
+    line = line.rstrip('\r\n')
+    if line:
+      yield line
+
+
+def _ReadRawRecords(file_object):
+  """Reads the serialized entries of a RAW timeline.
+
+  Args:
+    file_object (file): RAW timeline, opened in binary mode and decompressed.
+
+  Yields:
+    bytes: serialized TimelineEntry protobufs.
+
+  Raises:
+    ValueError: if the timeline is truncated or corrupted.
+  """
+  while True:
+    size_prefix = file_object.read(_RAW_ENTRY_SIZE.size)
+    if not size_prefix:
+      break
+    if len(size_prefix) != _RAW_ENTRY_SIZE.size:
+      raise ValueError('Truncated timeline entry size')
+    size, = _RAW_ENTRY_SIZE.unpack(size_prefix)
+    if size > _MAXIMUM_RAW_ENTRY_SIZE:
+      raise ValueError('Invalid timeline entry size: {0:d}'.format(size))
+    data = file_object.read(size)
+    if len(data) != size:
+      raise ValueError('Truncated timeline entry')
+    yield data
+
+
+def _ReadRecords(file_object, timeline_format):
+  """Reads the records of a timeline.
+
+  Args:
+    file_object (file): timeline file object.
+    timeline_format (int): BODY_FORMAT or RAW_FORMAT.
+
+  Returns:
+    iterator[str|bytes]: lines of a BODY timeline, or serialized entries of a
+        RAW timeline.
+  """
+  if timeline_format == RAW_FORMAT:
+    return _ReadRawRecords(file_object)
+  return _ReadBodyRecords(file_object)
+
+
+def _WriteRecord(file_object, timeline_format, record):
+  """Writes a record to a timeline.
+
+  Args:
+    file_object (file): timeline file object.
+    timeline_format (int): BODY_FORMAT or RAW_FORMAT.
+    record (str|bytes): line of a BODY timeline, or serialized entry of a RAW
+        timeline.
+  """
+  if timeline_format == RAW_FORMAT:
+    file_object.write(_RAW_ENTRY_SIZE.pack(len(record)))
+    file_object.write(record)
+  else:
+    file_object.write(record)
+    file_object.write('\n')
+
+
+def _ParseBodyTimestamp(value):
+  """Parses a timestamp of a BODY timeline.
+
+  Args:
+    value (str): number of seconds since January 1, 1970, which can have a
+        fractional part.
+
+  Returns:
+    int: number of microseconds since January 1, 1970.
+
+  Raises:
+    ValueError: if the value is not a number.
+  """
+  if value.isdigit():
+    return int(value) * 1000000
+  return int(round(float(value) * 1000000))
+
+
+def _ParseBodyRecord(line):
+  """Parses a line of a BODY timeline.
+
+  Args:
+    line (str): line of the timeline.
+
+  Returns:
+    TimelineEntry: timeline entry, with timestamps in microseconds.
+
+  Raises:
+    ValueError: if the line is malformed.
+  """
+  if '"' in line:
+    values = next(csv.reader([line], delimiter='|'))
+  else:
+    values = line.split('|')
+  if len(values) < 11:
+    raise ValueError('Malformed body file line: {0:s}'.format(line))
+
+  # Unquoted paths can contain separators, the other values cannot.
+  inode, mode, uid, gid, size, atime, mtime, ctime, crtime = values[-9:]
+  return TimelineEntry(
+      path='|'.join(values[1:-9]), inode=int(inode), mode=mode,
+      uid=int(uid), gid=int(gid), size=int(size),
+      mtime=_ParseBodyTimestamp(mtime), atime=_ParseBodyTimestamp(atime),
+      ctime=_ParseBodyTimestamp(ctime), crtime=_ParseBodyTimestamp(crtime))
+
+
+def _ParseRawRecord(data):
+  """Parses a serialized entry of a RAW timeline.
+
+  Args:
+    data (bytes): serialized TimelineEntry protobuf.
+
+  Returns:
+    TimelineEntry: timeline entry, with timestamps in microseconds.
+
+  Raises:
+    ValueError: if the entry is corrupted.
+  """
+  entry = timeline_pb2.TimelineEntry()
+  try:
+    entry.ParseFromString(data)
+  except protobuf_message.DecodeError as exception:
+    raise ValueError('Corrupted timeline entry: {0!s}'.format(exception))
+  return TimelineEntry(
+      path=entry.path.decode('utf-8', 'surrogateescape'), inode=entry.ino,
+      mode=stat.filemode(entry.mode), uid=entry.uid, gid=entry.gid,
+      size=entry.size, mtime=entry.mtime_ns // 1000,
+      atime=entry.atime_ns // 1000, ctime=entry.ctime_ns // 1000, crtime=0)
+
+
+def _ParseRecord(record, timeline_format):
+  """Parses a record of a timeline.
+
+  Args:
+    record (str|bytes): line of a BODY timeline, or serialized entry of a RAW
+        timeline.
+    timeline_format (int): BODY_FORMAT or RAW_FORMAT.
+
+  Returns:
+    TimelineEntry: timeline entry, with timestamps in microseconds.
+  """
+  if timeline_format == RAW_FORMAT:
+    return _ParseRawRecord(record)
+  return _ParseBodyRecord(record)
+
+
+def ReadTimeline(path, timeline_format):
+  """Reads the entries of a timeline.
+
+  Args:
+    path (str): path of the timeline.
+    timeline_format (int): BODY_FORMAT or RAW_FORMAT.
+
+  Yields:
+    TimelineEntry: timeline entries, with timestamps in microseconds.
+
+  Raises:
+    EOFError: if the compressed data of a RAW timeline is truncated.
+    OSError: if the timeline cannot be read.
+    ValueError: if the timeline is malformed.
+  """
+  with _OpenTimeline(path, timeline_format, 'r') as file_object:
+    for record in _ReadRecords(file_object, timeline_format):
+      yield _ParseRecord(record, timeline_format)
+
+
+def WriteTimeline(entries, output_path, timeline_format):
+  """Writes GRR timeline entries to a timeline.
+
+  Args:
+    entries (iterable[timeline_pb2.TimelineEntry]): timeline entries.
+    output_path (str): path of the timeline.
+    timeline_format (int): BODY_FORMAT or RAW_FORMAT.
+
+  Raises:
+    OSError: if the timeline cannot be written.
+  """
+  with _OpenTimeline(output_path, timeline_format, 'w') as output_file:
+    for entry in entries:
+      if timeline_format == RAW_FORMAT:
+        record = entry.SerializeToString()
+      else:
+        values = [
+            '0', entry.path.decode('utf-8', 'surrogateescape'),
+            str(entry.ino), stat.filemode(entry.mode), str(entry.uid),
+            str(entry.gid), str(entry.size)]
+        values.extend(
+            str(timestamp // 1000000000) for timestamp in (
+                entry.atime_ns, entry.mtime_ns, entry.ctime_ns))
+        values.append('0')
+        line = io.StringIO()
+        csv.writer(line, delimiter='|', lineterminator='').writerow(values)
+        record = line.getvalue()
+      _WriteRecord(output_file, timeline_format, record)
+
+
+def MergeTimelines(paths, output_path, timeline_format):
+  """Merges timelines into one, by concatenating them.
+
+  A RAW timeline is a sequence of gzip members, so RAW timelines are
+  concatenated as they are. A line separator is added after BODY timelines
+  that do not end with one.
+
+  Args:
+    paths (list[str]): paths of the timelines to merge.
+    output_path (str): path of the merged timeline.
+    timeline_format (int): format of the timelines, BODY_FORMAT or
+        RAW_FORMAT.
+
+  Raises:
+    OSError: if a timeline cannot be read or written.
+  """
+  with open(output_path, 'wb') as output_file:
+    for path in paths:
+      with open(path, 'rb') as file_object:
+        shutil.copyfileobj(file_object, output_file)
+        if timeline_format == BODY_FORMAT and file_object.tell():
+          file_object.seek(-1, os.SEEK_END)
+          if file_object.read(1) != b'\n':
+            output_file.write(b'\n')
@@ -1,8 +1,19 @@
 """Module providing custom logging formatters and colorization for ANSI
-compatible terminals."""
+compatible terminals, and the queue-based logging pipeline.
+
+Loggers only put records in a queue, through a shared QueueHandler, which
+never blocks. A single QueueListener thread owns the file and console
+handlers and writes the records out.
+"""
+import atexit
 import logging
+# Some AttributeErrors occured when trying to access logging.handlers, so
+# we import them separately
+from logging import handlers
+import queue
 import random
 import os
+import threading
 
 DEFAULT_LOG_FILE = os.path.join(os.sep, 'tmp', 'dftimewolf.log')
 MAX_BYTES = 5*1024*1024
@@ -36,6 +47,9 @@ BOLD = '\u001b[1m'  # Bold / bright modifier
 LOG_FORMAT = ('[%(asctime)s] [{0:s}{color:s}%(name)-20s{1:s}] %(levelname)-8s'
               ' %(message)s')
 
+# Record attribute holding the color of the logger name.
+_COLOR_ATTRIBUTE = 'wolf_color'
+
 LEVEL_COLOR_MAP = {
     'WARNING': YELLOW,
     'INFO': WHITE,
@@ -47,26 +61,47 @@ LEVEL_COLOR_MAP = {
 
 class WolfFormatter(logging.Formatter):
   """Helper class used to add color to log messages depending on their level."""
-  def __init__(self, colorize=True, random_color=False, **kwargs):
+  def __init__(
+      self, colorize=True, random_color=False, logger_colors=None, **kwargs):
     """Initializes the WolfFormatter object.
 
     Args:
       colorize (bool): If True, output will be colorized.
-      random_color (bool): If True, will colorize the module name with a random
-          color picked from COLOR_SEQS.
+      random_color (bool): If True, will colorize each logger name, such as a
+          module name, with a random color picked from COLOR_SEQS.
+      logger_colors (Optional[dict[str, str]]): colors of the logger names
+          that should not get a random color, per logger name.
     """
     self.colorize = colorize
+    self._logger_colors = dict(logger_colors or {})
+    self._random_color = random_color
     kwargs['fmt'] = LOG_FORMAT.format('', '', color='')
     if self.colorize:
-      color = ''
-      if random_color:
-        color = random.choice(COLOR_SEQS)
+      color = '%({0:s})s'.format(_COLOR_ATTRIBUTE)
       kwargs['fmt'] = LOG_FORMAT.format(BOLD, RESET_SEQ, color=color)
     super(WolfFormatter, self).__init__(**kwargs)
 
+  def _GetLoggerColor(self, logger_name):
+    """Retrieves the color of a logger name.
+
+    Args:
+      logger_name (str): name of the logger.
+
+    Returns:
+      str: ANSI color sequence, or an empty string.
+    """
+    color = self._logger_colors.get(logger_name)
+    if color is None:
+      color = random.choice(COLOR_SEQS) if self._random_color else ''
+      # Records are formatted by a single thread, the listener's.
+      self._logger_colors[logger_name] = color
+    return color
+
   def format(self, record):
     """Hooks the native format method and colorizes messages if needed.
 
+    The record is not modified, so that other handlers can format it.
+
     Args:
       record (logging.LogRecord): Native log record.
 
@@ -78,5 +113,89 @@ class WolfFormatter(logging.Formatter):
       loglevel_color = LEVEL_COLOR_MAP.get(record.levelname)
       if loglevel_color:
         message = loglevel_color + message + RESET_SEQ
+      record = logging.makeLogRecord(record.__dict__)
       record.msg = message
+      record.args = None
+      setattr(record, _COLOR_ATTRIBUTE, self._GetLoggerColor(record.name))
     return super(WolfFormatter, self).format(record)
+
+
+_log_queue = queue.Queue(-1)
+_queue_handler = handlers.QueueHandler(_log_queue)
+_queue_listener = None
+_queue_listener_lock = threading.Lock()
+
+
+def CreateHandlers(colorize=True, logger_colors=None):
+  """Creates the handlers writing log records to the log file and console.
+
+  Args:
+    colorize (Optional[bool]): True if console output should be colorized.
+    logger_colors (Optional[dict[str, str]]): colors of the logger names that
+        should not get a random color on the console, per logger name.
+
+  Returns:
+    list[logging.Handler]: file and console handlers.
+  """
+  file_handler = handlers.RotatingFileHandler(
+      DEFAULT_LOG_FILE, maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT)
+  file_handler.setFormatter(WolfFormatter(colorize=False))
+
+  console_handler = logging.StreamHandler()
+  console_handler.setFormatter(WolfFormatter(
+      colorize=colorize, random_color=True, logger_colors=logger_colors))
+  return [file_handler, console_handler]
+
+
+def GetQueueHandler():
+  """Retrieves the handler that queues log records for the listener thread.
+
+  Starts a listener with the default file and console handlers if none was
+  started.
+
+  Returns:
+    logging.handlers.QueueHandler: handler shared by all the loggers.
+  """
+  with _queue_listener_lock:
+    if not _queue_listener:
+      _StartQueueListener(CreateHandlers())
+  return _queue_handler
+
+
+def _StartQueueListener(log_handlers):
+  """Starts the listener thread, replacing the running one if any.
+
+  Must be called with the queue listener lock held.
+
+  Args:
+    log_handlers (list[logging.Handler]): handlers the queued log records are
+        written to.
+  """
+  global _queue_listener  # pylint: disable=global-statement
+  if _queue_listener:
+    _queue_listener.stop()
+  _queue_listener = handlers.QueueListener(_log_queue, *log_handlers)
+  _queue_listener.start()
+
+
+def StartQueueListener(log_handlers):
+  """Starts the listener thread, replacing the running one if any.
+
+  Args:
+    log_handlers (list[logging.Handler]): handlers the queued log records are
+        written to.
+  """
+  with _queue_listener_lock:
+    _StartQueueListener(log_handlers)
+
+
+def StopQueueListener():
+  """Writes out the queued log records and stops the listener thread."""
+  global _queue_listener  # pylint: disable=global-statement
+  with _queue_listener_lock:
+    if _queue_listener:
+      _queue_listener.stop()
+      _queue_listener = None
+
+
+atexit.register(StopQueueListener)
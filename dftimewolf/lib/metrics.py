@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""Per-module execution metrics and their JSON and Prometheus reports."""
+
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+  import resource
+except ImportError:  # resource is not available on Windows.
+  resource = None
+
+# Prefix of the metric names written to Prometheus textfiles.
+PROMETHEUS_PREFIX = 'dftimewolf_module_'
+
+
+def _GetPeakRSS():
+  """Retrieves the peak resident set size of the process.
+
+  Returns:
+    int: peak resident set size in bytes, or 0 if it cannot be determined.
+  """
+  if not resource:
+    return 0
+  peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # ru_maxrss is in bytes on macOS and in kilobytes everywhere else.
+  if sys.platform != 'darwin':
+    peak_rss *= 1024
+  return peak_rss
+
+
+def _WriteFile(path, data):
+  """Writes a file atomically, so that readers never see a partial file.
+
+  Args:
+    path (str): path of the file.
+    data (str): contents of the file.
+  """
+  directory = os.path.dirname(path)
+  if directory and not os.path.isdir(directory):
+    os.makedirs(directory)
+  temporary_path = '{0:s}.tmp'.format(path)
+  with open(temporary_path, 'w') as file_object:
+    file_object.write(data)
+  os.replace(temporary_path, path)
+
+
+class ModuleMetrics(object):
+  """Metrics of a module for one execution phase.
+
+  Attributes:
+    blocked_seconds (float): time spent waiting on the modules it wants, and
+        on the streams they feed it, in seconds.
+    containers_consumed (int): number of containers retrieved from the
+        state.
+    containers_produced (int): number of containers stored in the state.
+    cpu_seconds (float): CPU time of the thread running the phase, in
+        seconds. Threads started by the module are not accounted for.
+    module_name (str): name of the module.
+    peak_rss_delta_bytes (int): growth of the peak resident set size of the
+        process during the phase, in bytes. Modules running concurrently
+        share the growth.
+    phase (str): name of the execution phase, such as "SetUp" or "Process".
+    queued_seconds (float): time spent waiting for concurrency or rate limits
+        on requests to external services, in seconds.
+    wall_seconds (float): wall time of the phase, including the time blocked,
+        in seconds.
+  """
+
+  def __init__(self, module_name, phase):
+    """Initializes module metrics.
+
+    Args:
+      module_name (str): name of the module.
+      phase (str): name of the execution phase.
+    """
+    super(ModuleMetrics, self).__init__()
+    self.blocked_seconds = 0.0
+    self.containers_consumed = 0
+    self.containers_produced = 0
+    self.cpu_seconds = 0.0
+    self.module_name = module_name
+    self.peak_rss_delta_bytes = 0
+    self.phase = phase
+    self.queued_seconds = 0.0
+    self.wall_seconds = 0.0
+
+  def CopyToDict(self):
+    """Copies the metrics to a dictionary.
+
+    Returns:
+      dict[str, object]: metric values per name.
+    """
+    return dict(self.__dict__)
+
+
+class _Measurement(object):
+  """Context manager measuring the wall time, CPU time and RSS of a phase."""
+
+  def __init__(self, module_metrics):
+    """Initializes a measurement.
+
+    Args:
+      module_metrics (ModuleMetrics): metrics to update.
+    """
+    super(_Measurement, self).__init__()
+    self._cpu_time = None
+    self._module_metrics = module_metrics
+    self._peak_rss = None
+    self._wall_time = None
+
+  def __enter__(self):
+    """Starts measuring."""
+    self._cpu_time = time.thread_time()
+    self._peak_rss = _GetPeakRSS()
+    self._wall_time = time.time()
+    return self._module_metrics
+
+  def __exit__(self, exception_type, value, traceback):
+    """Stops measuring and updates the metrics."""
+    self._module_metrics.wall_seconds += time.time() - self._wall_time
+    self._module_metrics.cpu_seconds += time.thread_time() - self._cpu_time
+    self._module_metrics.peak_rss_delta_bytes += max(
+        0, _GetPeakRSS() - self._peak_rss)
+
+
+class MetricsCollector(object):
+  """Thread-safe collector of per-module metrics."""
+
+  # Metrics written to Prometheus textfiles, with their help text.
+  _PROMETHEUS_METRICS = [
+      ('wall_seconds', 'Wall time of the module phase.'),
+      ('cpu_seconds', 'CPU time of the thread running the module phase.'),
+      ('peak_rss_delta_bytes', 'Growth of the peak RSS of the process.'),
+      ('blocked_seconds', 'Time blocked waiting on wanted modules.'),
+      ('queued_seconds', 'Time queued behind request limits.'),
+      ('containers_consumed', 'Containers retrieved from the state.'),
+      ('containers_produced', 'Containers stored in the state.')]
+
+  def __init__(self):
+    """Initializes a metrics collector."""
+    super(MetricsCollector, self).__init__()
+    self._lock = threading.Lock()
+    self._metrics = {}
+
+  def _GetModuleMetrics(self, module_name, phase):
+    """Retrieves the metrics of a module phase, creating them if needed.
+
+    Must be called with the lock held.
+
+    Args:
+      module_name (str): name of the module.
+      phase (str): name of the execution phase.
+
+    Returns:
+      ModuleMetrics: metrics of the module phase.
+    """
+    key = (phase, module_name)
+    module_metrics = self._metrics.get(key)
+    if not module_metrics:
+      module_metrics = ModuleMetrics(module_name, phase)
+      self._metrics[key] = module_metrics
+    return module_metrics
+
+  def AddBlockedTime(self, module_name, phase, seconds):
+    """Records time a module spent blocked.
+
+    Args:
+      module_name (str): name of the module.
+      phase (str): name of the execution phase.
+      seconds (float): time blocked, in seconds.
+    """
+    with self._lock:
+      self._GetModuleMetrics(module_name, phase).blocked_seconds += seconds
+
+  def AddQueuedTime(self, module_name, phase, seconds):
+    """Records time a module spent queued behind request limits.
+
+    Args:
+      module_name (str): name of the module.
+      phase (str): name of the execution phase.
+      seconds (float): time queued, in seconds.
+    """
+    with self._lock:
+      self._GetModuleMetrics(module_name, phase).queued_seconds += seconds
+
+  def CountContainers(self, module_name, phase, consumed=0, produced=0):
+    """Records containers a module consumed or produced.
+
+    Args:
+      module_name (str): name of the module.
+      phase (str): name of the execution phase.
+      consumed (Optional[int]): number of containers retrieved.
+      produced (Optional[int]): number of containers stored.
+    """
+    with self._lock:
+      module_metrics = self._GetModuleMetrics(module_name, phase)
+      module_metrics.containers_consumed += consumed
+      module_metrics.containers_produced += produced
+
+  def GetMetrics(self):
+    """Retrieves the metrics of all the module phases.
+
+    Returns:
+      list[ModuleMetrics]: metrics, sorted by phase and module name.
+    """
+    with self._lock:
+      return [self._metrics[key] for key in sorted(self._metrics)]
+
+  def Measure(self, module_name, phase):
+    """Measures the wall time, CPU time and RSS growth of a module phase.
+
+    Args:
+      module_name (str): name of the module.
+      phase (str): name of the execution phase.
+
+    Returns:
+      _Measurement: context manager that updates the module phase metrics
+          on exit.
+    """
+    with self._lock:
+      module_metrics = self._GetModuleMetrics(module_name, phase)
+    return _Measurement(module_metrics)
+
+  def WriteJSON(self, path, recipe_name):
+    """Writes the metrics to a JSON report.
+
+    Args:
+      path (str): path of the report.
+      recipe_name (str): name of the recipe the metrics are for.
+    """
+    report = {
+        'recipe': recipe_name,
+        'modules': [
+            module_metrics.CopyToDict()
+            for module_metrics in self.GetMetrics()]}
+    _WriteFile(path, json.dumps(report, indent=2, sort_keys=True))
+
+  def WritePrometheusTextfile(self, path, recipe_name):
+    """Writes the metrics in the Prometheus text format.
+
+    The file is meant to be picked up by the node exporter textfile collector.
+
+    Args:
+      path (str): path of the textfile, which should end with ".prom".
+      recipe_name (str): name of the recipe the metrics are for.
+    """
+    all_metrics = self.GetMetrics()
+    lines = []
+    for attribute_name, help_text in self._PROMETHEUS_METRICS:
+      metric_name = PROMETHEUS_PREFIX + attribute_name
+      lines.append('# HELP {0:s} {1:s}'.format(metric_name, help_text))
+      lines.append('# TYPE {0:s} gauge'.format(metric_name))
+      for module_metrics in all_metrics:
+        labels = 'recipe="{0:s}",module="{1:s}",phase="{2:s}"'.format(
+            recipe_name, module_metrics.module_name, module_metrics.phase)
+        lines.append('{0:s}{{{1:s}}} {2!r}'.format(
+            metric_name, labels, getattr(module_metrics, attribute_name)))
+    _WriteFile(path, '\n'.join(lines) + '\n')
@@ -3,9 +3,6 @@
 
 import abc
 import logging
-# Some AttributeErrors occured when trying to access logging.handlers, so
-# we import them separately
-from logging import handlers
 import traceback
 import sys
 
@@ -36,21 +33,16 @@ class BaseModule(object):
     self.SetupLogging()
 
   def SetupLogging(self):
-    """Sets up stream and file logging for a specific module."""
-    self.logger = logging.getLogger(name=self.__class__.__name__)
-
-    file_handler = handlers.RotatingFileHandler(
-        logging_utils.DEFAULT_LOG_FILE,
-        maxBytes=logging_utils.MAX_BYTES,
-        backupCount=logging_utils.BACKUP_COUNT)
-    file_handler.setFormatter(logging_utils.WolfFormatter(colorize=False))
-    self.logger.addHandler(file_handler)
+    """Sets up stream and file logging for a specific module.
 
-    console_handler = logging.StreamHandler()
-    formatter = logging_utils.WolfFormatter(random_color=True)
-    console_handler.setFormatter(formatter)
+    Log records are queued for the shared logging listener thread, which
+    writes them to the log file and console, so logging never blocks.
+    """
+    self.logger = logging.getLogger(name=self.__class__.__name__)
 
-    self.logger.addHandler(console_handler)
+    queue_handler = logging_utils.GetQueueHandler()
+    if queue_handler not in self.logger.handlers:
+      self.logger.addHandler(queue_handler)
 
   @property
   def name(self):
@@ -1,13 +1,23 @@
 # -*- coding: utf-8 -*-
 """Modules manager class."""
 
+import importlib
+
+
 class ModulesManager(object):
-  """Modules manager."""
+  """Modules manager.
+
+  Module classes register themselves when the Python module defining them is
+  imported. To avoid importing every module, and their dependencies, at
+  startup, the Python module defining a module class can be registered
+  instead: it is only imported the first time the module class is retrieved.
+  """
 
   # Allow a previously registered module to be overridden.
   ALLOW_MODULE_OVERRIDE = False
 
   _module_classes = {}
+  _module_import_paths = {}
 
   @classmethod
   def DeregisterModule(cls, module_class):
@@ -32,14 +42,37 @@ class ModulesManager(object):
   def GetModuleByName(cls, name):
     """Retrieves a specific by its name.
 
+    If the module class is not registered yet but the Python module defining
+    it is, that Python module is imported first.
+
     Args:
       name (str): name of the module.
 
     Returns:
       type: the module class, which is a subclass of BaseModule, or None if
           no corresponding module was found.
+
+    Raises:
+      ImportError: if the Python module defining the module class, or one of
+          its dependencies, cannot be imported.
+    """
+    module_class = cls._module_classes.get(name, None)
+    if not module_class and name in cls._module_import_paths:
+      # Importing the Python module registers the module class.
+      importlib.import_module(cls._module_import_paths[name])
+      module_class = cls._module_classes.get(name, None)
+    return module_class
+
+  @classmethod
+  def GetModuleNames(cls):
+    """Retrieves the names of the registered modules.
+
+    Returns:
+      list[str]: names of the modules whose class or Python module is
+          registered, sorted alphabetically.
     """
-    return cls._module_classes.get(name, None)
+    return sorted(
+        set(cls._module_classes.keys()) | set(cls._module_import_paths.keys()))
 
   @classmethod
   def RegisterModule(cls, module_class):
@@ -75,3 +108,25 @@ class ModulesManager(object):
     """
     for module_class in module_classes:
       cls.RegisterModule(module_class)
+
+  @classmethod
+  def RegisterModuleImportPath(cls, name, import_path):
+    """Registers the Python module that defines a module class.
+
+    Args:
+      name (str): name of the module class.
+      import_path (str): import path of the Python module, such as
+          "dftimewolf.lib.collectors.filesystem".
+    """
+    cls._module_import_paths[name] = import_path
+
+  @classmethod
+  def RegisterModuleImportPaths(cls, import_paths):
+    """Registers the Python modules that define module classes.
+
+    Args:
+      import_paths (dict[str, str]): import paths of the Python modules, per
+          module class name.
+    """
+    for name, import_path in import_paths.items():
+      cls.RegisterModuleImportPath(name, import_path)
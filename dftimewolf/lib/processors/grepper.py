@@ -35,8 +35,45 @@ class GrepperSearch(module.BaseModule):
     self._keywords = keywords
     self._output_path = tempfile.mkdtemp()
 
+  def _IsPDF(self, filename):
+    """Determines if a file is searched as a PDF file or as a text file.
+
+    Args:
+      filename (str): name of the file.
+
+    Returns:
+      bool: True if the file is searched as a PDF file.
+    """
+    return mimetypes.guess_type(filename)[0] == 'application/pdf'
+
+  def _GrepFile(self, path, filename):
+    """Searches a file for keywords.
+
+    Args:
+      path (str): file path.
+      filename (str): name of the file.
+
+    Returns:
+      set[str]: unique occurrences of every match.
+    """
+    if self._IsPDF(filename):
+      return self.GrepPDF(path)
+
+    found = set()
+    with open(path, 'r') as fp:
+      for line in fp:
+        found.update(set(x.lower() for x in re.findall(
+            self._keywords, line, re.IGNORECASE)))
+    return found
+
   def Process(self):
-    """Executes grep on the module input."""
+    """Executes grep on the module input.
+
+    Files that are hard links to the same content, such as files deduplicated
+    by the GRR blob store, are only searched once per parser, since links
+    with different extensions are parsed differently.
+    """
+    found_per_file_key = {}
     for file_container in self.state.GetContainers(containers.File):
       path = file_container.path
       log_file_path = os.path.join(self._output_path, 'grepper.log')
@@ -47,15 +84,14 @@ class GrepperSearch(module.BaseModule):
       try:
         for root, _, files in os.walk(path):
           for filename in sorted(files):
-            found = set()
             fullpath = '{0:s}/{1:s}'.format(os.path.abspath(root), filename)
-            if mimetypes.guess_type(filename)[0] == 'application/pdf':
-              found = self.GrepPDF(fullpath)
-            else:
-              with open(fullpath, 'r') as fp:
-                for line in fp:
-                  found.update(set(x.lower() for x in re.findall(
-                      self._keywords, line, re.IGNORECASE)))
+            stat = os.stat(fullpath)
+            file_key = (stat.st_dev, stat.st_ino, self._IsPDF(filename))
+            found = found_per_file_key.get(file_key)
+            if found is None:
+              found = self._GrepFile(fullpath, filename)
+              if stat.st_nlink > 1:
+                found_per_file_key[file_key] = found
             if [item for item in found if item]:
               output = '{0:s}/{1:s}:{2:s}'.format(path, filename, ','.join(
                   filter(None, sorted(found))))
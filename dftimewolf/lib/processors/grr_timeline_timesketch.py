@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""Converts GRR timelines into Timesketch JSONL, without plaso.
+
+GRR timelines are collected by GRRTimelineCollector either as Sleuthkit body
+files or as RAW streams of TimelineEntry protobufs. Both are read entry by
+entry and converted to one event per distinct timestamp of each entry, so
+that the memory used does not depend on the size of the timeline.
+"""
+
+import collections
+import datetime
+import json
+import os
+import tempfile
+
+from dftimewolf.lib import grr_timeline
+from dftimewolf.lib import module
+from dftimewolf.lib.containers import containers
+from dftimewolf.lib.modules import manager as modules_manager
+
+
+class GRRTimelineTimesketch(module.BaseModule):
+  """Converts GRR timelines into Timesketch JSONL files.
+
+  input: GRR timelines, in BODY (.body) or RAW (.raw) format.
+  output: Timesketch JSONL files, one per timeline.
+  """
+
+  # Timestamp attributes of the timeline entries, with their letter in the
+  # MACB representation and their Timesketch timestamp description, in MACB
+  # order.
+  _TIMESTAMPS = (
+      ('mtime', 'M', 'Content Modification Time'),
+      ('atime', 'A', 'Last Access Time'),
+      ('ctime', 'C', 'Metadata Modification Time'),
+      ('crtime', 'B', 'Creation Time'))
+
+  _EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+  def __init__(self, state):
+    super(GRRTimelineTimesketch, self).__init__(state)
+    self._output_path = None
+    self._streamed_jsonl_files = []
+
+  def SetUp(self):  # pylint: disable=arguments-differ
+    """Sets up the directory the Timesketch JSONL files are written to.
+
+    In streaming mode, timelines are converted as soon as upstream modules
+    store them.
+    """
+    self._output_path = tempfile.mkdtemp()
+    if self.state.streaming:
+      self.state.RegisterStreamingCallback(
+          self._StreamFileContainer, containers.File)
+
+  def _IsTimeline(self, file_container):
+    """Determines whether a file is a GRR timeline.
+
+    Args:
+      file_container (containers.File): file.
+
+    Returns:
+      bool: True if the file is a BODY or RAW GRR timeline.
+    """
+    return bool(grr_timeline.GetTimelineFormat(file_container.path))
+
+  def _GenerateEvents(self, entries):
+    """Generates the Timesketch events of timeline entries.
+
+    Each entry generates one event per distinct timestamp, whose MACB
+    representation and description list the timestamps it stands for.
+    Timestamps of 0 are unknown, and do not generate events.
+
+    Args:
+      entries (iterable[grr_timeline.TimelineEntry]): timeline entries.
+
+    Yields:
+      dict[str, object]: Timesketch events.
+    """
+    for entry in entries:
+      descriptions_per_timestamp = collections.OrderedDict()
+      for attribute, letter, description in self._TIMESTAMPS:
+        timestamp = getattr(entry, attribute)
+        if timestamp:
+          descriptions_per_timestamp.setdefault(timestamp, {})[letter] = (
+              description)
+
+      for timestamp, descriptions in descriptions_per_timestamp.items():
+        date_time = self._EPOCH + datetime.timedelta(microseconds=timestamp)
+        yield {
+            'message': entry.path,
+            'timestamp': timestamp,
+            'datetime': date_time.isoformat(),
+            'timestamp_desc': '; '.join(descriptions.values()),
+            'macb': ''.join(
+                letter if letter in descriptions else '.'
+                for _, letter, _ in self._TIMESTAMPS),
+            'data_type': 'fs:stat',
+            'filename': entry.path,
+            'inode': entry.inode,
+            'mode': entry.mode,
+            'uid': entry.uid,
+            'gid': entry.gid,
+            'size': entry.size}
+
+  def _ProcessFileContainer(self, file_container):
+    """Converts a GRR timeline into a Timesketch JSONL file.
+
+    Args:
+      file_container (containers.File): GRR timeline.
+
+    Returns:
+      containers.File: container for the Timesketch JSONL file, or None if
+          the timeline could not be converted.
+    """
+    path = file_container.path
+    entries = grr_timeline.ReadTimeline(
+        path, grr_timeline.GetTimelineFormat(path))
+
+    base_name = os.path.splitext(os.path.basename(path))[0]
+    jsonl_path = os.path.join(
+        self._output_path, '{0:s}.jsonl'.format(base_name))
+    number_of_events = 0
+    try:
+      with self.state.tracer.Span(
+          'GRR timeline to JSONL', category='grr', path=path):
+        with open(jsonl_path, 'w', encoding='utf-8') as jsonl_file:
+          for event in self._GenerateEvents(entries):
+            jsonl_file.write(json.dumps(event))
+            jsonl_file.write('\n')
+            number_of_events += 1
+    except (OSError, ValueError, EOFError) as exception:
+      self.ModuleError('Unable to convert timeline {0:s}: {1!s}'.format(
+          path, exception), critical=False)
+      if os.path.exists(jsonl_path):
+        os.remove(jsonl_path)
+      return None
+
+    self.logger.info('{0:s}: {1:d} events written to {2:s}'.format(
+        path, number_of_events, jsonl_path))
+    return containers.File(file_container.name, jsonl_path)
+
+  def _StreamFileContainer(self, file_container):
+    """Converts a timeline as soon as it is streamed.
+
+    Args:
+      file_container (containers.File): file to process.
+    """
+    if self._IsTimeline(file_container):
+      container = self._ProcessFileContainer(file_container)
+      if container:
+        self._streamed_jsonl_files.append(container)
+
+  def Process(self):
+    """Converts the GRR timelines into Timesketch JSONL files.
+
+    Files that are not GRR timelines are kept for the next modules.
+    """
+    for file_container in self.state.GetContainers(containers.File, pop=True):
+      if not self._IsTimeline(file_container):
+        self.state.StoreContainer(file_container)
+      elif not self.state.streaming:
+        container = self._ProcessFileContainer(file_container)
+        if container:
+          self.state.StoreContainer(container)
+
+    # Timelines have already been converted as they were streamed.
+    for container in self._streamed_jsonl_files:
+      self.state.StoreContainer(container)
+
+
+modules_manager.ModulesManager.RegisterModule(GRRTimelineTimesketch)
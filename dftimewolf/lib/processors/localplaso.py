@@ -21,61 +21,97 @@ class LocalPlasoProcessor(module.BaseModule):
     super(LocalPlasoProcessor, self).__init__(state)
     self._timezone = None
     self._output_path = None
+    self._streamed_plaso_files = []
 
   def SetUp(self, timezone=None):  # pylint: disable=arguments-differ
     """Sets up the local time zone with Plaso (log2timeline) should use.
 
+    In streaming mode, files are processed as soon as upstream modules
+    store them.
+
     Args:
       timezone (Optional[str]): name of the local time zone.
     """
     self._timezone = timezone
     self._output_path = tempfile.mkdtemp()
+    if self.state.streaming:
+      self.state.RegisterStreamingCallback(
+          self._StreamFileContainer, containers.File)
 
-  def Process(self):
-    """Executes log2timeline.py on the module input."""
-    for file_container in self.state.GetContainers(containers.File, pop=True):
-      description = file_container.name
-      path = file_container.path
-      log_file_path = os.path.join(self._output_path, 'plaso.log')
-      self.logger.info('Log file: {0:s}'.format(log_file_path))
-
-      # Build the plaso command line.
-      cmd = ['log2timeline.py']
-      # Since we might be running alongside another Module, always disable
-      # the status view.
-      cmd.extend(['-q', '--status_view', 'none'])
-      if self._timezone:
-        cmd.extend(['-z', self._timezone])
-
-      # Analyze all available partitions.
-      cmd.extend(['--partition', 'all'])
-
-      # Setup logging.
-      cmd.extend(['--logfile', log_file_path])
-
-      # And now, the crux of the command.
-      # Generate a new storage file for each plaso run
-      plaso_storage_file_path = os.path.join(
-          self._output_path, '{0:s}.plaso'.format(uuid.uuid4().hex))
-      cmd.extend([plaso_storage_file_path, path])
-
-      # Run the l2t command
-      full_cmd = ' '.join(cmd)
-      self.logger.info('Running external command: "{0:s}"'.format(full_cmd))
-      try:
+  def _ProcessFileContainer(self, file_container):
+    """Executes log2timeline.py on a single file container.
+
+    Args:
+      file_container (containers.File): file to process.
+
+    Returns:
+      containers.File: container for the resulting Plaso storage file.
+    """
+    description = file_container.name
+    path = file_container.path
+    log_file_path = os.path.join(self._output_path, 'plaso.log')
+    self.logger.info('Log file: {0:s}'.format(log_file_path))
+
+    # Build the plaso command line.
+    cmd = ['log2timeline.py']
+    # Since we might be running alongside another Module, always disable
+    # the status view.
+    cmd.extend(['-q', '--status_view', 'none'])
+    if self._timezone:
+      cmd.extend(['-z', self._timezone])
+
+    # Analyze all available partitions.
+    cmd.extend(['--partition', 'all'])
+
+    # Setup logging.
+    cmd.extend(['--logfile', log_file_path])
+
+    # And now, the crux of the command.
+    # Generate a new storage file for each plaso run
+    plaso_storage_file_path = os.path.join(
+        self._output_path, '{0:s}.plaso'.format(uuid.uuid4().hex))
+    cmd.extend([plaso_storage_file_path, path])
+
+    # Run the l2t command
+    full_cmd = ' '.join(cmd)
+    self.logger.info('Running external command: "{0:s}"'.format(full_cmd))
+    try:
+      with self.state.tracer.Span('log2timeline', category='plaso', path=path):
         l2t_proc = subprocess.Popen(
             cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
         _, error = l2t_proc.communicate()
         l2t_status = l2t_proc.wait()
-      except OSError as exception:
-        self.ModuleError(str(exception), critical=True)
+    except OSError as exception:
+      self.ModuleError(str(exception), critical=True)
+
+    if l2t_status:
+      message = ('The log2timeline command {0:s} failed: {1!s}.'
+                 ' Check log file for details.').format(full_cmd, error)
+      self.ModuleError(message, critical=True)
 
-      if l2t_status:
-        message = ('The log2timeline command {0:s} failed: {1!s}.'
-                   ' Check log file for details.').format(full_cmd, error)
-        self.ModuleError(message, critical=True)
+    return containers.File(description, plaso_storage_file_path)
 
-      container = containers.File(description, plaso_storage_file_path)
+  def _StreamFileContainer(self, file_container):
+    """Processes a file as soon as it is streamed.
+
+    Args:
+      file_container (containers.File): file to process.
+    """
+    self._streamed_plaso_files.append(
+        self._ProcessFileContainer(file_container))
+
+  def Process(self):
+    """Executes log2timeline.py on the module input."""
+    if self.state.streaming:
+      # Input files have already been processed as they were streamed. Only
+      # the resulting Plaso storage files are kept for the next modules.
+      self.state.GetContainers(containers.File, pop=True)
+      for container in self._streamed_plaso_files:
+        self.state.StoreContainer(container)
+      return
+
+    for file_container in self.state.GetContainers(containers.File, pop=True):
+      container = self._ProcessFileContainer(file_container)
       self.state.StoreContainer(container)
 
 
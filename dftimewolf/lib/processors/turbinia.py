@@ -210,7 +210,10 @@ class TurbiniaProcessor(module.BaseModule):
       self.client.send_request(request)
       self.logger.info('Waiting for Turbinia request {0:s} to complete'.format(
           request.request_id))
-      self.client.wait_for_request(**request_dict)
+      with self.state.tracer.Span(
+          'Turbinia wait_for_request', category='turbinia',
+          request_id=request.request_id):
+        self.client.wait_for_request(**request_dict)
       task_data = self.client.get_task_data(**request_dict)
     except TurbiniaException as exception:
       # TODO: determine if exception should be converted into a string as
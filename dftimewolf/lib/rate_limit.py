@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""Rate limiting of requests to external services."""
+
+import threading
+import time
+
+
+class TokenBucket(object):
+  """Thread-safe token bucket rate limiter.
+
+  Tokens are added at a fixed rate, up to the capacity of the bucket. Each
+  request takes a token, waiting for one to be added if the bucket is empty.
+  Callers are served in the order they asked for tokens.
+  """
+
+  def __init__(self, rate, capacity=None):
+    """Initializes a token bucket.
+
+    Args:
+      rate (float): number of tokens added per second.
+      capacity (Optional[float]): maximum number of tokens in the bucket,
+          which is the largest burst of requests allowed. Defaults to the
+          number of tokens added per second, and at least 1.
+    """
+    super(TokenBucket, self).__init__()
+    self._capacity = capacity or max(1.0, float(rate))
+    self._last_update_time = time.monotonic()
+    self._lock = threading.Lock()
+    self._rate = float(rate)
+    self._tokens = self._capacity
+
+  def Acquire(self):
+    """Takes a token from the bucket, waiting for one if needed.
+
+    Returns:
+      float: number of seconds waited for the token.
+    """
+    with self._lock:
+      current_time = time.monotonic()
+      self._tokens = min(
+          self._capacity,
+          self._tokens + (current_time - self._last_update_time) * self._rate)
+      self._last_update_time = current_time
+      # The token is reserved right away, so the balance can be negative
+      # while callers wait for the tokens they reserved.
+      self._tokens -= 1
+      wait_time = max(0.0, -self._tokens / self._rate)
+
+    if wait_time:
+      time.sleep(wait_time)
+    return wait_time
@@ -1,14 +1,18 @@
 # -*- coding: utf-8 -*-
 """Recipes manager."""
 
+import hashlib
 import io
 import glob
 import json
+import logging
 import os
 
 from dftimewolf.lib import errors
 from dftimewolf.lib import resources
 
+logger = logging.getLogger('dftimewolf')
+
 
 class RecipesManager(object):
   """Recipes manager."""
@@ -16,19 +20,20 @@ class RecipesManager(object):
   # Allow a previously registered recipe to be overridden.
   ALLOW_RECIPE_OVERRIDE = False
 
+  # Version of the recipe index format, indexes of other versions are ignored.
+  _INDEX_VERSION = 1
+
   _recipes = {}
 
-  def _ReadRecipeFromFileObject(self, file_object):
-    """Reads a recipe from a JSON file-like object.
+  def _CreateRecipe(self, json_dict):
+    """Creates a recipe from its JSON dictionary.
 
     Args:
-      file_object (file): JSON file-like object that contains the recipe.
+      json_dict (dict[str, object]): recipe JSON dictionary.
 
     Returns:
       Recipe: recipe.
     """
-    json_dict = json.load(file_object)
-
     description = json_dict['description']
     del json_dict['description']
 
@@ -37,6 +42,68 @@ class RecipesManager(object):
 
     return resources.Recipe(description, json_dict, args)
 
+  def _ReadRecipeFromFileObject(self, file_object):
+    """Reads a recipe from a JSON file-like object.
+
+    Args:
+      file_object (file): JSON file-like object that contains the recipe.
+
+    Returns:
+      Recipe: recipe.
+    """
+    return self._CreateRecipe(json.load(file_object))
+
+  def _ReadRecipeIndex(self, index_path, path):
+    """Reads a recipe index.
+
+    Args:
+      index_path (str): path of the recipe index file.
+      path (str): path of the directory containing the recipes JSON files.
+
+    Returns:
+      dict[str, dict[str, object]]: index entries per recipe file path, empty
+          if the index does not exist, cannot be read or is for another
+          directory.
+    """
+    try:
+      with io.open(index_path, 'r', encoding='utf-8') as file_object:
+        index = json.load(file_object)
+    except (IOError, OSError, ValueError):
+      return {}
+
+    if (not isinstance(index, dict) or
+        index.get('version') != self._INDEX_VERSION or
+        index.get('directory') != os.path.abspath(path)):
+      return {}
+    return index.get('recipes', {})
+
+  def _WriteRecipeIndex(self, index_path, path, entries):
+    """Writes a recipe index.
+
+    Failures are logged and ignored, recipes are parsed again next time.
+
+    Args:
+      index_path (str): path of the recipe index file.
+      path (str): path of the directory containing the recipes JSON files.
+      entries (dict[str, dict[str, object]]): index entries per recipe file
+          path.
+    """
+    index = {
+        'directory': os.path.abspath(path),
+        'recipes': entries,
+        'version': self._INDEX_VERSION}
+    temporary_path = '{0:s}.{1:d}.tmp'.format(index_path, os.getpid())
+    try:
+      index_directory = os.path.dirname(index_path)
+      if index_directory and not os.path.isdir(index_directory):
+        os.makedirs(index_directory)
+      with io.open(temporary_path, 'w', encoding='utf-8') as file_object:
+        json.dump(index, file_object)
+      os.replace(temporary_path, index_path)
+    except (IOError, OSError) as exception:
+      logger.debug('Unable to write recipe index {0:s}: {1!s}'.format(
+          index_path, exception))
+
   def DeregisterRecipe(self, recipe):
     """Deregisters a recipe.
 
@@ -54,6 +121,17 @@ class RecipesManager(object):
 
     del self._recipes[recipe_name]
 
+  def GetRecipe(self, name):
+    """Retrieves a registered recipe by name.
+
+    Args:
+      name (str): name of the recipe, which is case insensitive.
+
+    Returns:
+      Recipe: the recipe, or None if no recipe is registered with that name.
+    """
+    return self._recipes.get(name.lower(), None)
+
   def GetRecipes(self):
     """Retrieves the registered recipes.
 
@@ -81,14 +159,54 @@ class RecipesManager(object):
 
     self.RegisterRecipe(recipe)
 
-  def ReadRecipesFromDirectory(self, path):
+  def ReadRecipesFromDirectory(self, path, index_path=None):
     """Reads recipes from a directory containing JSON files.
 
+    If an index path is set, parsed recipes are cached in the index. A recipe
+    file is only read again if its modification time or size changed, and
+    only parsed again if its SHA-256 hash changed.
+
     Args:
       path (str): path of the directory containing the recipes JSON files.
+      index_path (Optional[str]): path of the recipe index file.
+
+    Raises:
+      RecipeParseError: when a recipe cannot be parsed.
     """
-    for file_path in glob.glob(os.path.join(path, '*.json')):
-      self.ReadRecipeFromFile(file_path)
+    file_paths = sorted(glob.glob(os.path.join(path, '*.json')))
+    if not index_path:
+      for file_path in file_paths:
+        self.ReadRecipeFromFile(file_path)
+      return
+
+    entries = self._ReadRecipeIndex(index_path, path)
+    updated_entries = {}
+    for file_path in file_paths:
+      stat_object = os.stat(file_path)
+      entry = entries.get(file_path)
+      if (not entry or entry['mtime'] != stat_object.st_mtime_ns or
+          entry['size'] != stat_object.st_size):
+        with io.open(file_path, 'rb') as file_object:
+          data = file_object.read()
+        sha256 = hashlib.sha256(data).hexdigest()
+        if not entry or entry['sha256'] != sha256:
+          # UnicodeDecodeError and JSONDecodeError are both ValueErrors.
+          try:
+            json_dict = json.loads(data.decode('utf-8'))
+          except ValueError as exception:
+            raise errors.RecipeParseError(
+                'Unable to parse recipe file: {0:s} with error: {1!s}'.format(
+                    file_path, exception))
+          entry = {'json_dict': json_dict, 'sha256': sha256}
+        entry = dict(
+            entry, mtime=stat_object.st_mtime_ns, size=stat_object.st_size)
+
+      updated_entries[file_path] = entry
+      # The recipe is created from a copy, the index entry is not modified.
+      self.RegisterRecipe(self._CreateRecipe(dict(entry['json_dict'])))
+
+    if updated_entries != entries:
+      self._WriteRecipeIndex(index_path, path, updated_entries)
 
   def RegisterRecipe(self, recipe):
     """Registers a recipe.
@@ -4,13 +4,25 @@
 Use it to track errors, abort on global failures, clean up after modules, etc.
 """
 
+from concurrent import futures
+import contextvars
 import logging
+import os
+import pickle
+import sqlite3
 import sys
 import threading
+import time
 import traceback
 
 from dftimewolf.lib import errors
+from dftimewolf.lib import metrics
+from dftimewolf.lib import module as dftw_module
+from dftimewolf.lib import streaming
+from dftimewolf.lib import tracing
 from dftimewolf.lib import utils
+from dftimewolf.lib.containers import sqlite_store
+from dftimewolf.lib.containers import store as container_store
 from dftimewolf.lib.modules import manager as modules_manager
 
 # TODO(tomchop): Consider changing this to `dftimewolf.state` if we ever need
@@ -19,6 +31,21 @@ logger = logging.getLogger('dftimewolf')
 
 NEW_ISSUE_URL = 'https://github.com/log2timeline/dftimewolf/issues/new'
 
+CHECKPOINT_FILENAME = 'checkpoint.pickle'
+# Copy of the containers spilled to disk, saved along with the checkpoint.
+CHECKPOINT_CONTAINERS_FILENAME = 'checkpoint.sqlite'
+METRICS_FILENAME = 'metrics.json'
+TRACE_FILENAME = 'trace.json'
+
+# Names of the execution phases for which module timings are recorded.
+PHASE_SETUP = 'SetUp'
+PHASE_PROCESS = 'Process'
+
+# Name of the module and of the execution phase the current thread runs.
+# Threads started by modules run in a copy of their starting context to be
+# attributed to the same module.
+CURRENT_MODULE = contextvars.ContextVar('current_module', default=None)
+
 
 class DFTimewolfState(object):
   """The main State class.
@@ -32,46 +59,319 @@ class DFTimewolfState(object):
     global_errors (list[tuple[str, bool]]): the CleanUp() method moves non
         critical errors to this attribute for later reporting.
     input (list[str]): data that the current module will use as input.
+    legacy_scheduler (bool): True if modules should be run with one thread
+        per module, each waiting on its dependencies' threading events,
+        instead of through the bounded dependency scheduler.
+    max_workers (int): maximum number of modules that the scheduler runs
+        concurrently.
+    metrics (metrics.MetricsCollector): wall time, CPU time, RSS growth,
+        blocked time and container counts of each module phase.
+    metrics_file (str): path of the JSON metrics report, or None to write
+        it to the run directory, if any.
+    metrics_prometheus_textfile (str): path of the Prometheus textfile the
+        metrics are written to, or None.
+    module_timings (dict[str, dict[str, dict[str, float]]]): per phase and
+        per module name, the time at which the module was queued, started
+        and finished, in seconds since the epoch.
     output (list[str]): data that the current module generates.
     recipe: (dict[str, str]): recipe declaring modules to load.
-    store (dict[str, object]): arbitrary data for modules.
+    run_directory (str): directory where a checkpoint is saved whenever
+        modules have completed, or None if checkpoints are disabled.
+    store (container_store.ContainerStore): containers stored by modules,
+        per container type. Containers are spilled to an SQLite file once
+        thresholds are crossed if the "container_store" configuration
+        parameter is set to "sqlite".
+    stream_consumers (dict[type, list[streaming.StreamConsumer]]): consumers
+        fed by streamed containers, per container type, in streaming mode.
+    stream_queue_size (int): maximum number of containers queued for each
+        stream consumer before producers are blocked.
+    streaming (bool): True if stored containers should be streamed to
+        registered callbacks as soon as they are stored, while upstream
+        modules are still running.
+    trace_file (str): path of the Chrome trace event file, or None to write
+        it to the run directory, if any.
+    tracer (tracing.Tracer): spans of module phases and of the operations
+        modules trace.
   """
 
+  _DEFAULT_MAX_WORKERS = 8
+
   def __init__(self, config):
     """Initializes a state."""
     super(DFTimewolfState, self).__init__()
     self.command_line_options = {}
     self._cache = {}
+    self._cache_expiry_times = {}
+    self._checkpoint_lock = threading.Lock()
+    self._completed_modules = set()
+    self._checkpoint_disabled = False
     self._module_pool = {}
+    self._phase_start_times = {}
+    self._resumed = False
+    self._running_modules = set()
     self._state_lock = threading.Lock()
     self._threading_event_per_module = {}
     self.config = config
     self.errors = []
     self.global_errors = []
     self.input = []
+    self.legacy_scheduler = bool(config.GetExtra('legacy_scheduler'))
+    self.max_workers = (
+        config.GetExtra('max_workers') or self._DEFAULT_MAX_WORKERS)
+    self.metrics = metrics.MetricsCollector()
+    self.metrics_file = config.GetExtra('metrics_file')
+    self.metrics_prometheus_textfile = config.GetExtra(
+        'metrics_prometheus_textfile')
+    self.module_timings = {}
     self.output = []
     self.recipe = None
-    self.store = {}
+    self.run_directory = None
+    self.store = self._CreateContainerStore(config)
+    self.stream_consumers = {}
+    self.stream_queue_size = (
+        config.GetExtra('stream_queue_size') or streaming.DEFAULT_QUEUE_SIZE)
+    self.streaming = bool(config.GetExtra('streaming'))
     self.streaming_callbacks = {}
+    self.trace_file = config.GetExtra('trace_file')
+    self.tracer = tracing.Tracer()
     self._abort_execution = False
 
-  def _InvokeModulesInThreads(self, callback):
+  @staticmethod
+  def _CreateContainerStore(config):
+    """Creates the container store selected in the configuration.
+
+    Args:
+      config (dftimewolf.config.Config): configuration.
+
+    Returns:
+      container_store.ContainerStore: container store.
+    """
+    if config.GetExtra('container_store') == 'sqlite':
+      return sqlite_store.SQLiteContainerStore(
+          max_containers=(
+              config.GetExtra('max_containers_in_memory') or
+              sqlite_store.DEFAULT_MAX_CONTAINERS),
+          max_memory_bytes=(
+              config.GetExtra('max_containers_memory_bytes') or
+              sqlite_store.DEFAULT_MAX_MEMORY_BYTES))
+    return container_store.ContainerStore()
+
+  def _InvokeModulesInThreads(self, callback, phase, respect_wants=False):
+    """Invokes the callback function on all the modules.
+
+    Modules are run through the bounded dependency scheduler, unless
+    legacy_scheduler is set, in which case every module gets its own thread.
+
+    Args:
+      callback (function): callback function to invoke on all the modules.
+      phase (str): name of the execution phase, used to record timings.
+      respect_wants (Optional[bool]): True if a module should only be
+          scheduled once all the modules it wants have completed.
+    """
+    self.module_timings[phase] = {}
+    self._phase_start_times[phase] = time.time()
+    if self.legacy_scheduler:
+      self._InvokeModulesInLegacyThreads(callback, phase)
+    else:
+      self._ScheduleModules(callback, phase, respect_wants=respect_wants)
+
+  def _InvokeModulesInLegacyThreads(self, callback, phase):
     """Invokes the callback function on all the modules in separate threads.
 
+    Threads are started all at once; ordering is left to the callback, which
+    waits on the threading events of the modules it wants.
+
     Args:
       callback (function): callback function to invoke on all the modules.
+      phase (str): name of the execution phase, used to record timings.
     """
     threads = []
     for module_definition in self.recipe['modules']:
-      thread_args = (module_definition, )
-      thread = threading.Thread(target=callback, args=thread_args)
+      self._RecordModuleTiming(phase, module_definition['name'], 'queued')
+      thread_args = (callback, phase, module_definition)
+      thread = threading.Thread(
+          target=self._RunTimedCallback, args=thread_args)
       threads.append(thread)
       thread.start()
 
     for thread in threads:
       thread.join()
 
-    self.CheckErrors(is_global=True)
+  def _ScheduleModules(self, callback, phase, respect_wants=False):
+    """Invokes the callback function on modules as their dependencies finish.
+
+    Only modules whose dependencies have completed are sent to a thread pool
+    of at most max_workers threads.
+
+    Args:
+      callback (function): callback function to invoke on all the modules.
+      phase (str): name of the execution phase, used to record timings.
+      respect_wants (Optional[bool]): True if a module should only be
+          scheduled once all the modules it wants have completed.
+    """
+    module_definitions = self.SortModuleDefinitions(self.recipe['modules'])
+    pending_wants = {}
+    dependents = {}
+    for module_definition in module_definitions:
+      module_name = module_definition['name']
+      wants = module_definition.get('wants', []) if respect_wants else []
+      pending_wants[module_name] = set(wants)
+      dependents.setdefault(module_name, [])
+      for dependency in wants:
+        dependents.setdefault(dependency, []).append(module_definition)
+
+    with futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+      running = {}
+
+      def _Submit(module_definition):
+        """Queues a module definition for execution."""
+        module_name = module_definition['name']
+        self._RecordModuleTiming(phase, module_name, 'queued')
+        future = executor.submit(
+            self._RunTimedCallback, callback, phase, module_definition)
+        running[future] = module_name
+
+      for module_definition in module_definitions:
+        if not pending_wants[module_definition['name']]:
+          _Submit(module_definition)
+
+      while running:
+        done, _ = futures.wait(running, return_when=futures.FIRST_COMPLETED)
+        for future in done:
+          module_name = running.pop(future)
+          # Callbacks report their own errors, but do not swallow anything
+          # that escaped them.
+          future.result()
+          for dependent in dependents[module_name]:
+            dependent_wants = pending_wants[dependent['name']]
+            dependent_wants.discard(module_name)
+            if not dependent_wants:
+              _Submit(dependent)
+
+  def _RunTimedCallback(self, callback, phase, module_definition):
+    """Invokes a callback on a module, recording its timings and metrics.
+
+    The time between the start of the phase and the module being queued,
+    which the scheduler spends waiting on the modules it wants, is recorded
+    as blocked time.
+
+    Args:
+      callback (function): callback function to invoke on the module.
+      phase (str): name of the execution phase, used to record timings.
+      module_definition (dict[str, str]): recipe module definition.
+    """
+    module_name = module_definition['name']
+    self._RecordModuleTiming(phase, module_name, 'started')
+    with self._state_lock:
+      queued = self.module_timings[phase][module_name]['queued']
+    self.metrics.AddBlockedTime(
+        module_name, phase, queued - self._phase_start_times[phase])
+
+    token = CURRENT_MODULE.set((module_name, phase))
+    try:
+      with self.tracer.Span(module_name, category=phase):
+        with self.metrics.Measure(module_name, phase):
+          callback(module_definition)
+    finally:
+      CURRENT_MODULE.reset(token)
+      self._RecordModuleTiming(phase, module_name, 'finished')
+
+  def _GetCurrentModule(self):
+    """Determines which module phase the calling thread is running.
+
+    Threads run by the scheduler set their module phase. Threads started by
+    modules inherit it when run in a copy of the module's context, and
+    stream consumer threads are attributed to the Process phase of the
+    module that registered their callback.
+
+    Returns:
+      tuple[str, str]: name of the module and of the execution phase, or
+          None if the calling thread is not running a module.
+    """
+    return CURRENT_MODULE.get()
+
+  def _CountContainers(self, consumed=0, produced=0):
+    """Records containers consumed or produced by the calling module.
+
+    Args:
+      consumed (Optional[int]): number of containers retrieved.
+      produced (Optional[int]): number of containers stored.
+    """
+    current_module = self._GetCurrentModule()
+    if current_module:
+      module_name, phase = current_module
+      self.metrics.CountContainers(
+          module_name, phase, consumed=consumed, produced=produced)
+
+  def RecordQueuedTime(self, seconds):
+    """Records time the calling module spent queued behind request limits.
+
+    Args:
+      seconds (float): time queued, in seconds.
+    """
+    current_module = self._GetCurrentModule()
+    if current_module:
+      module_name, phase = current_module
+      self.metrics.AddQueuedTime(module_name, phase, seconds)
+
+  def _RecordModuleTiming(self, phase, module_name, event):
+    """Thread-safe method to record when a scheduling event happened.
+
+    Args:
+      phase (str): name of the execution phase.
+      module_name (str): name of the module.
+      event (str): name of the event, such as "queued", "started" or
+          "finished".
+    """
+    with self._state_lock:
+      phase_timings = self.module_timings.setdefault(phase, {})
+      phase_timings.setdefault(module_name, {})[event] = time.time()
+
+  @staticmethod
+  def SortModuleDefinitions(module_definitions):
+    """Sorts module definitions so that modules come after those they want.
+
+    Modules that do not depend on each other keep their recipe order.
+
+    Args:
+      module_definitions (list[dict[str, object]]): recipe module definitions.
+
+    Returns:
+      list[dict[str, object]]: module definitions in topological order.
+
+    Raises:
+      RecipeParseError: if a module wants an unknown module, or if the
+          dependencies contain a cycle.
+    """
+    module_names = [definition['name'] for definition in module_definitions]
+    pending_wants = {}
+    for module_definition in module_definitions:
+      wants = set(module_definition.get('wants', []))
+      unknown_wants = wants.difference(module_names)
+      if unknown_wants:
+        raise errors.RecipeParseError(
+            'Module {0:s} wants unknown modules: {1:s}'.format(
+                module_definition['name'], ', '.join(sorted(unknown_wants))))
+      pending_wants[module_definition['name']] = wants
+
+    sorted_definitions = []
+    remaining_definitions = list(module_definitions)
+    while remaining_definitions:
+      ready_definitions = [
+          definition for definition in remaining_definitions
+          if not pending_wants[definition['name']]]
+      if not ready_definitions:
+        raise errors.RecipeParseError(
+            'Dependency cycle between modules: {0:s}'.format(', '.join(
+                definition['name'] for definition in remaining_definitions)))
+
+      for definition in ready_definitions:
+        remaining_definitions.remove(definition)
+        sorted_definitions.append(definition)
+        for wants in pending_wants.values():
+          wants.discard(definition['name'])
+
+    return sorted_definitions
 
   def LoadRecipe(self, recipe):
     """Populates the internal module pool with modules declared in a recipe.
@@ -80,22 +380,30 @@ class DFTimewolfState(object):
       recipe (dict[str, str]): recipe declaring modules to load.
 
     Raises:
-      RecipeParseError: if a module in the recipe does not exist.
+      RecipeParseError: if a module in the recipe does not exist or cannot be
+          imported, or if the modules' dependencies cannot be resolved.
     """
     self.recipe = recipe
     module_definitions = recipe.get('modules', [])
+    self.SortModuleDefinitions(module_definitions)
     preflight_definitions = recipe.get('preflights', [])
     for module_definition in module_definitions + preflight_definitions:
       # Combine CLI args with args from the recipe description
       module_name = module_definition['name']
-      module_class = modules_manager.ModulesManager.GetModuleByName(module_name)
+      try:
+        module_class = modules_manager.ModulesManager.GetModuleByName(
+            module_name)
+      except ImportError as exception:
+        raise errors.RecipeParseError(
+            'Unable to import module {0:s}: {1!s}'.format(
+                module_name, exception))
       if not module_class:
         raise errors.RecipeParseError(
             'Recipe uses unknown module: {0:s}'.format(module_name))
 
       self._module_pool[module_name] = module_class(self)
 
-  def AddToCache(self, name, value):
+  def AddToCache(self, name, value, ttl=None):
     """Thread-safe method to add data to the state's cache.
 
     If the cached item is already in the cache it will be
@@ -104,9 +412,16 @@ class DFTimewolfState(object):
     Args:
       name (str): string with the name of the cache variable.
       value (object): the value that will be stored in the cache.
+      ttl (Optional[float]): number of seconds after which the item expires.
+          Items that expire are not saved in checkpoints. Items never expire
+          if not set.
     """
     with self._state_lock:
       self._cache[name] = value
+      if ttl is None:
+        self._cache_expiry_times.pop(name, None)
+      else:
+        self._cache_expiry_times[name] = time.time() + ttl
 
   def GetFromCache(self, name, default_value=None):
     """Thread-safe method to get data from the state's cache.
@@ -120,19 +435,29 @@ class DFTimewolfState(object):
     Returns:
       object: object from the cache that corresponds to the name, or
           the value of "default_value" if the cach does not contain
-          the variable.
+          the variable or if it expired.
     """
     with self._state_lock:
+      expiry_time = self._cache_expiry_times.get(name)
+      if expiry_time is not None and expiry_time <= time.time():
+        del self._cache[name]
+        del self._cache_expiry_times[name]
       return self._cache.get(name, default_value)
 
   def StoreContainer(self, container):
     """Thread-safe method to store data in the state's store.
 
+    In streaming mode, the container is also streamed to the registered
+    callbacks, which may block if their queues are full.
+
     Args:
       container (AttributeContainer): data to store.
     """
-    with self._state_lock:
-      self.store.setdefault(container.CONTAINER_TYPE, []).append(container)
+    self.store.AddContainer(container)
+    self._CountContainers(produced=1)
+
+    if self.streaming:
+      self.StreamContainer(container)
 
   def GetContainers(self, container_class, pop=False):
     """Thread-safe method to retrieve data from the state's store.
@@ -143,14 +468,35 @@ class DFTimewolfState(object):
           they are retrieved.
 
     Returns:
-      list[AttributeContainer]: attribute container objects provided in
-          the store that correspond to the container type.
+      Sequence[AttributeContainer]: immutable snapshot of the attribute
+          container objects provided in the store that correspond to the
+          container type.
     """
-    with self._state_lock:
-      containers = self.store.get(container_class.CONTAINER_TYPE, [])
-      if pop:
-        self.store[container_class.CONTAINER_TYPE] = []
-      return containers
+    containers = self.store.GetContainers(
+        container_class.CONTAINER_TYPE, pop=pop)
+    self._CountContainers(consumed=len(containers))
+    return containers
+
+  def GetContainersByAttribute(self, container_class, attribute_name, value):
+    """Thread-safe method to look up containers by attribute value.
+
+    The first lookup on an attribute indexes the stored containers; later
+    lookups on the same attribute do not scan them.
+
+    Args:
+      container_class (type): AttributeContainer class used to filter data.
+      attribute_name (str): name of the attribute to look up, such as "name".
+      value (object): hashable value the attribute must have.
+
+    Returns:
+      Sequence[AttributeContainer]: immutable snapshot of the attribute
+          container objects that correspond to the container type and have
+          the attribute value.
+    """
+    containers = self.store.GetContainersByAttribute(
+        container_class.CONTAINER_TYPE, attribute_name, value)
+    self._CountContainers(consumed=len(containers))
+    return containers
 
   def _SetupModuleThread(self, module_definition):
     """Calls the module's SetUp() function and sets a threading event for it.
@@ -161,6 +507,12 @@ class DFTimewolfState(object):
       module_definition (dict[str, str]): recipe module definition.
     """
     module_name = module_definition['name']
+    if module_name in self._completed_modules:
+      logger.info('Skipping setup of completed module: {0:s}'.format(
+          module_name))
+      self._threading_event_per_module[module_name] = threading.Event()
+      return
+
     logger.info('Setting up module: {0:s}'.format(module_name))
     new_args = utils.ImportArgsFromDict(
         module_definition['args'], self.command_line_options, self.config)
@@ -192,7 +544,9 @@ class DFTimewolfState(object):
     account when replacing recipe parameters for each module.
     """
     # Note that vars() copies the values of argparse.Namespace to a dict.
-    self._InvokeModulesInThreads(self._SetupModuleThread)
+    self._InvokeModulesInThreads(self._SetupModuleThread, PHASE_SETUP)
+    self._WriteReports()
+    self.CheckErrors(is_global=True)
 
   def _RunModuleThread(self, module_definition):
     """Runs the module's Process() function.
@@ -200,15 +554,20 @@ class DFTimewolfState(object):
     Callback for _InvokeModulesInThreads.
 
     Waits for any blockers to have finished before running Process(), then
-    sets an Event flag declaring the module has completed.
+    sets an Event flag declaring the module has completed. When run by the
+    scheduler, blockers have always finished by the time this is called.
 
     Args:
       module_definition (str): module definition.
     """
     module_name = module_definition['name']
 
-    for dependency in module_definition['wants']:
-      self._threading_event_per_module[dependency].wait()
+    wait_start_time = time.time()
+    with self.tracer.Span('Wait for wanted modules'):
+      for dependency in module_definition['wants']:
+        self._threading_event_per_module[dependency].wait()
+    self.metrics.AddBlockedTime(
+        module_name, PHASE_PROCESS, time.time() - wait_start_time)
 
     module = self._module_pool[module_name]
 
@@ -217,14 +576,35 @@ class DFTimewolfState(object):
       logger.critical(
           'Aborting execution of {0:s} due to previous errors'.format(
               module.name))
+      self._EndStreams(module_name)
       self._threading_event_per_module[module_name].set()
       self.CleanUp()
       return
 
+    if module_name in self._completed_modules:
+      logger.info(
+          'Module {0:s} completed in a previous run, skipping'.format(
+              module_name))
+      self._EndStreams(module_name)
+      self._threading_event_per_module[module_name].set()
+      return
+
+    # Let the module's callbacks drain what was streamed to them before
+    # processing.
+    wait_start_time = time.time()
+    with self.tracer.Span('Wait for streams'):
+      self._WaitForStreams(module_name)
+    self.metrics.AddBlockedTime(
+        module_name, PHASE_PROCESS, time.time() - wait_start_time)
+
     logger.info('Running module: {0:s}'.format(module_name))
+    with self._checkpoint_lock:
+      self._running_modules.add(module_name)
 
+    completed = False
     try:
       module.Process()
+      completed = True
     except errors.DFTimewolfError as exception:
       logger.critical(
           "Critical error in module {0:s}, aborting execution".format(
@@ -241,11 +621,181 @@ class DFTimewolfState(object):
       self.AddError(error)
 
     logger.info('Module {0:s} finished execution'.format(module_name))
+    self._ModuleCompleted(module_name, completed)
+    self._EndStreams(module_name)
     self._threading_event_per_module[module_name].set()
     self.CleanUp()
 
+  def _ModuleCompleted(self, module_name, completed):
+    """Records that a module's Process() returned and saves a checkpoint.
+
+    A checkpoint is only saved when no other module is running, so that it
+    never contains part of the output of a module that is not completed.
+    Once a module has failed, the containers it stored before failing remain
+    in the store, so no further checkpoint is saved: resuming from the last
+    one re-runs the failed module without duplicating its output.
+
+    Args:
+      module_name (str): name of the module.
+      completed (bool): True if the module's Process() did not fail.
+    """
+    with self._checkpoint_lock:
+      self._running_modules.discard(module_name)
+      if not completed or self._abort_execution:
+        self._checkpoint_disabled = True
+      else:
+        self._completed_modules.add(module_name)
+      if (self.run_directory and not self._running_modules and
+          not self._checkpoint_disabled):
+        self._SaveCheckpoint()
+
+  def _SaveCheckpoint(self):
+    """Saves the containers, cache and completed modules to disk.
+
+    Must be called with the checkpoint lock held. Cache entries that expire,
+    and containers and cache entries that cannot be serialized, are not saved.
+    Containers spilled to disk are saved by copying the store's SQLite file,
+    rather than being read into memory.
+    """
+    if not os.path.isdir(self.run_directory):
+      os.makedirs(self.run_directory)
+    checkpoint_path = os.path.join(self.run_directory, CHECKPOINT_FILENAME)
+    containers_path = os.path.join(
+        self.run_directory, CHECKPOINT_CONTAINERS_FILENAME)
+
+    # Spilled rows are only ever appended, so the copy remains valid for the
+    # previous checkpoint until it is replaced.
+    temporary_containers_path = '{0:s}.tmp'.format(containers_path)
+    spilled_types = self.store.BackUp(temporary_containers_path)
+    if spilled_types:
+      os.replace(temporary_containers_path, containers_path)
+
+    checkpoint = {
+        'cache': {},
+        'command_line_options': self.command_line_options,
+        'completed_modules': sorted(self._completed_modules),
+        'containers': [],
+        'recipe': self.recipe,
+        'spilled_containers': spilled_types}
+
+    with self._state_lock:
+      cache = {
+          name: value for name, value in self._cache.items()
+          if name not in self._cache_expiry_times}
+    for name, value in cache.items():
+      try:
+        pickle.dumps(value)
+      except Exception as exception:  # pylint: disable=broad-except
+        logger.warning(
+            'Cache entry {0:s} not saved in checkpoint: {1!s}'.format(
+                name, exception))
+        continue
+      checkpoint['cache'][name] = value
+
+    for container_type in self.store.GetContainerTypes():
+      if container_type in spilled_types:
+        continue
+      for container in self.store.GetContainers(container_type):
+        serialized_container = container_store.SerializeContainer(container)
+        try:
+          pickle.dumps(serialized_container)
+        except Exception as exception:  # pylint: disable=broad-except
+          logger.warning((
+              'Container of type {0:s} not saved in checkpoint: '
+              '{1!s}').format(container_type, exception))
+          continue
+        checkpoint['containers'].append(serialized_container)
+
+    temporary_path = '{0:s}.tmp'.format(checkpoint_path)
+    with open(temporary_path, 'wb') as file_object:
+      pickle.dump(checkpoint, file_object, protocol=pickle.HIGHEST_PROTOCOL)
+    # Replacing the file is atomic, so an interrupted save never leaves a
+    # truncated checkpoint behind.
+    os.replace(temporary_path, checkpoint_path)
+    logger.info('Checkpoint saved to {0:s} ({1:d} completed modules)'.format(
+        checkpoint_path, len(self._completed_modules)))
+
+  def _RestoreSpilledContainers(self, path, spilled_types):
+    """Restores the containers spilled to disk by a previous run.
+
+    Args:
+      path (str): path of the copy of the spilled containers.
+      spilled_types (dict[str, object]): per spilled container type, the
+          information needed to restore its containers from the copy.
+
+    Raises:
+      CheckpointError: if the copy cannot be read.
+    """
+    if isinstance(self.store, sqlite_store.SQLiteContainerStore):
+      restored_store = self.store
+    else:
+      # The containers are read from the copy into the configured store.
+      restored_store = sqlite_store.SQLiteContainerStore()
+    try:
+      restored_store.Restore(path, spilled_types)
+      if restored_store is not self.store:
+        for container_type in spilled_types:
+          for container in restored_store.GetContainers(container_type):
+            self.store.AddContainer(container)
+    except (IOError, OSError, sqlite3.Error) as exception:
+      raise errors.CheckpointError(
+          'Unable to read checkpoint containers {0:s}: {1!s}'.format(
+              path, exception))
+    finally:
+      if restored_store is not self.store:
+        restored_store.Close()
+
+  def LoadCheckpoint(self, run_directory):
+    """Restores the state saved by a previous run.
+
+    Restores the recipe, command line options, containers, cache and
+    completed modules. Completed modules are neither set up nor run again,
+    and preflights are skipped. Further checkpoints are saved to the same
+    directory.
+
+    Args:
+      run_directory (str): directory of the previous run.
+
+    Raises:
+      CheckpointError: if the checkpoint cannot be read.
+    """
+    checkpoint_path = os.path.join(run_directory, CHECKPOINT_FILENAME)
+    try:
+      with open(checkpoint_path, 'rb') as file_object:
+        checkpoint = pickle.load(file_object)
+    except (IOError, OSError, EOFError, pickle.UnpicklingError) as exception:
+      raise errors.CheckpointError(
+          'Unable to read checkpoint {0:s}: {1!s}'.format(
+              checkpoint_path, exception))
+
+    self.command_line_options = checkpoint['command_line_options']
+    for name, value in checkpoint['cache'].items():
+      self.AddToCache(name, value)
+    spilled_types = checkpoint.get('spilled_containers')
+    if spilled_types:
+      self._RestoreSpilledContainers(
+          os.path.join(run_directory, CHECKPOINT_CONTAINERS_FILENAME),
+          spilled_types)
+    for class_path, attributes in checkpoint['containers']:
+      self.store.AddContainer(
+          container_store.DeserializeContainer(class_path, attributes))
+    self._completed_modules = set(checkpoint['completed_modules'])
+    self._resumed = True
+    self.run_directory = run_directory
+    self.LoadRecipe(checkpoint['recipe'])
+    logger.info('Resuming {0:s}, completed modules: {1:s}'.format(
+        self.recipe['name'], ', '.join(sorted(self._completed_modules))))
+
   def RunPreflights(self):
-    """Runs preflight modules."""
+    """Runs preflight modules.
+
+    Preflights are not run again when resuming from a checkpoint, since their
+    output was saved in it.
+    """
+    if self._resumed:
+      logger.info('Resuming from a checkpoint, skipping preflights')
+      return
+
     for preflight_definition in self.recipe.get('preflights', []):
       preflight_name = preflight_definition['name']
       args = preflight_definition.get('args', {})
@@ -253,10 +803,17 @@ class DFTimewolfState(object):
       new_args = utils.ImportArgsFromDict(
           args, self.command_line_options, self.config)
       preflight = self._module_pool[preflight_name]
+      token = CURRENT_MODULE.set((preflight_name, PHASE_SETUP))
       try:
-        preflight.SetUp(**new_args)
-        preflight.Process()
+        with self.tracer.Span(preflight_name, category=PHASE_SETUP):
+          with self.metrics.Measure(preflight_name, PHASE_SETUP):
+            preflight.SetUp(**new_args)
+        CURRENT_MODULE.set((preflight_name, PHASE_PROCESS))
+        with self.tracer.Span(preflight_name, category=PHASE_PROCESS):
+          with self.metrics.Measure(preflight_name, PHASE_PROCESS):
+            preflight.Process()
       finally:
+        CURRENT_MODULE.reset(token)
         self.CheckErrors(is_global=True)
 
   def InstantiateModule(self, module_name):
@@ -273,8 +830,114 @@ class DFTimewolfState(object):
     return module_class(self)
 
   def RunModules(self):
-    """Performs the actual processing for each module in the module pool."""
-    self._InvokeModulesInThreads(self._RunModuleThread)
+    """Performs the actual processing for each module in the module pool.
+
+    The container store is closed at the end of the run, which removes the
+    containers spilled to a temporary file.
+    """
+    try:
+      self._InvokeModulesInThreads(
+          self._RunModuleThread, PHASE_PROCESS, respect_wants=True)
+      self._CloseStreams()
+      self._WriteReports()
+      self.CheckErrors(is_global=True)
+    finally:
+      self.store.Close()
+
+  def _WriteReports(self):
+    """Writes the module metrics and the trace."""
+    self.WriteMetrics()
+    self.WriteTrace()
+
+  def WriteMetrics(self):
+    """Writes the module metrics to the configured reports.
+
+    The JSON report is written to the "metrics_file" configuration parameter,
+    or to the run directory if it is not set. The Prometheus textfile is only
+    written if "metrics_prometheus_textfile" is set.
+    """
+    recipe_name = self.recipe['name'] if self.recipe else ''
+    metrics_file = self.metrics_file
+    if not metrics_file and self.run_directory:
+      metrics_file = os.path.join(self.run_directory, METRICS_FILENAME)
+
+    try:
+      if metrics_file:
+        self.metrics.WriteJSON(metrics_file, recipe_name)
+        logger.info('Module metrics written to {0:s}'.format(metrics_file))
+      if self.metrics_prometheus_textfile:
+        self.metrics.WritePrometheusTextfile(
+            self.metrics_prometheus_textfile, recipe_name)
+    except (IOError, OSError) as exception:
+      logger.warning('Unable to write module metrics: {0!s}'.format(exception))
+
+  def WriteTrace(self):
+    """Writes the spans to a Chrome trace event file.
+
+    The trace is written to the "trace_file" configuration parameter, or to
+    the run directory if it is not set.
+    """
+    trace_file = self.trace_file
+    if not trace_file and self.run_directory:
+      trace_file = os.path.join(self.run_directory, TRACE_FILENAME)
+    if not trace_file:
+      return
+
+    try:
+      self.tracer.Write(trace_file)
+      logger.info('Trace written to {0:s}'.format(trace_file))
+    except (IOError, OSError) as exception:
+      logger.warning('Unable to write trace: {0!s}'.format(exception))
+
+  def _CloseStreams(self):
+    """Closes all the stream consumers and waits for them to finish."""
+    for consumers in self.stream_consumers.values():
+      for consumer in consumers:
+        consumer.Close()
+        consumer.Join()
+
+  def _EndStreams(self, module_name):
+    """Signals stream consumers that a module has finished producing.
+
+    Args:
+      module_name (str): name of the module that finished.
+    """
+    for consumers in self.stream_consumers.values():
+      for consumer in consumers:
+        consumer.EndOfStream(module_name)
+
+  def _WaitForStreams(self, module_name):
+    """Waits for the stream consumers registered by a module to finish.
+
+    Args:
+      module_name (str): name of the module.
+    """
+    for consumers in self.stream_consumers.values():
+      for consumer in consumers:
+        if consumer.module_name == module_name:
+          consumer.Join()
+
+  def _StreamingCallbackError(self, consumer, exception):
+    """Reports an exception raised by a streaming callback.
+
+    Args:
+      consumer (streaming.StreamConsumer): consumer whose callback failed.
+      exception (Exception): exception raised by the callback.
+    """
+    name = consumer.module_name or 'state'
+    if isinstance(exception, errors.DFTimewolfError):
+      # Module errors have already been added to the state.
+      logger.critical('Critical error in streaming callback of {0:s}'.format(
+          name))
+      return
+
+    msg = ('An unknown error occurred in streaming callback of {0:s}: '
+           '{1!s}').format(name, exception)
+    logger.critical(msg)
+    error = errors.DFTimewolfError(
+        message=msg, name=name, stacktrace=traceback.format_exc(),
+        critical=True, unexpected=True)
+    self.AddError(error)
 
   def RegisterStreamingCallback(self, target, container_type):
     """Registers a callback for a type of container.
@@ -282,11 +945,40 @@ class DFTimewolfState(object):
     The function to be registered should a single parameter of type
     interface.AttributeContainer.
 
+    In streaming mode, the callback is fed from its own bounded queue by a
+    dedicated thread. If the callback is a method of a module in the recipe,
+    its stream ends once all the modules it wants have finished, and the
+    module's Process() is only called after the stream has been drained.
+    Otherwise, the stream ends once all the modules have finished.
+
     Args:
       target (function): function to be called.
       container_type (type[interface.AttributeContainer]): container type on
           which the callback will be called.
     """
+    if self.streaming:
+      module_definitions = (self.recipe or {}).get('modules', [])
+      module_name = None
+      producers = [definition['name'] for definition in module_definitions]
+      owner = getattr(target, '__self__', None)
+      if isinstance(owner, dftw_module.BaseModule):
+        for module_definition in module_definitions:
+          if module_definition['name'] == owner.name:
+            module_name = owner.name
+            producers = module_definition.get('wants', [])
+
+      consumer = streaming.StreamConsumer(
+          target, container_type, producers, module_name=module_name,
+          queue_size=self.stream_queue_size,
+          error_callback=self._StreamingCallbackError)
+      context = contextvars.copy_context()
+      if module_name:
+        context.run(CURRENT_MODULE.set, (module_name, PHASE_PROCESS))
+      consumer.Start(context=context)
+      with self._state_lock:
+        self.stream_consumers.setdefault(container_type, []).append(consumer)
+      return
+
     if container_type not in self.streaming_callbacks:
       self.streaming_callbacks[container_type] = []
     self.streaming_callbacks[container_type].append(target)
@@ -294,10 +986,18 @@ class DFTimewolfState(object):
   def StreamContainer(self, container):
     """Streams a container to the callbacks that are registered to handle it.
 
+    In streaming mode, the container is queued for each registered callback
+    instead, blocking while a callback's queue is full.
+
     Args:
       container (interface.AttributeContainer): container instance that will be
           streamed to any registered callbacks.
     """
+    if self.streaming:
+      for consumer in self.stream_consumers.get(type(container), []):
+        consumer.Put(container)
+      return
+
     for callback in self.streaming_callbacks.get(type(container), []):
       callback(container)
 
@@ -307,9 +1007,23 @@ class DFTimewolfState(object):
     Args:
       error (errors.DFTimewolfError): The dfTimewolf error to add.
     """
-    if error.critical:
-      self._abort_execution = True
-    self.errors.append(error)
+    with self._state_lock:
+      if error.critical:
+        self._abort_execution = True
+      self.errors.append(error)
+
+  def HasError(self, error):
+    """Determines if an error was added to the state.
+
+    Args:
+      error (errors.DFTimewolfError): dfTimewolf error.
+
+    Returns:
+      bool: True if the error was added to the state, including if it was
+          since moved to the global errors.
+    """
+    with self._state_lock:
+      return error in self.errors or error in self.global_errors
 
   def CleanUp(self):
     """Cleans up after running a module.
@@ -319,8 +1033,9 @@ class DFTimewolfState(object):
     later stage.
     """
     # Move any existing errors to global errors
-    self.global_errors.extend(self.errors)
-    self.errors = []
+    with self._state_lock:
+      self.global_errors.extend(self.errors)
+      self.errors = []
 
   def CheckErrors(self, is_global=False):
     """Checks for errors and exits if any of them are critical.
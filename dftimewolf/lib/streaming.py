@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""Bounded producer/consumer queues used to stream containers between modules.
+
+In streaming mode, every callback registered with
+DFTimewolfState.RegisterStreamingCallback gets its own StreamConsumer. Stored
+containers are put in the consumer's bounded queue, and a dedicated thread
+feeds them to the callback while upstream modules are still running. A full
+queue blocks the producing module until the consumer catches up.
+"""
+
+import queue
+import threading
+
+DEFAULT_QUEUE_SIZE = 100
+
+
+class EndOfStream(object):
+  """Marker put in a consumer's queue once a producing module has finished.
+
+  Attributes:
+    producer (str): name of the module that finished, or None if the stream
+        should be closed regardless of pending producers.
+  """
+
+  def __init__(self, producer=None):
+    """Initializes an end-of-stream marker.
+
+    Args:
+      producer (Optional[str]): name of the module that finished.
+    """
+    super(EndOfStream, self).__init__()
+    self.producer = producer
+
+
+class StreamConsumer(object):
+  """Feeds streamed containers to a callback from a dedicated thread.
+
+  Attributes:
+    callback (function): function called with each streamed container.
+    container_type (type[interface.AttributeContainer]): type of the
+        containers the callback consumes.
+    module_name (str): name of the module that registered the callback, or
+        None if it was not registered by a module.
+    producers (frozenset[str]): names of the modules whose end of stream is
+        awaited before the consumer completes.
+  """
+
+  # Interval at which a blocked producer checks if the consumer is done.
+  _PUT_TIMEOUT_SEC = 1
+
+  def __init__(
+      self, callback, container_type, producers, module_name=None,
+      queue_size=DEFAULT_QUEUE_SIZE, error_callback=None):
+    """Initializes a stream consumer.
+
+    Args:
+      callback (function): function called with each streamed container.
+      container_type (type[interface.AttributeContainer]): type of the
+          containers the callback consumes.
+      producers (iterable[str]): names of the modules whose end of stream is
+          awaited before the consumer completes.
+      module_name (Optional[str]): name of the module that registered the
+          callback.
+      queue_size (Optional[int]): maximum number of containers waiting to be
+          consumed before producers are blocked.
+      error_callback (Optional[function]): function called with the exception
+          if the callback raises one.
+    """
+    super(StreamConsumer, self).__init__()
+    self.callback = callback
+    self.container_type = container_type
+    self.module_name = module_name
+    self.producers = frozenset(producers)
+    self._done = threading.Event()
+    self._error_callback = error_callback
+    self._pending_producers = set(self.producers)
+    self._queue = queue.Queue(maxsize=queue_size)
+    self._thread = None
+
+  def _Put(self, item):
+    """Puts an item in the queue, blocking while the queue is full.
+
+    Args:
+      item (object): container or end-of-stream marker.
+
+    Returns:
+      bool: True if the item was queued, False if the consumer is done.
+    """
+    while not self._done.is_set():
+      try:
+        self._queue.put(item, timeout=self._PUT_TIMEOUT_SEC)
+        return True
+      except queue.Full:
+        continue
+    return False
+
+  def _Run(self):
+    """Consumes the queue until all producers have ended their stream."""
+    while True:
+      item = self._queue.get()
+      if isinstance(item, EndOfStream):
+        if item.producer is None:
+          break
+        self._pending_producers.discard(item.producer)
+        if not self._pending_producers:
+          break
+        continue
+
+      try:
+        self.callback(item)
+      except Exception as exception:  # pylint: disable=broad-except
+        # Keep consuming so that producers are never blocked forever.
+        if self._error_callback:
+          self._error_callback(self, exception)
+
+    self._done.set()
+
+  def Close(self):
+    """Ends the stream, regardless of which producers have finished."""
+    self._Put(EndOfStream())
+
+  def EndOfStream(self, producer):
+    """Signals that a module will not produce any more containers.
+
+    Args:
+      producer (str): name of the module that finished.
+    """
+    if producer in self.producers:
+      self._Put(EndOfStream(producer=producer))
+
+  def IsDone(self):
+    """Checks if the consumer has processed its whole stream.
+
+    Returns:
+      bool: True if the consumer is done.
+    """
+    return self._done.is_set()
+
+  def Join(self):
+    """Waits until the consumer has processed its whole stream."""
+    self._done.wait()
+
+  def Put(self, container):
+    """Queues a container for the callback.
+
+    Blocks while the consumer's queue is full.
+
+    Args:
+      container (interface.AttributeContainer): container to stream.
+
+    Returns:
+      bool: True if the container was queued, False if the consumer is done.
+    """
+    return self._Put(container)
+
+  def Start(self, context=None):
+    """Starts the consumer thread.
+
+    Args:
+      context (Optional[contextvars.Context]): context the consumer thread
+          runs in, such as a copy of the context of the module that
+          registered the callback.
+    """
+    if not self.producers:
+      self._done.set()
+      return
+
+    if context:
+      self._thread = threading.Thread(target=context.run, args=(self._Run,))
+    else:
+      self._thread = threading.Thread(target=self._Run)
+    self._thread.daemon = True
+    self._thread.start()
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""Spans of recipe execution, exported in the Chrome trace event format.
+
+Trace files can be loaded in Perfetto (https://ui.perfetto.dev) or
+chrome://tracing. Spans recorded by the same thread are nested by time.
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+
+DEFAULT_CATEGORY = 'dftimewolf'
+
+
+class _Span(object):
+  """Context manager recording a complete ("X") trace event."""
+
+  def __init__(self, tracer, name, category, args):
+    """Initializes a span.
+
+    Args:
+      tracer (Tracer): tracer the span is recorded by.
+      name (str): name of the span.
+      category (str): category of the span, such as "grr".
+      args (dict[str, object]): values shown with the span.
+    """
+    super(_Span, self).__init__()
+    self._args = args
+    self._category = category
+    self._name = name
+    self._start_time = None
+    self._tracer = tracer
+
+  def __enter__(self):
+    """Starts the span."""
+    self._start_time = time.perf_counter()
+    return self
+
+  def __exit__(self, exception_type, value, traceback):
+    """Ends the span and records it."""
+    end_time = time.perf_counter()
+    if exception_type:
+      self._args['error'] = exception_type.__name__
+    self._tracer.AddCompleteEvent(
+        self._name, self._category, self._start_time, end_time, self._args)
+
+
+class Tracer(object):
+  """Thread-safe recorder of execution spans."""
+
+  def __init__(self):
+    """Initializes a tracer."""
+    super(Tracer, self).__init__()
+    self._events = []
+    self._lock = threading.Lock()
+    self._origin = time.perf_counter()
+    self._thread_names = {}
+
+  def AddCompleteEvent(self, name, category, start_time, end_time, args):
+    """Records a span that has ended in the calling thread.
+
+    Args:
+      name (str): name of the span.
+      category (str): category of the span.
+      start_time (float): performance counter value when the span started.
+      end_time (float): performance counter value when the span ended.
+      args (dict[str, object]): values shown with the span.
+    """
+    thread = threading.current_thread()
+    event = {
+        'args': {key: str(value) for key, value in args.items()},
+        'cat': category,
+        'dur': (end_time - start_time) * 1000000,
+        'name': name,
+        'ph': 'X',
+        'pid': os.getpid(),
+        'tid': thread.ident,
+        'ts': (start_time - self._origin) * 1000000}
+    with self._lock:
+      self._events.append(event)
+      self._thread_names[thread.ident] = thread.name
+
+  def GetEvents(self):
+    """Retrieves the recorded trace events.
+
+    Returns:
+      list[dict[str, object]]: trace events, preceded by metadata events
+          naming the threads.
+    """
+    with self._lock:
+      thread_names = dict(self._thread_names)
+      events = list(self._events)
+
+    metadata_events = []
+    for thread_identifier, thread_name in sorted(thread_names.items()):
+      metadata_events.append({
+          'args': {'name': thread_name},
+          'name': 'thread_name',
+          'ph': 'M',
+          'pid': os.getpid(),
+          'tid': thread_identifier})
+    return metadata_events + events
+
+  def Span(self, name, category=DEFAULT_CATEGORY, **kwargs):
+    """Creates a span, to be used as a context manager.
+
+    Args:
+      name (str): name of the span.
+      category (Optional[str]): category of the span, such as "grr".
+      kwargs (dict[str, object]): values shown with the span.
+
+    Returns:
+      _Span: span, recorded when the context is exited.
+    """
+    return _Span(self, name, category, kwargs)
+
+  def Write(self, path):
+    """Writes the trace events to a Chrome trace event JSON file.
+
+    Args:
+      path (str): path of the trace file.
+    """
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+      os.makedirs(directory)
+    trace = {'displayTimeUnit': 'ms', 'traceEvents': self.GetEvents()}
+    with open(path, 'w') as file_object:
+      json.dump(trace, file_object)
+
+
+def TraceMethod(category=DEFAULT_CATEGORY):
+  """Decorates a module method so that each call is recorded as a span.
+
+  The span is recorded by the tracer of the module's state and named after
+  the method's qualified name, such as "GRRFlow._AwaitFlow".
+
+  Args:
+    category (Optional[str]): category of the span, such as "grr".
+
+  Returns:
+    function: decorator.
+  """
+  def _Decorator(method):
+    """Wraps a module method in a span."""
+    @functools.wraps(method)
+    def _Wrapper(self, *args, **kwargs):
+      """Calls the method in a span."""
+      with self.state.tracer.Span(method.__qualname__, category=category):
+        return method(self, *args, **kwargs)
+    return _Wrapper
+  return _Decorator
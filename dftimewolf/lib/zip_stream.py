@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""Extraction of ZIP archives from a stream of bytes, as they are received.
+
+ZIP archives are normally read from their central directory, at the end of the
+archive, which requires the whole archive to be written to disk first. Archives
+generated on the fly, such as GRR flow archives, also describe every entry in
+a local header that precedes its data, which is enough to extract the entries
+one after the other from a stream.
+
+Deflated entries are supported whether or not their sizes are known before
+their data. Stored entries are only supported if their sizes are in their
+local header, since the end of their data cannot be determined otherwise.
+"""
+
+import os
+import struct
+import zipfile
+import zlib
+
+_LOCAL_FILE_HEADER_SIGNATURE = b'PK\x03\x04'
+_DATA_DESCRIPTOR_SIGNATURE = b'PK\x07\x08'
+# Records following the entries, which end the extraction.
+_END_SIGNATURES = frozenset([
+    b'PK\x01\x02',  # Central directory file header.
+    b'PK\x05\x05',  # Digital signature.
+    b'PK\x05\x06',  # End of central directory record.
+    b'PK\x06\x06',  # ZIP64 end of central directory record.
+    b'PK\x06\x07'])  # ZIP64 end of central directory locator.
+
+# Signature, version, flags, compression method, modification time and date,
+# CRC-32, compressed and uncompressed sizes, file name and extra field lengths.
+_LOCAL_FILE_HEADER = struct.Struct('<4sHHHHHIIIHH')
+
+_FLAG_ENCRYPTED = 0x0001
+_FLAG_DATA_DESCRIPTOR = 0x0008
+_FLAG_UTF8 = 0x0800
+
+_ZIP64_EXTRA_FIELD_IDENTIFIER = 0x0001
+_ZIP64_SIZE_MARKER = 0xffffffff
+
+_READ_SIZE = 1024 * 1024
+
+
+class _ChunkReader(object):
+  """Reads bytes from an iterable of chunks of bytes."""
+
+  def __init__(self, chunks):
+    """Initializes a chunk reader.
+
+    Args:
+      chunks (iterable[bytes]): chunks of bytes.
+    """
+    super(_ChunkReader, self).__init__()
+    self._buffer = b''
+    self._chunks = iter(chunks)
+
+  def _Fill(self, size):
+    """Buffers chunks until the buffer holds a given number of bytes.
+
+    Args:
+      size (int): number of bytes needed.
+
+    Returns:
+      bool: True if the buffer holds the number of bytes needed, False if the
+          chunks ran out first.
+    """
+    chunks = [self._buffer]
+    buffered_size = len(self._buffer)
+    while buffered_size < size:
+      chunk = next(self._chunks, None)
+      if chunk is None:
+        break
+      chunks.append(chunk)
+      buffered_size += len(chunk)
+    self._buffer = b''.join(chunks)
+    return buffered_size >= size
+
+  def Read(self, size):
+    """Reads a given number of bytes.
+
+    Args:
+      size (int): number of bytes to read.
+
+    Returns:
+      bytes: bytes read.
+
+    Raises:
+      zipfile.BadZipFile: if the chunks ran out first.
+    """
+    if not self._Fill(size):
+      raise zipfile.BadZipFile('Truncated ZIP archive')
+    data, self._buffer = self._buffer[:size], self._buffer[size:]
+    return data
+
+  def ReadAvailable(self, maximum_size):
+    """Reads the buffered bytes, or the next chunk if none is buffered.
+
+    Args:
+      maximum_size (int): maximum number of bytes to read.
+
+    Returns:
+      bytes: bytes read, or an empty byte string if the chunks ran out.
+    """
+    self._Fill(1)
+    data = self._buffer[:maximum_size]
+    self._buffer = self._buffer[maximum_size:]
+    return data
+
+  def Peek(self, size):
+    """Reads bytes without consuming them.
+
+    Args:
+      size (int): number of bytes to read.
+
+    Returns:
+      bytes: bytes read, fewer than requested if the chunks ran out.
+    """
+    self._Fill(size)
+    return self._buffer[:size]
+
+  def Unread(self, data):
+    """Puts bytes back, to be read again.
+
+    Args:
+      data (bytes): bytes to put back.
+    """
+    self._buffer = data + self._buffer
+
+
+def GetOutputPath(output_directory, name):
+  """Determines where to extract an entry, keeping it in the directory.
+
+  Args:
+    output_directory (str): directory to extract the entries to.
+    name (str): name of the entry in the archive.
+
+  Returns:
+    str: path to extract the entry to, or None if the name has no usable
+        path segment.
+  """
+  segments = [
+      segment for segment in name.replace('\\', '/').split('/')
+      if segment not in ('', '.', '..')]
+  if not segments:
+    return None
+  return os.path.join(output_directory, *segments)
+
+
+def _ReadZip64Sizes(extra_field, compressed_size, uncompressed_size):
+  """Reads the sizes of an entry from its ZIP64 extra field, if needed.
+
+  Args:
+    extra_field (bytes): extra field of the local header.
+    compressed_size (int): compressed size from the local header.
+    uncompressed_size (int): uncompressed size from the local header.
+
+  Returns:
+    tuple[bool, int, int]: whether the entry has a ZIP64 extra field, and the
+        compressed and uncompressed sizes.
+  """
+  offset = 0
+  while offset + 4 <= len(extra_field):
+    identifier, size = struct.unpack_from('<HH', extra_field, offset)
+    offset += 4
+    if identifier == _ZIP64_EXTRA_FIELD_IDENTIFIER:
+      data = extra_field[offset:offset + size]
+      # The ZIP64 extra field only holds the sizes that did not fit, the
+      # uncompressed size first.
+      if uncompressed_size == _ZIP64_SIZE_MARKER and len(data) >= 8:
+        uncompressed_size, = struct.unpack_from('<Q', data)
+        data = data[8:]
+      if compressed_size == _ZIP64_SIZE_MARKER and len(data) >= 8:
+        compressed_size, = struct.unpack_from('<Q', data)
+      return True, compressed_size, uncompressed_size
+    offset += size
+  return False, compressed_size, uncompressed_size
+
+
+def _CopyStoredData(reader, output_file, size):
+  """Copies the data of a stored entry.
+
+  Args:
+    reader (_ChunkReader): reader positioned at the data of the entry.
+    output_file (file): file the data is written to.
+    size (int): size of the data.
+
+  Returns:
+    int: CRC-32 of the data.
+  """
+  crc = 0
+  while size:
+    data = reader.Read(min(size, _READ_SIZE))
+    crc = zlib.crc32(data, crc)
+    output_file.write(data)
+    size -= len(data)
+  return crc
+
+
+def _CopyDeflatedData(reader, output_file):
+  """Decompresses the data of a deflated entry.
+
+  The end of the data is determined by the end of the deflate stream, so the
+  compressed size of the entry does not need to be known.
+
+  Args:
+    reader (_ChunkReader): reader positioned at the data of the entry.
+    output_file (file): file the decompressed data is written to.
+
+  Returns:
+    int: CRC-32 of the decompressed data.
+
+  Raises:
+    zipfile.BadZipFile: if the data is truncated or corrupted.
+  """
+  decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+  crc = 0
+  while not decompressor.eof:
+    data = reader.ReadAvailable(_READ_SIZE)
+    if not data:
+      raise zipfile.BadZipFile('Truncated ZIP archive')
+    try:
+      data = decompressor.decompress(data)
+    except zlib.error as exception:
+      raise zipfile.BadZipFile(
+          'Corrupted deflate stream: {0!s}'.format(exception))
+    crc = zlib.crc32(data, crc)
+    output_file.write(data)
+  reader.Unread(decompressor.unused_data)
+  return crc
+
+
+def _ReadDataDescriptor(reader, is_zip64):
+  """Reads the data descriptor following the data of an entry.
+
+  Args:
+    reader (_ChunkReader): reader positioned after the data of the entry.
+    is_zip64 (bool): True if the sizes in the descriptor are 8 bytes long.
+
+  Returns:
+    int: CRC-32 from the data descriptor.
+  """
+  # The signature of data descriptors is optional.
+  if reader.Peek(4) == _DATA_DESCRIPTOR_SIGNATURE:
+    reader.Read(4)
+  crc, = struct.unpack('<I', reader.Read(4))
+  reader.Read(16 if is_zip64 else 8)
+  return crc
+
+
+def ExtractZipStream(chunks, output_directory):
+  """Extracts a ZIP archive from chunks of bytes, as they are received.
+
+  Like zipfile.ZipFile.extractall, absolute paths and parent directory
+  references in entry names are ignored, so that entries are always extracted
+  within the output directory.
+
+  Args:
+    chunks (iterable[bytes]): chunks of the ZIP archive, in order.
+    output_directory (str): directory to extract the entries to.
+
+  Returns:
+    list[str]: paths of the extracted files.
+
+  Raises:
+    zipfile.BadZipFile: if the archive is corrupted, or cannot be extracted
+        from a stream.
+  """
+  reader = _ChunkReader(chunks)
+  extracted_paths = []
+  while True:
+    signature = reader.Peek(4)
+    if not signature or signature in _END_SIGNATURES:
+      break
+    if signature != _LOCAL_FILE_HEADER_SIGNATURE:
+      raise zipfile.BadZipFile('Unexpected ZIP record signature: {0!r}'.format(
+          signature))
+
+    (_, _, flags, compression_method, _, _, crc, compressed_size,
+     uncompressed_size, name_size, extra_field_size) = (
+         _LOCAL_FILE_HEADER.unpack(reader.Read(_LOCAL_FILE_HEADER.size)))
+    name = reader.Read(name_size).decode(
+        'utf-8' if flags & _FLAG_UTF8 else 'cp437')
+    is_zip64, compressed_size, _ = _ReadZip64Sizes(
+        reader.Read(extra_field_size), compressed_size, uncompressed_size)
+
+    if flags & _FLAG_ENCRYPTED:
+      raise zipfile.BadZipFile('Encrypted ZIP entry: {0:s}'.format(name))
+    has_data_descriptor = bool(flags & _FLAG_DATA_DESCRIPTOR)
+    if compression_method == zipfile.ZIP_STORED and has_data_descriptor:
+      raise zipfile.BadZipFile(
+          'Stored ZIP entry of unknown size: {0:s}'.format(name))
+    if compression_method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+      raise zipfile.BadZipFile(
+          'Unsupported compression method {0:d}: {1:s}'.format(
+              compression_method, name))
+
+    output_path = GetOutputPath(output_directory, name)
+    if output_path and name.endswith('/'):
+      os.makedirs(output_path, exist_ok=True)
+      output_path = None
+    elif output_path:
+      os.makedirs(os.path.dirname(output_path), exist_ok=True)
+      # Existing files are replaced rather than overwritten, since they can
+      # be hard links to files collected from other hosts.
+      if os.path.lexists(output_path):
+        os.remove(output_path)
+
+    # The data of directories and unusable names is read and discarded.
+    with open(output_path or os.devnull, 'wb') as output_file:
+      if compression_method == zipfile.ZIP_STORED:
+        data_crc = _CopyStoredData(reader, output_file, compressed_size)
+      else:
+        data_crc = _CopyDeflatedData(reader, output_file)
+
+    if has_data_descriptor:
+      crc = _ReadDataDescriptor(reader, is_zip64)
+    if data_crc != crc:
+      raise zipfile.BadZipFile('Bad CRC-32 for ZIP entry: {0:s}'.format(name))
+    if output_path:
+      extracted_paths.append(output_path)
+
+  return extracted_paths
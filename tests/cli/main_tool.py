@@ -2,10 +2,16 @@
 # -*- coding: utf-8 -*-
 """Tests the main tool functionality."""
 
+import os
+import shutil
+import tempfile
 import unittest
 import logging
 
+import mock
+
 from dftimewolf.cli import dftimewolf_recipes
+from dftimewolf.lib import errors
 
 
 class MainToolTest(unittest.TestCase):
@@ -14,10 +20,40 @@ class MainToolTest(unittest.TestCase):
   def setUp(self):
     pass
 
+  def _DeregisterRecipes(self, recipes_manager):
+    """Deregisters the recipes read by the tool."""
+    for recipe in recipes_manager.GetRecipes():
+      recipes_manager.DeregisterRecipe(recipe)
+
   def testSetupLogging(self):
     """Tests the SetupLogging function."""
     dftimewolf_recipes.SetupLogging()
     logger = logging.getLogger('dftimewolf')
     root_logger = logging.getLogger()
-    self.assertEqual(len(logger.handlers), 2)
+    # Records are queued for the listener thread, which owns the file and
+    # console handlers.
+    self.assertEqual(len(logger.handlers), 1)
     self.assertEqual(len(root_logger.handlers), 1)
+
+  def testParseArguments(self):
+    """Tests that only the selected recipe's arguments are parsed."""
+    cache_directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, cache_directory)
+    tool = dftimewolf_recipes.DFTimewolfTool()
+    # pylint: disable=protected-access
+    recipes_manager = tool._recipes_manager
+    with mock.patch.dict(os.environ, {'XDG_CACHE_HOME': cache_directory}):
+      tool.ReadRecipes()
+    self.addCleanup(self._DeregisterRecipes, recipes_manager)
+    self.assertEqual(len(os.listdir(
+        os.path.join(cache_directory, 'dftimewolf'))), 1)
+
+    with mock.patch('dftimewolf.lib.state.DFTimewolfState.LoadRecipe'):
+      tool.ParseArguments(['plaso_ts', '/tmp/paths', '--incident_id', '1'])
+    options = tool._command_line_options
+    self.assertEqual(options.recipe['name'], 'plaso_ts')
+    self.assertEqual(options.paths, '/tmp/paths')
+    self.assertEqual(options.incident_id, '1')
+
+    with self.assertRaises(errors.CommandLineParseError):
+      tool.ParseArguments(['unknown_recipe'])
@@ -7,6 +7,7 @@ import unittest
 
 import six
 
+from dftimewolf.cli import dftimewolf_recipes
 from dftimewolf.lib.recipes import manager as recipes_manager
 
 
@@ -67,6 +68,13 @@ class RecipeTests(unittest.TestCase):
         self.assertIn(wanted_module, declared_modules,
                       msg='recipe: {0:s}'.format(recipe.contents['name']))
 
+  def testRecipeModulesRegistered(self):
+    """Tests that the Python module of every recipe module is registered."""
+    for recipe in self._recipes_manager.GetRecipes():
+      for module in recipe.contents['modules']:
+        self.assertIn(module['name'], dftimewolf_recipes.MODULES,
+                      msg='recipe: {0:s}'.format(recipe.contents['name']))
+
   def testNoDeadlockInRecipe(self):
     """Tests that a recipe will not deadlock."""
     for recipe in self._recipes_manager.GetRecipes():
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests the content-addressed blob store."""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from dftimewolf.lib import blob_store
+
+
+class BlobStoreTest(unittest.TestCase):
+  """Tests for the BlobStore class."""
+
+  def setUp(self):
+    self._directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self._directory)
+    self._store = blob_store.BlobStore(os.path.join(self._directory, 'blobs'))
+
+  def _WriteFile(self, name, data):
+    """Writes a collected file.
+
+    Args:
+      name (str): path of the file, relative to the test directory.
+      data (bytes): content of the file.
+
+    Returns:
+      str: path of the file.
+    """
+    path = os.path.join(self._directory, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as file_object:
+      file_object.write(data)
+    return path
+
+  def testAddFile(self):
+    """Tests that files with the same content share a blob."""
+    first_path = self._WriteFile('host1/etc/passwd', b'root:x:0:0')
+    second_path = self._WriteFile('host2/etc/passwd', b'root:x:0:0')
+    other_path = self._WriteFile('host2/etc/hosts', b'127.0.0.1 localhost')
+
+    digest = hashlib.sha256(b'root:x:0:0').hexdigest()
+    self.assertEqual(self._store.AddFile(first_path), (digest, 0))
+    self.assertEqual(self._store.AddFile(second_path), (digest, 10))
+    self.assertEqual(self._store.AddFile(second_path), (digest, 0))
+    self._store.AddFile(other_path)
+
+    blob_path = os.path.join(self._store.path, digest[:2], digest)
+    self.assertTrue(os.path.samefile(first_path, blob_path))
+    self.assertTrue(os.path.samefile(second_path, blob_path))
+    self.assertFalse(os.path.samefile(other_path, blob_path))
+    with open(second_path, 'rb') as file_object:
+      self.assertEqual(file_object.read(), b'root:x:0:0')
+    self.assertFalse(os.path.exists(second_path + '.blob'))
+
+  def testAddDirectory(self):
+    """Tests that the files of directories are deduplicated."""
+    for host in ('host1', 'host2', 'host3'):
+      self._WriteFile(host + '/bin/ls', b'ELF' * 100)
+      self._WriteFile(host + '/etc/hostname', host.encode('utf-8'))
+
+    self.assertEqual(
+        self._store.AddDirectory(os.path.join(self._directory, 'host1')),
+        (0, 0))
+    self.assertEqual(
+        self._store.AddDirectory(os.path.join(self._directory, 'host2')),
+        (1, 300))
+    self.assertEqual(self._store.AddFiles([
+        os.path.join(self._directory, 'host3', 'bin', 'ls'),
+        os.path.join(self._directory, 'host3', 'missing')]), (1, 300))
+    self.assertEqual(
+        os.stat(os.path.join(self._directory, 'host3', 'bin', 'ls')).st_nlink,
+        4)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests the GRR approval manager."""
+
+import logging
+import threading
+import unittest
+import mock
+
+from grr_api_client import errors as grr_errors
+
+from dftimewolf.lib.collectors import grr_approvals
+
+
+class GRRApprovalManagerTest(unittest.TestCase):
+  """Tests for the GRR approval manager."""
+
+  def setUp(self):
+    self._logger = logging.getLogger('dftimewolf')
+    self._manager = grr_approvals.GRRApprovalManager()
+
+  def testGetApprovalKey(self):
+    """Tests that approvals are tracked per client or hunt."""
+    client = mock.Mock(spec=['client_id'], client_id='C.0000000000000001')
+    hunt = mock.Mock(spec=['hunt_id'], hunt_id='H:123')
+    self.assertEqual(
+        self._manager.GetApprovalKey('http://grr', 'admin', client),
+        ('http://grr', 'admin', 'C.0000000000000001'))
+    self.assertEqual(
+        self._manager.GetApprovalKey('http://grr', 'admin', hunt),
+        ('http://grr', 'admin', 'H:123'))
+
+  @mock.patch('time.sleep')
+  def testWaitForApprovalPolling(self, mock_sleep):
+    """Tests that approvals are polled at growing intervals."""
+    grr_object = mock.Mock()
+    approval = grr_object.CreateApproval.return_value
+    approval.Get.return_value.data.is_valid = False
+    # The approval is granted on the fifth check.
+    approval.Get.side_effect = [approval.Get.return_value] * 4 + [
+        mock.Mock(data=mock.Mock(is_valid=True))]
+
+    self._manager.WaitForApproval(
+        ('url', 'user', 'C.1'), grr_object, 'reason', ['approver'],
+        self._logger, minimum_interval=1, maximum_interval=3)
+    grr_object.CreateApproval.assert_called_once_with(
+        reason='reason', notified_users=['approver'])
+    self.assertEqual(
+        [call[0][0] for call in mock_sleep.call_args_list],
+        [1, 1.5, 2.25, 3, 3])
+
+  def testWaitForApprovalExpired(self):
+    """Tests that approvals are requested again once no longer valid."""
+    grr_object = mock.Mock()
+    expired_approval = mock.Mock()
+    expired_approval.Get.return_value.data.is_valid = True
+    approval = mock.Mock()
+    approval.Get.return_value.data.is_valid = True
+    grr_object.CreateApproval.side_effect = [expired_approval, approval]
+
+    for request_time in (None, 200.0):
+      # Access is denied again to a request sent after the approval was
+      # granted, for instance because it expired.
+      with mock.patch('time.time', return_value=100.0):
+        self._manager.WaitForApproval(
+            ('url', 'user', 'C.1'), grr_object, 'reason', ['approver'],
+            self._logger, minimum_interval=0, maximum_interval=0,
+            request_time=request_time)
+    self.assertEqual(grr_object.CreateApproval.call_count, 2)
+    approval.Get.assert_called_once()
+
+  def testWaitForApprovalDeniedBeforeGrant(self):
+    """Tests that requests denied before the grant do not request again."""
+    grr_object = mock.Mock()
+    grr_object.CreateApproval.return_value.Get.return_value.data.is_valid = (
+        True)
+
+    with mock.patch('time.time', return_value=100.0):
+      self._manager.WaitForApproval(
+          ('url', 'user', 'C.1'), grr_object, 'reason', ['approver'],
+          self._logger, minimum_interval=0, maximum_interval=0,
+          request_time=50.0)
+    # Another request was denied before the approval was granted, and is
+    # retried without a new approval.
+    self._manager.WaitForApproval(
+        ('url', 'user', 'C.1'), grr_object, 'reason', ['approver'],
+        self._logger, minimum_interval=0, maximum_interval=0,
+        request_time=60.0)
+    grr_object.CreateApproval.assert_called_once()
+
+  def testWaitForApprovalCoalesced(self):
+    """Tests that threads waiting for an approval share its request."""
+    grr_object = mock.Mock()
+    granted = threading.Event()
+    approval = grr_object.CreateApproval.return_value
+    approval.Get.side_effect = lambda: mock.Mock(
+        data=mock.Mock(is_valid=granted.is_set()))
+
+    threads = [
+        threading.Thread(
+            target=self._manager.WaitForApproval,
+            args=(('url', 'user', 'H:123'), grr_object, 'reason',
+                  ['approver'], self._logger),
+            kwargs={'minimum_interval': 0.01, 'maximum_interval': 0.01})
+        for _ in range(5)]
+    for thread in threads:
+      thread.start()
+    granted.set()
+    for thread in threads:
+      thread.join(timeout=10)
+      self.assertFalse(thread.is_alive())
+    grr_object.CreateApproval.assert_called_once_with(
+        reason='reason', notified_users=['approver'])
+
+  def testWaitForApprovalError(self):
+    """Tests that errors are raised to the waiting threads."""
+    grr_object = mock.Mock()
+    grr_object.CreateApproval.side_effect = grr_errors.UnknownError('error')
+    with self.assertRaises(grr_errors.UnknownError):
+      self._manager.WaitForApproval(
+          ('url', 'user', 'C.1'), grr_object, 'reason', ['approver'],
+          self._logger)
+
+    # The next caller requests the approval again.
+    grr_object.CreateApproval.side_effect = None
+    grr_object.CreateApproval.return_value.Get.return_value.data.is_valid = (
+        True)
+    self._manager.WaitForApproval(
+        ('url', 'user', 'C.1'), grr_object, 'reason', ['approver'],
+        self._logger, minimum_interval=0)
+    self.assertEqual(grr_object.CreateApproval.call_count, 2)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -2,6 +2,10 @@
 # -*- coding: utf-8 -*-
 """Tests the GRR base collector."""
 
+import shutil
+import tempfile
+import threading
+import time
 import unittest
 import mock
 
@@ -44,7 +48,7 @@ class GRRBaseModuleTest(unittest.TestCase):
     self.assertIsNotNone(grr_base_module)
 
   @mock.patch('tempfile.mkdtemp')
-  @mock.patch('grr_api_client.api.InitHttp')
+  @mock.patch('dftimewolf.lib.collectors.grr_connection.InitHttp')
   def testSetup(self, mock_grr_inithttp, mock_mkdtemp):
     """Tests that setup works"""
     test_state = state.DFTimewolfState(config.Config)
@@ -59,14 +63,74 @@ class GRRBaseModuleTest(unittest.TestCase):
         verify=True
     )
     mock_grr_inithttp.assert_called_with(
-        api_endpoint='http://fake/endpoint',
+        'http://fake/endpoint',
         auth=('admin1', 'admin2'),
-        verify=True)
+        verify=True,
+        pool_size=10,
+        keep_alive=True)
     self.assertEqual(grr_base_module.approvers,
                      ['approver1@example.com', 'approver2@example.com'])
     self.assertEqual(grr_base_module.output_path, '/fake')
 
-  @mock.patch('grr_api_client.api.InitHttp')
+  @mock.patch('dftimewolf.lib.collectors.grr_connection.InitHttp')
+  def testSharedGRRApi(self, mock_grr_inithttp):
+    """Tests that GRR modules share GRR API clients."""
+    config.Config.LoadExtraData(
+        '{"grr_http_pool_size": 20, "grr_http_keep_alive": false}')
+    self.addCleanup(config.Config.ClearExtra)
+    test_state = state.DFTimewolfState(config.Config)
+    grr_base_modules = []
+    for grr_username in ('admin1', 'admin1', 'admin2'):
+      grr_base_module = grr_base.GRRBaseModule(test_state)
+      grr_base_module.SetUp(
+          reason='random reason',
+          grr_server_url='http://fake/endpoint',
+          grr_username=grr_username,
+          grr_password='password')
+      grr_base_modules.append(grr_base_module)
+
+    self.assertEqual(mock_grr_inithttp.call_count, 2)
+    mock_grr_inithttp.assert_called_with(
+        'http://fake/endpoint',
+        auth=('admin2', 'password'),
+        verify=True,
+        pool_size=20,
+        keep_alive=False)
+    self.assertIs(grr_base_modules[0].grr_api, grr_base_modules[1].grr_api)
+
+  @mock.patch('dftimewolf.lib.collectors.grr_connection.InitHttp')
+  def testSharedBlobStore(self, _):
+    """Tests that GRR modules share the blob store, if enabled."""
+    grr_base_module = grr_base.GRRBaseModule(
+        state.DFTimewolfState(config.Config))
+    grr_base_module.SetUp(
+        reason='random reason',
+        grr_server_url='http://fake/endpoint',
+        grr_username='admin',
+        grr_password='password')
+    self.assertIsNone(grr_base_module.blob_store)
+
+    blob_store_path = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, blob_store_path)
+    config.Config.LoadExtraData(
+        '{{"grr_blob_store": "{0:s}"}}'.format(blob_store_path))
+    self.addCleanup(config.Config.ClearExtra)
+    test_state = state.DFTimewolfState(config.Config)
+    grr_base_modules = []
+    for _ in range(2):
+      grr_base_module = grr_base.GRRBaseModule(test_state)
+      grr_base_module.SetUp(
+          reason='random reason',
+          grr_server_url='http://fake/endpoint',
+          grr_username='admin',
+          grr_password='password')
+      grr_base_modules.append(grr_base_module)
+
+    self.assertEqual(grr_base_modules[0].blob_store.path, blob_store_path)
+    self.assertIs(
+        grr_base_modules[0].blob_store, grr_base_modules[1].blob_store)
+
+  @mock.patch('dftimewolf.lib.collectors.grr_connection.InitHttp')
   def testApprovalWrapper(self, _):
     """Tests that the approval wrapper works correctly."""
     test_state = state.DFTimewolfState(config.Config)
@@ -102,7 +166,7 @@ class GRRBaseModuleTest(unittest.TestCase):
         reason='random reason',
         notified_users=['approver1@example.com', 'approver2@example.com'])
 
-  @mock.patch('grr_api_client.api.InitHttp')
+  @mock.patch('dftimewolf.lib.collectors.grr_connection.InitHttp')
   def testNoApproversErrorsOut(self, _):
     """Tests that an error is generated if no approvers are specified.
 
@@ -137,5 +201,100 @@ class GRRBaseModuleTest(unittest.TestCase):
     self.assertTrue(error.exception.critical)
     self.assertEqual(len(test_state.errors), 1)
 
+  @mock.patch('dftimewolf.lib.collectors.grr_connection.InitHttp')
+  def testProcessClients(self, _):
+    """Tests that clients are processed within the shared in-flight limit."""
+    config.Config.LoadExtraData('{"grr_max_in_flight": 2}')
+    self.addCleanup(config.Config.ClearExtra)
+    test_state = state.DFTimewolfState(config.Config)
+    grr_base_modules = []
+    for _ in range(2):
+      grr_base_module = grr_base.GRRBaseModule(test_state)
+      grr_base_module.SetUp(
+          reason='random reason',
+          grr_server_url='http://fake/endpoint',
+          grr_username='admin1',
+          grr_password='admin2')
+      grr_base_modules.append(grr_base_module)
+    self.assertIs(
+        grr_base_modules[0].request_limits, grr_base_modules[1].request_limits)
+
+    lock = threading.Lock()
+    in_flight = []
+    max_in_flight = []
+    def _ProcessClient(client):
+      with lock:
+        in_flight.append(client)
+        max_in_flight.append(len(in_flight))
+      time.sleep(0.01)
+      with lock:
+        in_flight.remove(client)
+      if client == 'failing':
+        raise errors.DFTimewolfError('Client failed')
+      if client == 'unexpected':
+        raise ValueError('bad data')
+
+    # pylint: disable=protected-access
+    threads = [
+        threading.Thread(
+            target=grr_base_module._ProcessClients,
+            args=(_ProcessClient, ['client1', 'unexpected', 'failing']))
+        for grr_base_module in grr_base_modules]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+
+    self.assertEqual(len(max_in_flight), 6)
+    self.assertLessEqual(max(max_in_flight), 2)
+    self.assertEqual(len(test_state.errors), 4)
+    self.assertEqual(
+        sorted(error.message for error in test_state.errors),
+        ['Client failed', 'Client failed',
+         'Unexpected error processing client: bad data',
+         'Unexpected error processing client: bad data'])
+    self.assertFalse(any(error.critical for error in test_state.errors))
+
+    # Errors already declared, even if since moved to the global errors, are
+    # not declared again.
+    def _DeclareError(_):
+      try:
+        grr_base_modules[0].ModuleError('Declared', critical=True)
+      finally:
+        test_state.CleanUp()
+
+    grr_base_modules[0]._ProcessClients(_DeclareError, ['client3'])
+    self.assertEqual(test_state.errors, [])
+    self.assertEqual(
+        [error.message for error in test_state.global_errors].count(
+            'Declared'), 1)
+
+  @mock.patch('dftimewolf.lib.collectors.grr_connection.InitHttp')
+  def testProcessClientsCurrentModule(self, _):
+    """Tests that client threads are attributed to the calling module."""
+    test_state = state.DFTimewolfState(config.Config)
+    grr_base_module = grr_base.GRRBaseModule(test_state)
+    grr_base_module.SetUp(
+        reason='random reason',
+        grr_server_url='http://fake/endpoint',
+        grr_username='admin1',
+        grr_password='admin2')
+
+    current_modules = []
+    def _ProcessClients():
+      state.CURRENT_MODULE.set(('GRRBaseModule', state.PHASE_PROCESS))
+      # pylint: disable=protected-access
+      grr_base_module._ProcessClients(
+          lambda _: current_modules.append(test_state._GetCurrentModule()),
+          ['client1', 'client2'])
+
+    thread = threading.Thread(target=_ProcessClients)
+    thread.start()
+    thread.join()
+    self.assertEqual(
+        current_modules, [('GRRBaseModule', state.PHASE_PROCESS)] * 2)
+    self.assertIsNone(state.CURRENT_MODULE.get())
+
+
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests the pooled GRR API connections."""
+
+import unittest
+import mock
+
+from google.protobuf import any_pb2
+from google.protobuf import json_format
+from grr_api_client import errors as grr_errors
+from grr_api_client import utils as grr_utils
+from grr_api_client.connectors import http_connector
+from grr_response_proto.api import reflection_pb2
+from grr_response_proto.api import vfs_pb2
+
+from dftimewolf.lib.collectors import grr_connection
+
+
+def _CreateResponse(status_code=200, content=b'', cookies=None):
+  """Creates a mock response of the GRR API.
+
+  Args:
+    status_code (Optional[int]): HTTP status code of the response.
+    content (Optional[bytes]): content of the response, without the JSON
+        prefix of the GRR API.
+    cookies (Optional[dict[str, str]]): cookies of the response.
+
+  Returns:
+    mock.Mock: response.
+  """
+  return mock.Mock(
+      status_code=status_code, cookies=cookies or {},
+      content=http_connector.HttpConnector.JSON_PREFIX.encode() + content)
+
+
+class PooledHttpConnectorTest(unittest.TestCase):
+  """Tests for the pooled GRR API HTTP connector."""
+
+  def _CreateConnector(self, **kwargs):
+    """Creates a connector that does not need a GRR server.
+
+    The GRR API HTTP connector fetches its CSRF token and routing map from
+    mock responses, so that the public interface of the installed GRR API
+    client is tested.
+
+    Args:
+      kwargs (dict[str, object]): keyword arguments of the connector.
+
+    Returns:
+      grr_connection.PooledHttpConnector: connector.
+    """
+    routing_map = reflection_pb2.ApiListApiMethodsResult(items=[
+        reflection_pb2.ApiMethod(
+            name='GetGrrUser', http_route='/api/users/me',
+            http_methods=['GET'],
+            result_type_descriptor=reflection_pb2.ApiRDFValueDescriptor(
+                name='ApiGrrUser', default=any_pb2.Any(
+                    type_url='type.googleapis.com/grr.ApiGrrUser'))),
+        reflection_pb2.ApiMethod(
+            name='GetFileBlob',
+            http_route='/api/clients/<client_id>/vfs-blob/<path:file_path>',
+            http_methods=['GET'])])
+    session_get = mock.patch.object(
+        grr_connection.requests.Session, 'get', side_effect=[
+            _CreateResponse(cookies={'csrftoken': 'token'}),
+            _CreateResponse(content=json_format.MessageToJson(
+                routing_map).encode())])
+    session_get.start()
+    self.addCleanup(session_get.stop)
+
+    connector = grr_connection.PooledHttpConnector(
+        http_connector.HttpConnector(
+            api_endpoint='http://fake/endpoint', validate_version=False),
+        **kwargs)
+    # pylint: disable=protected-access
+    connector._session.send = mock.Mock()
+    return connector
+
+  def testInitialization(self):
+    """Tests the connection pool of the connector."""
+    # pylint: disable=protected-access
+    connector = self._CreateConnector(pool_size=20)
+    adapter = connector._session.get_adapter('https://fake/endpoint')
+    self.assertIsInstance(adapter, grr_connection._KeepAliveHTTPAdapter)
+    self.assertEqual(adapter._pool_maxsize, 20)
+    self.assertEqual(connector._session.headers['Connection'], 'keep-alive')
+    self.assertEqual(
+        connector.page_size, http_connector.HttpConnector.DEFAULT_PAGE_SIZE)
+
+    connector = self._CreateConnector(keep_alive=False)
+    self.assertEqual(connector._session.headers['Connection'], 'close')
+
+  @mock.patch('dftimewolf.lib.collectors.grr_connection.http_connector.'
+              'HttpConnector')
+  def testInitHttp(self, mock_HttpConnector):
+    """Tests that GRR API objects use a pooled connector."""
+    grr_api = grr_connection.InitHttp(
+        'http://fake/endpoint', auth=('admin', 'password'), verify=False,
+        pool_size=5)
+    mock_HttpConnector.assert_called_once_with(
+        api_endpoint='http://fake/endpoint', auth=('admin', 'password'),
+        verify=False)
+    # pylint: disable=protected-access
+    connector = grr_api._context.connector
+    self.assertIsInstance(connector, grr_connection.PooledHttpConnector)
+    self.assertEqual(
+        connector._session.get_adapter('http://fake')._pool_maxsize, 5)
+
+  def testSendRequest(self):
+    """Tests that requests are built by the GRR API HTTP connector."""
+    # pylint: disable=protected-access
+    connector = self._CreateConnector()
+    connector._session.send.return_value = _CreateResponse(
+        content=b'{"username": "admin"}')
+
+    result = connector.SendRequest('GetGrrUser', None)
+    self.assertEqual(result.username, 'admin')
+    request = connector._session.send.call_args[0][0]
+    self.assertEqual(request.url, 'http://fake/api/v2/users/me')
+    self.assertEqual(request.headers['x-csrftoken'], 'token')
+
+    connector._session.send.return_value = _CreateResponse(
+        status_code=404, content=b'{"message": "No user"}')
+    with self.assertRaises(grr_errors.ResourceNotFoundError) as error:
+      connector.SendRequest('GetGrrUser', None)
+    self.assertEqual(str(error.exception), 'No user\n')
+    # The CSRF token and routing map are only fetched once.
+    self.assertEqual(grr_connection.requests.Session.get.call_count, 2)
+
+  def testSendStreamingRequest(self):
+    """Tests that requests are sent through the same session."""
+    # pylint: disable=protected-access
+    connector = self._CreateConnector()
+    response = connector._session.send.return_value
+    response.status_code = 200
+    response.iter_content.return_value = iter([b'chunk1', b'chunk2'])
+    blob_args = vfs_pb2.ApiGetFileBlobArgs(
+        client_id='C.0000000000000001', file_path='fs/os/etc/passwd')
+
+    chunks = connector.SendStreamingRequest('GetFileBlob', blob_args)
+    self.assertIsInstance(chunks, grr_utils.BinaryChunkIterator)
+    self.assertEqual(list(chunks), [b'chunk1', b'chunk2'])
+    response.close.assert_called_once()
+    self.assertTrue(connector._session.send.call_args[1]['stream'])
+
+    response.status_code = 403
+    response.content = b'Forbidden'
+    with self.assertRaises(grr_errors.AccessForbiddenError):
+      connector.SendStreamingRequest('GetFileBlob', blob_args)
+    self.assertEqual(connector._session.send.call_count, 2)
+    self.assertEqual(response.close.call_count, 2)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests the GRR flow monitor."""
+
+import unittest
+
+import mock
+from grr_api_client import errors as grr_errors
+from grr_api_client import flow
+from grr_response_proto import flows_pb2
+from grr_response_proto.api import flow_pb2
+
+from dftimewolf.lib.collectors import grr_flow_monitor
+from tests.lib.collectors.test_data import mock_grr_hosts
+
+
+MOCK_FLOW_RUNNING = flow.Flow(data=flow_pb2.ApiFlow(
+    urn='C.0000000000000001',
+    flow_id='F:12345',
+    state=flows_pb2.FlowContext.RUNNING), context=True)
+
+
+class GRRFlowMonitorTest(unittest.TestCase):
+  """Tests for the GRR flow monitor."""
+
+  def setUp(self):
+    self.monitor = grr_flow_monitor.GRRFlowMonitor(
+        minimum_interval=0.01, maximum_interval=0.02)
+
+  def testWatch(self):
+    """Tests that flows are checked until they complete."""
+    mock_client = mock.Mock(client_id='C.0000000000000001')
+    mock_client.Flow.return_value.Get.side_effect = [
+        MOCK_FLOW_RUNNING, MOCK_FLOW_RUNNING, mock_grr_hosts.MOCK_FLOW]
+    future = self.monitor.Watch(mock_client, 'F:12345')
+    self.assertIs(self.monitor.Watch(mock_client, 'F:12345'), future)
+    status = future.result(timeout=5)
+    self.assertEqual(status.state, flows_pb2.FlowContext.TERMINATED)
+    self.assertEqual(mock_client.Flow.return_value.Get.call_count, 3)
+
+  def testWatchError(self):
+    """Tests that errors checking the status of flows are propagated."""
+    mock_client = mock.Mock(client_id='C.0000000000000001')
+    mock_client.Flow.return_value.Get.side_effect = grr_errors.UnknownError
+    future = self.monitor.Watch(mock_client, 'F:12345')
+    with self.assertRaises(grr_errors.UnknownError):
+      future.result(timeout=5)
+
+  def testWatchMultipleFlows(self):
+    """Tests that the flows of several clients are checked."""
+    mock_client1 = mock.Mock(client_id='C.0000000000000001')
+    mock_client1.Flow.return_value.Get.side_effect = [
+        MOCK_FLOW_RUNNING, mock_grr_hosts.MOCK_FLOW]
+    mock_client2 = mock.Mock(client_id='C.0000000000000002')
+    mock_client2.Flow.return_value.Get.return_value = (
+        mock_grr_hosts.MOCK_FLOW_ERROR)
+    future1 = self.monitor.Watch(mock_client1, 'F:12345')
+    future2 = self.monitor.Watch(mock_client2, 'F:12345')
+    self.assertEqual(
+        future1.result(timeout=5).state, flows_pb2.FlowContext.TERMINATED)
+    self.assertEqual(
+        future2.result(timeout=5).state, flows_pb2.FlowContext.ERROR)
+
+  def testWatchUnexpectedError(self):
+    """Tests that unexpected errors are propagated to the flow's future."""
+    mock_client = mock.Mock(client_id='C.0000000000000001')
+    mock_client.Flow.return_value.Get.side_effect = ValueError('bad status')
+    future = self.monitor.Watch(mock_client, 'F:12345')
+    with self.assertRaises(ValueError):
+      future.result(timeout=5)
+
+  def testWatchClientFlows(self):
+    """Tests that the flows of a client are checked with one request."""
+    request_callback = mock.Mock()
+    monitor = grr_flow_monitor.GRRFlowMonitor(
+        minimum_interval=0.01, maximum_interval=0.02,
+        request_callback=request_callback)
+    running_flows = [
+        flow.Flow(data=flow_pb2.ApiFlow(
+            urn='C.0000000000000001', flow_id=flow_id,
+            state=flows_pb2.FlowContext.RUNNING), context=True)
+        for flow_id in ('F:1', 'F:2', 'F:3')]
+    terminated_flows = [
+        flow.Flow(data=flow_pb2.ApiFlow(
+            urn='C.0000000000000001', flow_id=flow_id,
+            state=flows_pb2.FlowContext.TERMINATED), context=True)
+        for flow_id in ('F:1', 'F:2', 'F:3')]
+    mock_client = mock.Mock(client_id='C.0000000000000001')
+    mock_client.ListFlows.side_effect = [
+        iter(running_flows), iter(terminated_flows)]
+
+    # The flows are watched before the monitor thread first checks them.
+    with monitor._condition:  # pylint: disable=protected-access
+      flow_futures = [
+          monitor.Watch(mock_client, flow_id) for flow_id in ('F:1', 'F:2')]
+    for future in flow_futures:
+      self.assertEqual(
+          future.result(timeout=5).state, flows_pb2.FlowContext.TERMINATED)
+    self.assertEqual(mock_client.ListFlows.call_count, 2)
+    mock_client.Flow.assert_not_called()
+    self.assertEqual(request_callback.call_count, 2)
+
+  def testMonitorThreadError(self):
+    """Tests that outstanding flows fail if the monitor thread stops."""
+    mock_client = mock.Mock(client_id='C.0000000000000001')
+    with mock.patch.object(
+        self.monitor, '_CheckFlows', side_effect=RuntimeError('crashed')):
+      future = self.monitor.Watch(mock_client, 'F:12345')
+      with self.assertRaises(RuntimeError):
+        future.result(timeout=5)
+
+    mock_client.Flow.return_value.Get.return_value = mock_grr_hosts.MOCK_FLOW
+    future = self.monitor.Watch(mock_client, 'F:12345')
+    self.assertEqual(
+        future.result(timeout=5).state, flows_pb2.FlowContext.TERMINATED)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -2,15 +2,21 @@
 # -*- coding: utf-8 -*-
 """Tests the GRR host collectors."""
 
+import io
+import os
+import shutil
+import tempfile
 import unittest
+import zipfile
 
 import mock
 import six
 from grr_api_client import errors as grr_errors
-from grr_response_proto import flows_pb2
+from grr_response_proto import flows_pb2, jobs_pb2
 from tests.lib.collectors.test_data import mock_grr_hosts
 
 from dftimewolf import config
+from dftimewolf.lib import blob_store
 from dftimewolf.lib import state
 from dftimewolf.lib import errors
 from dftimewolf.lib.collectors import grr_hosts
@@ -20,11 +26,11 @@ from dftimewolf.lib.errors import DFTimewolfError
 
 # Extensive access to protected members for testing, and mocking of classes.
 # pylint: disable=protected-access,invalid-name,arguments-differ
-# @mock.patch('grr_api_client.api.InitHttp')
+# @mock.patch('dftimewolf.lib.collectors.grr_connection.InitHttp')
 class GRRFlowTests(unittest.TestCase):
   """Tests for the GRRFlow base class."""
 
-  @mock.patch('grr_api_client.api.InitHttp')
+  @mock.patch('dftimewolf.lib.collectors.grr_connection.InitHttp')
   def setUp(self, mock_InitHttp):
     self.mock_grr_api = mock.Mock()
     mock_InitHttp.return_value = self.mock_grr_api
@@ -61,6 +67,76 @@ class GRRFlowTests(unittest.TestCase):
         'Could not search for host tomchop: ', error.exception.message)
     self.assertEqual(len(self.test_state.errors), 1)
 
+  def testGetClientByHostnameCached(self):
+    """Tests that clients found are cached in the state."""
+    self.mock_grr_api.SearchClients.return_value = \
+        mock_grr_hosts.MOCK_CLIENT_LIST
+    self.grr_flow_module._GetClientByHostname('tomchop')
+    other_module = grr_hosts.GRRFlow(self.test_state)
+    other_module.grr_api = self.mock_grr_api
+    other_module.grr_url = self.grr_flow_module.grr_url
+    other_module.grr_username = self.grr_flow_module.grr_username
+    client = other_module._GetClientByHostname('TOMCHOP')
+    self.mock_grr_api.SearchClients.assert_called_once_with('tomchop')
+    self.assertEqual(
+        client.data.client_id, mock_grr_hosts.MOCK_CLIENT_RECENT.data.client_id)
+
+  def testFindClients(self):
+    """Tests that hosts that cannot be found are non-critical errors."""
+    self.mock_grr_api.SearchClients.return_value = \
+        mock_grr_hosts.MOCK_CLIENT_LIST
+    clients = self.grr_flow_module._FindClients(['tomchop', 'unknown'])
+    self.assertEqual(len(clients), 1)
+    self.assertEqual(
+        clients[0].data.client_id,
+        mock_grr_hosts.MOCK_CLIENT_RECENT.data.client_id)
+    self.assertEqual(len(self.test_state.errors), 1)
+    self.assertEqual(
+        self.test_state.errors[0].message,
+        'Could not get client_id for unknown')
+    self.assertFalse(self.test_state.errors[0].critical)
+
+  def testFindClientsSharedDomain(self):
+    """Tests that FQDNs sharing a domain are searched for individually."""
+    def _SearchClients(query):
+      # GRR indexes FQDNs by prefix, so the domain alone matches nothing.
+      return [
+          client for client in mock_grr_hosts.MOCK_DOMAIN_CLIENT_LIST
+          if client.data.os_info.fqdn.startswith(query.lower())]
+
+    self.mock_grr_api.SearchClients.side_effect = _SearchClients
+    self.assertEqual(_SearchClients('example.com'), [])
+    clients = self.grr_flow_module._FindClients(
+        ['host2.example.com', 'HOST1.example.com'])
+    self.assertEqual(
+        [client.client_id for client in clients],
+        ['C.0000000000000004', 'C.0000000000000003'])
+    self.assertEqual(self.mock_grr_api.SearchClients.call_count, 2)
+    self.mock_grr_api.SearchClients.assert_has_calls([
+        mock.call('host2.example.com'), mock.call('HOST1.example.com')],
+        any_order=True)
+    self.assertEqual(len(self.test_state.errors), 0)
+
+  def testFindClientsDuplicateHosts(self):
+    """Tests that hosts listed several times are searched for once."""
+    self.mock_grr_api.SearchClients.return_value = \
+        mock_grr_hosts.MOCK_CLIENT_LIST
+    clients = self.grr_flow_module._FindClients(
+        ['tomchop', 'TOMCHOP', 'tomchop'])
+    self.assertEqual(len(clients), 1)
+    self.mock_grr_api.SearchClients.assert_called_once_with('tomchop')
+    self.assertEqual(len(self.test_state.errors), 0)
+
+  def testFindClientsNoneFound(self):
+    """Tests that an error is raised when no client is found."""
+    self.mock_grr_api.SearchClients.return_value = []
+    with self.assertRaises(errors.DFTimewolfError) as error:
+      self.grr_flow_module._FindClients(['unknown1', 'unknown2'])
+    self.assertEqual(
+        'Could not find any GRR client for: unknown1, unknown2',
+        error.exception.message)
+    self.assertEqual(len(self.test_state.errors), 3)
+
   @mock.patch('grr_api_client.client.ClientBase.CreateFlow')
   def testLaunchFlow(self, mock_CreateFlow):
     """Tests that CreateFlow is correctly called."""
@@ -115,21 +191,67 @@ class GRRFlowTests(unittest.TestCase):
   def testDownloadFilesForFlow(self, mock_GetFilesArchive, mock_ZipFile,
                                mock_makedirs, mock_isdir, mock_remove):
     """Tests that files are downloaded and unzipped in the correct
-    directories."""
+    directories when the archive cannot be extracted while downloaded."""
     # Change output_path to something constant so we can easily assert
     # if calls were done correctly.
     self.grr_flow_module.output_path = '/tmp/random'
     mock_isdir.return_value = False  # Return false so makedirs is called
+    mock_GetFilesArchive.return_value.__iter__.return_value = [b'not a zip']
 
     return_value = self.grr_flow_module._DownloadFiles(
         mock_grr_hosts.MOCK_CLIENT, "F:12345")
     self.assertEqual(return_value, '/tmp/random/tomchop')
-    mock_GetFilesArchive.assert_called_once()
+    self.assertEqual(mock_GetFilesArchive.call_count, 2)
     mock_ZipFile.assert_called_once_with('/tmp/random/F:12345.zip')
     mock_isdir.assert_called_once_with('/tmp/random/tomchop')
     mock_makedirs.assert_called_once_with('/tmp/random/tomchop')
     mock_remove.assert_called_once_with('/tmp/random/F:12345.zip')
 
+  @mock.patch('grr_api_client.flow.FlowBase.GetFilesArchive')
+  def testDownloadFilesForFlowStreaming(self, mock_GetFilesArchive):
+    """Tests that flow archives are extracted while downloaded."""
+    self.grr_flow_module.output_path = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.grr_flow_module.output_path)
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+      zip_file.writestr('F_12345/C.0000000000000000/fs/os/etc/passwd', 'root')
+    mock_GetFilesArchive.return_value = [archive.getvalue()]
+
+    return_value = self.grr_flow_module._DownloadFiles(
+        mock_grr_hosts.MOCK_CLIENT, "F:12345")
+    self.assertEqual(
+        return_value, os.path.join(self.grr_flow_module.output_path, 'tomchop'))
+    mock_GetFilesArchive.assert_called_once()
+    with open(os.path.join(
+        return_value, 'F_12345', 'C.0000000000000000', 'fs', 'os', 'etc',
+        'passwd')) as file_object:
+      self.assertEqual(file_object.read(), 'root')
+    self.assertFalse(os.path.exists(os.path.join(
+        self.grr_flow_module.output_path, 'F:12345.zip')))
+
+  @mock.patch('grr_api_client.flow.FlowBase.GetFilesArchive')
+  def testDownloadFilesWithBlobStore(self, mock_GetFilesArchive):
+    """Tests that files with the same content are deduplicated."""
+    self.grr_flow_module.output_path = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.grr_flow_module.output_path)
+    self.grr_flow_module.blob_store = blob_store.BlobStore(
+        os.path.join(self.grr_flow_module.output_path, 'blobs'))
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+      zip_file.writestr('F_12345/fs/os/etc/passwd', 'root')
+    mock_GetFilesArchive.return_value = [archive.getvalue()]
+
+    passwd_paths = []
+    for host in ('host1', 'host2'):
+      output_directory = self.grr_flow_module._DownloadFiles(
+          mock_grr_hosts.MOCK_CLIENT, 'F:12345',
+          output_directory=os.path.join(
+              self.grr_flow_module.output_path, host))
+      passwd_paths.append(os.path.join(
+          output_directory, 'F_12345', 'fs', 'os', 'etc', 'passwd'))
+    self.assertTrue(os.path.samefile(*passwd_paths))
+    self.assertEqual(os.stat(passwd_paths[0]).st_nlink, 3)
+
   @mock.patch('os.path.exists')
   @mock.patch('grr_api_client.flow.FlowBase.GetFilesArchive')
   def testNotDownloadFilesForExistingFlow(self, mock_GetFilesArchive,
@@ -147,7 +269,7 @@ class GRRFlowTests(unittest.TestCase):
 class GRRArtifactCollectorTest(unittest.TestCase):
   """Tests for the GRR artifact collector."""
 
-  @mock.patch('grr_api_client.api.InitHttp')
+  @mock.patch('dftimewolf.lib.collectors.grr_connection.InitHttp')
   def setUp(self, mock_InitHttp):
     self.mock_grr_api = mock.Mock()
     mock_InitHttp.return_value = self.mock_grr_api
@@ -180,7 +302,7 @@ class GRRArtifactCollectorTest(unittest.TestCase):
                      ['tomchop'])
     self.assertTrue(self.grr_artifact_collector.use_tsk)
 
-  @mock.patch('grr_api_client.api.InitHttp')
+  @mock.patch('dftimewolf.lib.collectors.grr_connection.InitHttp')
   @mock.patch('grr_api_client.flow.FlowRef.Get')
   @mock.patch('grr_api_client.client.ClientBase.CreateFlow')
   @mock.patch('dftimewolf.lib.collectors.grr_hosts.GRRFlow._DownloadFiles')
@@ -197,6 +319,8 @@ class GRRArtifactCollectorTest(unittest.TestCase):
         mock_grr_hosts.MOCK_CLIENT_LIST
     mock_CreateFlow.return_value = mock_grr_hosts.MOCK_FLOW
     mock_Get.return_value = mock_grr_hosts.MOCK_FLOW
+    # The GRR API client set up by setUp would be shared with this collector.
+    self.test_state = state.DFTimewolfState(config.Config)
     self.grr_artifact_collector = grr_hosts.GRRArtifactCollector(
         self.test_state)
     self.grr_artifact_collector.SetUp(
@@ -235,7 +359,8 @@ class GRRArtifactCollectorTest(unittest.TestCase):
     self.assertEqual(mock_CreateFlow.call_count, 1)
     self.assertEqual(mock_DownloadFiles.call_count, 1)
     mock_DownloadFiles.assert_called_with(
-        mock_grr_hosts.MOCK_CLIENT_LIST[1], mock_grr_hosts.MOCK_FLOW.flow_id
+        mock_grr_hosts.MOCK_CLIENT_LIST[1], mock_grr_hosts.MOCK_FLOW.flow_id,
+        output_directory=None
     )
     results = self.test_state.GetContainers(containers.File)
     self.assertEqual(len(results), 1)
@@ -243,11 +368,97 @@ class GRRArtifactCollectorTest(unittest.TestCase):
     self.assertEqual(result.name, 'tomchop')
     self.assertEqual(result.path, '/tmp/tmpRandom/tomchop')
 
+  def testGroupArtifacts(self):
+    """Tests that artifacts are grouped by expected cost."""
+    artifacts = grr_hosts.GRRArtifactCollector._DEFAULT_ARTIFACTS_WINDOWS
+    groups = self.grr_artifact_collector._GroupArtifacts(artifacts)
+    self.assertEqual(len(groups), 1)
+    self.assertEqual(sorted(groups[0]), sorted(artifacts))
+
+    self.grr_artifact_collector.max_artifact_flows = 3
+    groups = self.grr_artifact_collector._GroupArtifacts(artifacts)
+    self.assertEqual(groups, [
+        ['WindowsEventLogs'],
+        ['WindowsSystemRegistryFiles', 'WindowsUserRegistryFiles',
+         'WindowsAppCompatCache', 'WindowsPrefetchFiles',
+         'WindowsScheduledTasks', 'WindowsXMLEventLogTerminalServices',
+         'WindowsSuperFetchFiles'],
+        ['WindowsSearchDatabase']])
+
+  def testRecordArtifactCosts(self):
+    """Tests that flow durations are shared between their artifacts."""
+    self.grr_artifact_collector._RecordArtifactCosts(
+        ['RandomArtifact', 'WindowsEventLogs'], 660)
+    self.assertEqual(
+        self.grr_artifact_collector._GetArtifactCost('RandomArtifact'), 45)
+    self.assertEqual(
+        self.grr_artifact_collector._GetArtifactCost('WindowsEventLogs'), 450)
+    self.assertEqual(
+        grr_hosts.GRRArtifactCollector._ARTIFACT_COSTS_SEC['WindowsEventLogs'],
+        300)
+
+  @mock.patch('dftimewolf.lib.collectors.grr_hosts.time')
+  @mock.patch('dftimewolf.lib.collectors.grr_hosts.GRRFlow._DownloadFiles')
+  @mock.patch('dftimewolf.lib.collectors.grr_hosts.GRRFlow._AwaitFlow')
+  @mock.patch('dftimewolf.lib.collectors.grr_hosts.GRRFlow._LaunchFlow')
+  def testCollectArtifactsDuration(
+      self, mock_LaunchFlow, mock_AwaitFlow, mock_DownloadFiles, mock_time):
+    """Tests that the duration of artifact flows includes their launch."""
+    clock = [0]
+    def _Advance(seconds):
+      clock[0] += seconds
+    mock_time.time.side_effect = lambda: clock[0]
+    mock_LaunchFlow.side_effect = lambda *args: _Advance(100) or 'F:1'
+    mock_AwaitFlow.side_effect = lambda *args: _Advance(20)
+    mock_DownloadFiles.return_value = None
+
+    self.grr_artifact_collector._CollectArtifacts(
+        mock_grr_hosts.MOCK_CLIENT, ['RandomArtifact'])
+    self.assertEqual(
+        self.grr_artifact_collector._GetArtifactCost('RandomArtifact'), 75)
+
+  @mock.patch('dftimewolf.lib.collectors.grr_hosts.GRRFlow._DownloadFiles')
+  @mock.patch('dftimewolf.lib.collectors.grr_hosts.GRRFlow._AwaitFlow')
+  @mock.patch('dftimewolf.lib.collectors.grr_hosts.GRRFlow._LaunchFlow')
+  def testProcessSplitArtifacts(
+      self, mock_LaunchFlow, mock_AwaitFlow, mock_DownloadFiles):
+    """Tests that artifact groups are collected and fail separately."""
+    self.mock_grr_api.SearchClients.return_value = \
+        mock_grr_hosts.MOCK_CLIENT_LIST
+    mock_LaunchFlow.side_effect = lambda client, name, args: (
+        'F:2' if 'WindowsSearchDatabase' in args.artifact_list else 'F:1')
+
+    def _AwaitFlow(unused_client, flow_id):
+      if flow_id == 'F:2':
+        raise DFTimewolfError('F:2: FAILED! Message from GRR:\nTimeout')
+    mock_AwaitFlow.side_effect = _AwaitFlow
+    mock_DownloadFiles.side_effect = (
+        lambda client, flow_id, output_directory=None: output_directory)
+
+    self.grr_artifact_collector.artifacts = [
+        'WindowsSearchDatabase', 'RandomArtifact', 'AnotherArtifact']
+    self.grr_artifact_collector.max_artifact_flows = 2
+    self.grr_artifact_collector.Process()
+
+    self.assertEqual(mock_LaunchFlow.call_count, 2)
+    mock_DownloadFiles.assert_called_once_with(
+        mock_grr_hosts.MOCK_CLIENT_LIST[1], 'F:1',
+        output_directory=os.path.join(
+            self.grr_artifact_collector.output_path, 'tomchop.0'))
+    results = self.test_state.GetContainers(containers.File)
+    self.assertEqual(len(results), 1)
+    self.assertEqual(results[0].name, 'tomchop')
+    self.assertEqual(len(self.test_state.errors), 1)
+    self.assertFalse(self.test_state.errors[0].critical)
+    self.assertIn(
+        'collection of WindowsSearchDatabase failed',
+        self.test_state.errors[0].message)
+
 
 class GRRFileCollectorTest(unittest.TestCase):
   """Tests for the GRR file collector."""
 
-  @mock.patch('grr_api_client.api.InitHttp')
+  @mock.patch('dftimewolf.lib.collectors.grr_connection.InitHttp')
   def setUp(self, mock_InitHttp):
     self.mock_grr_api = mock.Mock()
     mock_InitHttp.return_value = self.mock_grr_api
@@ -300,7 +511,7 @@ class GRRFileCollectorTest(unittest.TestCase):
 class GRRFlowCollector(unittest.TestCase):
   """Tests for the GRR flow collector."""
 
-  @mock.patch('grr_api_client.api.InitHttp')
+  @mock.patch('dftimewolf.lib.collectors.grr_connection.InitHttp')
   def setUp(self, mock_InitHttp):
     self.mock_grr_api = mock.Mock()
     mock_InitHttp.return_value = self.mock_grr_api
@@ -336,7 +547,7 @@ class GRRFlowCollector(unittest.TestCase):
 class GRRTimelineCollector(unittest.TestCase):
   """Tests for the GRR flow collector."""
 
-  @mock.patch('grr_api_client.api.InitHttp')
+  @mock.patch('dftimewolf.lib.collectors.grr_connection.InitHttp')
   def setUp(self, mock_InitHttp):
     self.mock_grr_api = mock.Mock()
     mock_InitHttp.return_value = self.mock_grr_api
@@ -359,9 +570,45 @@ class GRRTimelineCollector(unittest.TestCase):
     self.assertIsNotNone(self.grr_timeline_collector)
     self.assertEqual(self.grr_timeline_collector.hostnames,
                      ['tomchop'])
-    self.assertEqual(self.grr_timeline_collector.root_path, b'/')
+    self.assertEqual(self.grr_timeline_collector.root_paths, [b'/'])
     self.assertEqual(self.grr_timeline_collector._timeline_format, 1)
 
+  @mock.patch('dftimewolf.lib.collectors.grr_hosts.'
+              'GRRTimelineCollector._ListDirectory')
+  def testGetRootPaths(self, mock_ListDirectory):
+    """Tests that the root directory is split by subdirectory."""
+    directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, directory)
+    self.grr_timeline_collector.output_path = directory
+    self.assertEqual(
+        self.grr_timeline_collector._GetRootPaths(mock_grr_hosts.MOCK_CLIENT),
+        ([b'/'], None))
+    mock_ListDirectory.assert_not_called()
+
+    self.grr_timeline_collector.root_paths = []
+    mock_ListDirectory.return_value = [
+        jobs_pb2.StatEntry(
+            pathspec=jobs_pb2.PathSpec(path=path), st_mode=mode, st_mtime=10)
+        for path, mode in (
+            ('/etc', 0o40755), ('/proc', 0o40555), ('/vmlinuz', 0o120777))]
+    root_paths, root_timeline_path = (
+        self.grr_timeline_collector._GetRootPaths(mock_grr_hosts.MOCK_CLIENT))
+    mock_ListDirectory.assert_called_once_with(
+        mock_grr_hosts.MOCK_CLIENT, '/')
+    self.assertEqual(root_paths, [b'/etc', b'/proc'])
+    self.assertEqual(
+        root_timeline_path,
+        os.path.join(directory, 'C.0000000000000000_root.body'))
+    with open(root_timeline_path, 'r') as file_object:
+      self.assertEqual(
+          file_object.read(), '0|/vmlinuz|0|lrwxrwxrwx|0|0|0|0|10|0|0\n')
+
+    # The root directory is collected at once if it cannot be listed.
+    mock_ListDirectory.side_effect = DFTimewolfError('Unable to list /')
+    self.assertEqual(
+        self.grr_timeline_collector._GetRootPaths(mock_grr_hosts.MOCK_CLIENT),
+        ([b'/'], None))
+
   @mock.patch('dftimewolf.lib.collectors.grr_hosts.'
               'GRRTimelineCollector._DownloadTimeline')
   # mock grr_api_client.flow.FlowBase.GetCollectedTimeline instead once when it
@@ -384,5 +631,51 @@ class GRRTimelineCollector(unittest.TestCase):
     self.assertEqual(result.name, 'tomchop')
     self.assertEqual(result.path, '/tmp/something')
 
+  @mock.patch('dftimewolf.lib.collectors.grr_hosts.'
+              'GRRTimelineCollector._DownloadTimeline')
+  @mock.patch('dftimewolf.lib.collectors.grr_hosts.GRRFlow._AwaitFlow')
+  @mock.patch('dftimewolf.lib.collectors.grr_hosts.GRRFlow._LaunchFlow')
+  def testProcessMultipleRoots(
+      self, mock_LaunchFlow, mock_AwaitFlow, mock_DownloadTimeline):
+    """Tests that the timelines of several root paths are merged."""
+    directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, directory)
+    self.grr_timeline_collector.output_path = directory
+    self.grr_timeline_collector.root_paths = [b'/etc', b'/var', b'/missing']
+    self.mock_grr_api.SearchClients.return_value = \
+        mock_grr_hosts.MOCK_CLIENT_LIST
+
+    flow_ids = {b'/etc': 'F:1', b'/var': 'F:2', b'/missing': 'F:3'}
+    mock_LaunchFlow.side_effect = (
+        lambda client, name, args: flow_ids[args.root])
+    def _AwaitFlow(client, flow_id):
+      if flow_id == 'F:3':
+        raise DFTimewolfError('F:3: FAILED! Message from GRR:\nNot found')
+    mock_AwaitFlow.side_effect = _AwaitFlow
+    def _DownloadTimeline(client, flow_id):
+      path = os.path.join(directory, flow_id + '.body')
+      mtime = 20 if flow_id == 'F:1' else 10
+      with open(path, 'w') as file_object:
+        file_object.write(
+            '0|/{0:s}|1|-rw-r--r--|0|0|10|{1:d}|{1:d}|{1:d}|0\n'.format(
+                flow_id, mtime))
+      return path
+    mock_DownloadTimeline.side_effect = _DownloadTimeline
+
+    self.grr_timeline_collector.Process()
+    self.assertEqual(mock_LaunchFlow.call_count, 3)
+    results = self.test_state.GetContainers(containers.File)
+    self.assertEqual(len(results), 1)
+    self.assertEqual(results[0].name, 'tomchop')
+    self.assertEqual(
+        results[0].path, os.path.join(directory, 'C.0000000000000001.body'))
+    with open(results[0].path, 'r') as file_object:
+      self.assertEqual(
+          [line.split('|')[1] for line in file_object], ['/F:1', '/F:2'])
+    self.assertEqual(sorted(os.listdir(directory)), ['C.0000000000000001.body'])
+    self.assertEqual(len(self.test_state.errors), 1)
+    self.assertIn('/missing', self.test_state.errors[0].message)
+    self.assertFalse(self.test_state.errors[0].critical)
+
 if __name__ == '__main__':
   unittest.main()
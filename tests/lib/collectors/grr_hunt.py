@@ -2,25 +2,143 @@
 # -*- coding: utf-8 -*-
 """Tests the GRR hunt collectors."""
 
+import errno
+import io
+import itertools
+import os
+import shutil
+import tempfile
 import unittest
 import zipfile
+import zlib
 import mock
+import requests
 
+from grr_api_client import errors as grr_errors
 from grr_response_proto import flows_pb2
+from grr_response_proto import jobs_pb2
+from grr_response_proto.api import hunt_pb2
 
 from dftimewolf import config
 from dftimewolf.lib import state
 from dftimewolf.lib import errors
 from dftimewolf.lib.collectors import grr_hunt
+from dftimewolf.lib.containers import containers
 from tests.lib.collectors.test_data import mock_grr_hosts
 
 
+_RESULT_TIMESTAMPS = itertools.count(1600000000000000)
+
+
+def _CreateHuntResult(client_id, path):
+  """Creates the result of a hunt that collected a file.
+
+  Every result gets its own timestamp, like results of a GRR server.
+
+  Args:
+    client_id (str): GRR client identifier.
+    path (str): path of the file on the client.
+
+  Returns:
+    hunt_pb2.ApiHuntResult: hunt result.
+  """
+  payload = flows_pb2.FileFinderResult(stat_entry=jobs_pb2.StatEntry(
+      pathspec=jobs_pb2.PathSpec(pathtype=jobs_pb2.PathSpec.OS, path=path),
+      st_mode=0o100644))
+  result = hunt_pb2.ApiHuntResult(
+      client_id='aff4:/{0:s}'.format(client_id),
+      timestamp=next(_RESULT_TIMESTAMPS))
+  result.payload.Pack(payload)
+  return result
+
+
+class _FakeHuntAPI(object):
+  """Serves the clients, results and files of a mock hunt.
+
+  Attributes:
+    client_offsets (list[int]): offset of each completed clients listing.
+    clients (list[hunt_pb2.ApiHuntClient]): clients that completed the hunt.
+    file_requests (list[tuple[str, str]]): client identifier and VFS path of
+        each file requested.
+    result_offsets (list[int]): offset of each results listing.
+    results (list[hunt_pb2.ApiHuntResult]): results of the hunt.
+  """
+
+  def __init__(self, mock_hunt, mock_grr_api, fqdns, failing_client_ids=()):
+    """Initializes a fake hunt API.
+
+    Args:
+      mock_hunt (mock.Mock): GRR hunt object.
+      mock_grr_api (mock.Mock): GRR API object.
+      fqdns (dict[str, str]): FQDN per GRR client identifier.
+      failing_client_ids (Optional[list[str]]): identifiers of the clients
+          whose files cannot be fetched.
+    """
+    super(_FakeHuntAPI, self).__init__()
+    self._failing_client_ids = failing_client_ids
+    self._fqdns = fqdns
+    self.client_offsets = []
+    self.clients = []
+    self.file_requests = []
+    self.result_offsets = []
+    self.results = []
+    # pylint: disable=protected-access
+    mock_hunt._context.SendIteratorRequest.side_effect = self._ListItems
+    mock_hunt._context.SendStreamingRequest.side_effect = self._GetFile
+    mock_grr_api.Client.side_effect = self._GetClient
+
+  def AddClient(self, client_id):
+    """Marks a client as having completed the hunt.
+
+    Args:
+      client_id (str): GRR client identifier.
+    """
+    self.clients.append(
+        hunt_pb2.ApiHuntClient(client_id=client_id, flow_id='12345'))
+
+  def _ListItems(self, handler_name, args):
+    """Lists the completed clients or the results of the hunt."""
+    if handler_name == 'ListHuntClients':
+      assert args.client_status == hunt_pb2.ApiListHuntClientsArgs.COMPLETED
+      self.client_offsets.append(args.offset)
+      return iter(self.clients[args.offset:])
+
+    assert handler_name == 'ListHuntResults'
+    self.result_offsets.append(args.offset)
+    return iter(self.results[args.offset:])
+
+  def _GetFile(self, handler_name, args):
+    """Returns the chunks of a file collected by the hunt.
+
+    As on a GRR server, the file is found by the timestamp of the result that
+    collected it.
+    """
+    assert handler_name == 'GetHuntFile'
+    self.file_requests.append((args.client_id, args.vfs_path))
+    if args.client_id in self._failing_client_ids:
+      raise grr_errors.ResourceNotFoundError('File not found')
+    for result in self.results:
+      payload = flows_pb2.FileFinderResult()
+      result.payload.Unpack(payload)
+      vfs_path = 'fs/os' + payload.stat_entry.pathspec.path
+      if (result.client_id == 'aff4:/{0:s}'.format(args.client_id) and
+          result.timestamp == args.timestamp and vfs_path == args.vfs_path):
+        return [b'root']
+    raise grr_errors.ResourceNotFoundError('File not found')
+
+  def _GetClient(self, client_id):
+    """Returns a GRR client object."""
+    grr_client = mock.Mock()
+    grr_client.Get.return_value.data.os_info.fqdn = self._fqdns[client_id]
+    return grr_client
+
+
 # Mocking of classes.
 # pylint: disable=invalid-name,arguments-differ
 class GRRHuntArtifactCollectorTest(unittest.TestCase):
   """Tests for the GRR artifact collector."""
 
-  @mock.patch('grr_api_client.api.InitHttp')
+  @mock.patch('dftimewolf.lib.collectors.grr_connection.InitHttp')
   def setUp(self, mock_InitHttp):
     self.mock_grr_api = mock.Mock()
     mock_InitHttp.return_value = self.mock_grr_api
@@ -49,11 +167,72 @@ class GRRHuntArtifactCollectorTest(unittest.TestCase):
     self.assertEqual(call_kwargs['hunt_runner_args'].description,
                      'random reason')
 
+  @mock.patch('time.sleep')
+  def testProcessFollow(self, mock_sleep):
+    """Tests that the results of clients are fetched as they complete."""
+    directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, directory)
+    self.grr_hunt_artifact_collector.output_path = directory
+    self.grr_hunt_artifact_collector.follow_timeout = 600
+    mock_hunt = self.mock_grr_api.CreateHunt.return_value
+    mock_hunt.hunt_id = 'H:12345'
+    mock_hunt.Get.side_effect = [
+        mock.Mock(data=hunt_pb2.ApiHunt(
+            state=hunt_pb2.ApiHunt.STARTED, all_clients_count=3,
+            completed_clients_count=count))
+        for count in (1, 2)] + [
+            mock.Mock(data=hunt_pb2.ApiHunt(
+                state=hunt_pb2.ApiHunt.COMPLETED, all_clients_count=3,
+                completed_clients_count=3))]
+    hunt_api = _FakeHuntAPI(mock_hunt, self.mock_grr_api, {
+        'C.0000000000000001': 'host1', 'C.0000000000000002': 'host2',
+        'C.0000000000000003': 'host3'})
+    hunt_api.AddClient('C.0000000000000001')
+    hunt_api.results = [
+        _CreateHuntResult('C.0000000000000001', '/etc/passwd'),
+        _CreateHuntResult('C.0000000000000002', '/etc/passwd')]
+
+    def _Sleep(_):
+      if len(hunt_api.clients) == 1:
+        hunt_api.AddClient('C.0000000000000002')
+        hunt_api.results.append(
+            _CreateHuntResult('C.0000000000000002', '/etc/shadow'))
+      else:
+        # A client listed before the clients of the previous checks.
+        hunt_api.clients.insert(0, hunt_pb2.ApiHuntClient(
+            client_id='C.0000000000000003', flow_id='12345'))
+        hunt_api.results.append(
+            _CreateHuntResult('C.0000000000000003', '/etc/passwd'))
+
+    mock_sleep.side_effect = _Sleep
+
+    self.grr_hunt_artifact_collector.Process()
+    self.assertEqual(mock_sleep.call_count, 2)
+    mock_sleep.assert_called_with(60)
+    # Each check only lists the new clients and results, and all the clients
+    # are listed again once the hunt ended.
+    self.assertEqual(hunt_api.client_offsets, [0, 1, 0])
+    self.assertEqual(hunt_api.result_offsets, [0, 2, 3])
+    self.assertEqual(sorted(hunt_api.file_requests), [
+        ('C.0000000000000001', 'fs/os/etc/passwd'),
+        ('C.0000000000000002', 'fs/os/etc/passwd'),
+        ('C.0000000000000002', 'fs/os/etc/shadow'),
+        ('C.0000000000000003', 'fs/os/etc/passwd')])
+    results = self.test_state.GetContainers(containers.File)
+    self.assertEqual(
+        [(result.name, result.path) for result in results],
+        [('host1', os.path.join(directory, 'hunt_H_12345',
+                                'C.0000000000000001')),
+         ('host2', os.path.join(directory, 'hunt_H_12345',
+                                'C.0000000000000002')),
+         ('host3', os.path.join(directory, 'hunt_H_12345',
+                                'C.0000000000000003'))])
+
 
 class GRRHuntFileCollectorTest(unittest.TestCase):
   """Tests for the GRR file collector."""
 
-  @mock.patch('grr_api_client.api.InitHttp')
+  @mock.patch('dftimewolf.lib.collectors.grr_connection.InitHttp')
   def setUp(self, mock_InitHttp):
     self.mock_grr_api = mock.Mock()
     mock_InitHttp.return_value = self.mock_grr_api
@@ -88,13 +267,31 @@ class GRRHuntFileCollectorTest(unittest.TestCase):
     self.assertEqual(call_kwargs['flow_name'], 'FileFinder')
     self.assertEqual(call_kwargs['hunt_runner_args'].description,
                      'random reason')
+    self.mock_grr_api.CreateHunt.return_value.Get.assert_not_called()
+
+  @mock.patch.object(grr_hunt, 'time')
+  def testProcessFollowTimeout(self, mock_time):
+    """Tests that running hunts are followed until the timeout."""
+    self.grr_hunt_file_collector.follow_timeout = 60
+    mock_time.time.side_effect = [0, 30, 60]
+    mock_hunt = self.mock_grr_api.CreateHunt.return_value
+    mock_hunt.hunt_id = 'H:12345'
+    mock_hunt.Get.return_value.data = hunt_pb2.ApiHunt(
+        state=hunt_pb2.ApiHunt.STARTED)
+    hunt_api = _FakeHuntAPI(mock_hunt, self.mock_grr_api, {})
+
+    self.grr_hunt_file_collector.Process()
+    mock_time.sleep.assert_called_once_with(30)
+    self.assertEqual(hunt_api.client_offsets, [0, 0])
+    self.assertEqual(hunt_api.result_offsets, [])
+    self.assertEqual(self.test_state.GetContainers(containers.File), [])
 
 
 
 class GRRFHuntDownloader(unittest.TestCase):
   """Tests for the GRR hunt downloader."""
 
-  @mock.patch('grr_api_client.api.InitHttp')
+  @mock.patch('dftimewolf.lib.collectors.grr_connection.InitHttp')
   def setUp(self, mock_InitHttp):
     self.mock_grr_api = mock.Mock()
     mock_InitHttp.return_value = self.mock_grr_api
@@ -109,6 +306,8 @@ class GRRFHuntDownloader(unittest.TestCase):
         approvers='approver1,approver2'
     )
     self.grr_hunt_downloader.output_path = '/tmp/test'
+    self._directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self._directory)
 
   def testInitialization(self):
     """Tests that the collector is correctly initialized."""
@@ -127,51 +326,269 @@ class GRRFHuntDownloader(unittest.TestCase):
                                               '/tmp/test/H:12345.zip')
     mock_ExtractHuntResults.assert_called_with('/tmp/test/H:12345.zip')
 
+  def testProcessIncremental(self):
+    """Tests that only the results of new clients are fetched."""
+    self.grr_hunt_downloader.incremental = True
+    self.grr_hunt_downloader.output_path = self._directory
+    mock_hunt = self.mock_grr_api.Hunt.return_value.Get.return_value
+    mock_hunt.hunt_id = 'H:12345'
+    hunt_api = _FakeHuntAPI(mock_hunt, self.mock_grr_api, {
+        'C.0000000000000001': 'host1', 'C.0000000000000002': 'host2',
+        'C.0000000000000003': 'host3'},
+                            failing_client_ids=['C.0000000000000003'])
+    hunt_api.results = [
+        _CreateHuntResult('C.0000000000000001', '/etc/passwd')]
+    hunt_api.AddClient('C.0000000000000001')
+    self.grr_hunt_downloader.Process()
+
+    client_directory = os.path.join(
+        self._directory, 'hunt_H_12345', 'C.0000000000000001')
+    results = self.test_state.GetContainers(containers.File)
+    self.assertEqual(
+        [(result.name, result.path) for result in results],
+        [('host1', client_directory)])
+    self.assertTrue(os.path.isfile(os.path.join(
+        client_directory, 'fs', 'os', 'etc', 'passwd')))
+
+    # A later run only fetches the results of the new client.
+    test_state = state.DFTimewolfState(config.Config)
+    self.grr_hunt_downloader.state = test_state
+    hunt_api.results.extend([
+        _CreateHuntResult('C.0000000000000002', '/etc/passwd'),
+        _CreateHuntResult('C.0000000000000003', '/etc/passwd')])
+    hunt_api.AddClient('C.0000000000000002')
+    hunt_api.AddClient('C.0000000000000003')
+    self.grr_hunt_downloader.Process()
+
+    self.assertEqual(
+        [client_id for client_id, _ in hunt_api.file_requests].count(
+            'C.0000000000000001'), 1)
+    results = test_state.GetContainers(containers.File)
+    self.assertEqual([result.name for result in results], ['host2'])
+    self.assertEqual(len(test_state.errors), 1)
+    self.assertFalse(test_state.errors[0].critical)
+    self.assertFalse(os.path.exists(os.path.join(
+        self._directory, 'hunt_H_12345', 'C.0000000000000003')))
+
+    # pylint: disable=protected-access
+    manifest = self.grr_hunt_downloader._ReadManifest(os.path.join(
+        self._directory, 'H:12345.manifest.jsonl'))
+    self.assertEqual(
+        sorted(manifest), ['C.0000000000000001', 'C.0000000000000002'])
+
+  def testDownloadClientResultsHuntApproval(self):
+    """Tests that client results are fetched with the hunt's approval."""
+    self.grr_hunt_downloader.output_path = self._directory
+    # pylint: disable=protected-access
+    self.grr_hunt_downloader._CHECK_APPROVAL_INTERVAL_SEC = 0
+    mock_hunt = mock.Mock(hunt_id='H:12345')
+    hunt_api = _FakeHuntAPI(
+        mock_hunt, self.mock_grr_api, {'C.0000000000000001': 'host1'})
+    denials = [grr_errors.AccessForbiddenError('No approval')]
+    get_file = mock_hunt._context.SendStreamingRequest.side_effect
+
+    def _GetFileWithApproval(handler_name, args):
+      if denials:
+        raise denials.pop()
+      return get_file(handler_name, args)
+
+    mock_hunt._context.SendStreamingRequest.side_effect = _GetFileWithApproval
+    hunt_api.results = [
+        _CreateHuntResult('C.0000000000000001', '/etc/passwd'),
+        _CreateHuntResult('C.0000000000000001', '/etc')]
+    hunt_api.results[1].payload.Pack(
+        flows_pb2.FileFinderResult(stat_entry=jobs_pb2.StatEntry(
+            pathspec=jobs_pb2.PathSpec(
+                pathtype=jobs_pb2.PathSpec.OS, path='/etc'),
+            st_mode=0o40755)))
+    results_per_client = {'C.0000000000000001': hunt_api.results}
+
+    fqdn = self.grr_hunt_downloader._DownloadClientResults(
+        mock_hunt, results_per_client,
+        mock.Mock(client_id='C.0000000000000001'))
+    self.assertEqual(fqdn, 'host1')
+    self.assertEqual(hunt_api.file_requests, [
+        ('C.0000000000000001', 'fs/os/etc/passwd')])
+    self.assertEqual(mock_hunt._context.SendStreamingRequest.call_count, 2)
+    mock_hunt.CreateApproval.assert_called_once()
+    self.mock_grr_api.Client.return_value.CreateApproval.assert_not_called()
+    self.assertTrue(os.path.isfile(os.path.join(
+        self._directory, 'hunt_H_12345', 'C.0000000000000001', 'fs', 'os',
+        'etc', 'passwd')))
+
+  def testGetResultVFSPath(self):
+    """Tests that VFS paths are determined from hunt results."""
+    # pylint: disable=protected-access
+    get_vfs_path = self.grr_hunt_downloader._GetResultVFSPath
+    self.assertEqual(
+        get_vfs_path(_CreateHuntResult('C.0000000000000001', '/etc/passwd')),
+        'fs/os/etc/passwd')
+
+    result = hunt_pb2.ApiHuntResult(client_id='C.0000000000000001')
+    result.payload.Pack(jobs_pb2.StatEntry(pathspec=jobs_pb2.PathSpec(
+        pathtype=jobs_pb2.PathSpec.OS, path='/dev/sda1',
+        nested_path=jobs_pb2.PathSpec(
+            pathtype=jobs_pb2.PathSpec.TSK, path='/etc/shadow'))))
+    self.assertEqual(get_vfs_path(result), 'fs/tsk/dev/sda1/etc/shadow')
+
+    result.payload.Pack(jobs_pb2.StatEntry(
+        pathspec=jobs_pb2.PathSpec(pathtype=jobs_pb2.PathSpec.OS, path='/etc'),
+        st_mode=0o40755))
+    self.assertIsNone(get_vfs_path(result))
+
+    result.payload.Pack(flows_pb2.FileFinderResult())
+    self.assertIsNone(get_vfs_path(result))
+
+  def testGetAndWriteArchive(self):
+    """Tests that interrupted hunt archive downloads are retried."""
+    output_file_path = os.path.join(self._directory, 'H:12345.zip')
+    partial_path = output_file_path + '.part'
+
+    def _InterruptedStream():
+      yield b'partial '
+      self.assertTrue(os.path.exists(partial_path))
+      self.assertFalse(os.path.exists(output_file_path))
+      raise requests.exceptions.ChunkedEncodingError('Connection reset')
+
+    mock_hunt = mock.Mock()
+    mock_hunt.GetFilesArchive.side_effect = [
+        _InterruptedStream(), [b'hunt ', b'archive']]
+    # pylint: disable=protected-access
+    self.grr_hunt_downloader._GetAndWriteArchive(mock_hunt, output_file_path)
+    self.assertEqual(mock_hunt.GetFilesArchive.call_count, 2)
+    with open(output_file_path, 'rb') as file_object:
+      self.assertEqual(file_object.read(), b'hunt archive')
+    self.assertEqual(os.listdir(self._directory), ['H:12345.zip'])
+
+    mock_hunt.GetFilesArchive.reset_mock()
+    mock_hunt.GetFilesArchive.side_effect = requests.exceptions.ConnectionError(
+        'Connection reset')
+    with self.assertRaises(requests.exceptions.ConnectionError):
+      self.grr_hunt_downloader._GetAndWriteArchive(
+          mock_hunt, os.path.join(self._directory, 'H:67890.zip'))
+    self.assertEqual(mock_hunt.GetFilesArchive.call_count, 5)
+    self.assertEqual(os.listdir(self._directory), ['H:12345.zip'])
+
+    # Local I/O errors are not retried.
+    mock_hunt.GetFilesArchive.reset_mock()
+    mock_hunt.GetFilesArchive.side_effect = OSError(
+        errno.ENOSPC, 'No space left on device')
+    with self.assertRaises(OSError):
+      self.grr_hunt_downloader._GetAndWriteArchive(
+          mock_hunt, os.path.join(self._directory, 'H:67890.zip'))
+    mock_hunt.GetFilesArchive.assert_called_once()
+    self.assertEqual(os.listdir(self._directory), ['H:12345.zip'])
+
+  @mock.patch('dftimewolf.lib.collectors.grr_hunt.GRRHuntDownloader._ExtractHuntResults')  # pylint: disable=line-too-long
+  @mock.patch('dftimewolf.lib.collectors.grr_hunt.GRRHuntDownloader._GetAndWriteArchive')  # pylint: disable=line-too-long
+  def testCollectHuntResultsDownloadError(
+      self, mock_get_write_archive, mock_ExtractHuntResults):
+    """Tests that errors writing the hunt archive are reported."""
+    self.grr_hunt_downloader.output_path = self._directory
+    mock_get_write_archive.side_effect = OSError(
+        errno.ENOSPC, 'No space left on device')
+    # pylint: disable=protected-access
+    with self.assertRaises(errors.DFTimewolfError) as error:
+      self.grr_hunt_downloader._CollectHuntResults(mock_grr_hosts.MOCK_HUNT)
+    self.assertTrue(error.exception.critical)
+    self.assertIn('No space left on device', error.exception.message)
+    mock_ExtractHuntResults.assert_not_called()
+
   @mock.patch('os.remove')
   @mock.patch('zipfile.ZipFile.extract')
   def testExtractHuntResults(self, _, mock_remove):
     """Tests that hunt results are correctly extracted."""
-    self.grr_hunt_downloader.output_path = '/directory'
+    self.grr_hunt_downloader.output_path = self._directory
     expected = sorted([
         ('greendale-student04.c.greendale.internal',
-         '/directory/hunt_H_A43ABF9D/C.4c4223a2ea9cf6f1'),
+         self._directory + '/hunt_H_A43ABF9D/C.4c4223a2ea9cf6f1'),
         ('greendale-admin.c.greendale.internal',
-         '/directory/hunt_H_A43ABF9D/C.ba6b63df5d330589'),
+         self._directory + '/hunt_H_A43ABF9D/C.ba6b63df5d330589'),
         ('greendale-student05.c.greendale.internal',
-         '/directory/hunt_H_A43ABF9D/C.fc693a148af801d5')
+         self._directory + '/hunt_H_A43ABF9D/C.fc693a148af801d5')
     ])
     test_zip = 'tests/lib/collectors/test_data/hunt.zip'
     # pylint: disable=protected-access
     result = sorted(self.grr_hunt_downloader._ExtractHuntResults(test_zip))
     self.assertEqual(result, expected)
     mock_remove.assert_called_with('tests/lib/collectors/test_data/hunt.zip')
+    stored = sorted(
+        (container.name, container.path)
+        for container in self.test_state.GetContainers(containers.File))
+    self.assertEqual(stored, expected)
+
+  @mock.patch('os.remove')
+  @mock.patch('zipfile.ZipFile.extract')
+  def testPartialExtractHuntResults(self, mock_extract, mock_remove):
+    """Tests that clients whose results cannot be extracted are reported."""
+    self.grr_hunt_downloader.output_path = self._directory
+    test_zip = 'tests/lib/collectors/test_data/hunt.zip'
+    def _Extract(member, _):
+      if 'C.ba6b63df5d330589' in member.filename:
+        raise OSError('Disk full')
+    mock_extract.side_effect = _Extract
+    # pylint: disable=protected-access
+
+    result = self.grr_hunt_downloader._ExtractHuntResults(test_zip)
+    self.assertEqual(
+        sorted(fqdn for fqdn, _ in result),
+        ['greendale-student04.c.greendale.internal',
+         'greendale-student05.c.greendale.internal'])
+    self.assertEqual(1, len(self.test_state.errors))
+    self.assertEqual(
+        self.test_state.errors[0].message,
+        'Could not extract results of client C.ba6b63df5d330589: Disk full')
+    self.assertFalse(self.test_state.errors[0].critical)
+    mock_remove.assert_not_called()
+
+  @mock.patch('os.remove')
+  @mock.patch('zipfile.ZipFile.extract')
+  def testCorruptExtractHuntResults(self, mock_extract, mock_remove):
+    """Tests that clients with corrupt results do not stop the others."""
+    self.grr_hunt_downloader.output_path = self._directory
+    test_zip = 'tests/lib/collectors/test_data/hunt.zip'
+    def _Extract(member, _):
+      if 'C.ba6b63df5d330589' in member.filename:
+        raise zlib.error('Error -3 while decompressing data')
+    mock_extract.side_effect = _Extract
+    # pylint: disable=protected-access
+
+    result = self.grr_hunt_downloader._ExtractHuntResults(test_zip)
+    self.assertEqual(len(result), 2)
+    self.assertEqual(1, len(self.test_state.errors))
+    self.assertEqual(
+        self.test_state.errors[0].message,
+        'Could not extract results of client C.ba6b63df5d330589: '
+        'Error -3 while decompressing data')
+    self.assertFalse(self.test_state.errors[0].critical)
+    mock_remove.assert_not_called()
 
   @mock.patch('os.remove')
   @mock.patch('zipfile.ZipFile.extract')
   def testOSErrorExtractHuntResults(self, mock_extract, mock_remove):
     """Tests that an OSError when reading files generate errors."""
-    self.grr_hunt_downloader.output_path = '/directory'
+    self.grr_hunt_downloader.output_path = self._directory
     test_zip = 'tests/lib/collectors/test_data/hunt.zip'
     mock_extract.side_effect = OSError
     # pylint: disable=protected-access
 
     with self.assertRaises(errors.DFTimewolfError) as error:
       self.grr_hunt_downloader._ExtractHuntResults(test_zip)
-    self.assertEqual(1, len(self.test_state.errors))
+    self.assertEqual(4, len(self.test_state.errors))
     self.assertEqual(
         error.exception.message,
-        'Error manipulating file tests/lib/collectors/test_data/hunt.zip: ')
+        'Nothing was extracted from the hunt archive')
     self.assertTrue(error.exception.critical)
     mock_remove.assert_not_called()
 
   @mock.patch('os.remove')
-  @mock.patch('zipfile.ZipFile.extract')
-  def testBadZipFileExtractHuntResults(self, mock_extract, mock_remove):
+  def testBadZipFileExtractHuntResults(self, mock_remove):
     """Tests that a BadZipFile error when reading files generate errors."""
-    self.grr_hunt_downloader.output_path = '/directory'
-    test_zip = 'tests/lib/collectors/test_data/hunt.zip'
+    self.grr_hunt_downloader.output_path = self._directory
+    test_zip = os.path.join(self._directory, 'hunt.zip')
+    with open(test_zip, 'wb') as file_object:
+      file_object.write(b'not a zip file')
 
-    mock_extract.side_effect = zipfile.BadZipfile
     # pylint: disable=protected-access
     with self.assertRaises(errors.DFTimewolfError) as error:
       self.grr_hunt_downloader._ExtractHuntResults(test_zip)
@@ -179,10 +596,9 @@ class GRRFHuntDownloader(unittest.TestCase):
     self.assertEqual(1, len(self.test_state.errors))
     self.assertEqual(
         error.exception.message,
-        'Bad zipfile tests/lib/collectors/test_data/hunt.zip: ')
+        'Bad zipfile {0:s}: File is not a zip file'.format(test_zip))
     self.assertTrue(error.exception.critical)
     mock_remove.assert_not_called()
 
-
 if __name__ == '__main__':
   unittest.main()
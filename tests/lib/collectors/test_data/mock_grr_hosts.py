@@ -59,6 +59,19 @@ MOCK_CLIENT_LIST = [
     MOCK_CLIENT_RECENT
 ]
 
+MOCK_DOMAIN_CLIENT_LIST = []
+for _client_id, _fqdn, _proto in [
+    ('C.0000000000000002', 'host1.example.com', client_proto1),
+    ('C.0000000000000003', 'host1.example.com', client_proto2),
+    ('C.0000000000000004', 'host2.example.com', client_proto1),
+    ('C.0000000000000005', 'host3.example.com', client_proto1)]:
+  _client_data = text_format.Parse(_proto, client_pb2.ApiClient())
+  _client_data.urn = 'aff4:/{0:s}'.format(_client_id)
+  _client_data.client_id = _client_id
+  _client_data.os_info.fqdn = _fqdn
+  MOCK_DOMAIN_CLIENT_LIST.append(
+      client.Client(data=_client_data, context=True))
+
 MOCK_CLIENT_REF = client.ClientRef(MOCK_CLIENT.client_id, context=True)
 
 flow_pb_terminated = flow_pb2.ApiFlow(
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for the SQLite spilling container store."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from dftimewolf.lib.containers import containers
+from dftimewolf.lib.containers import sqlite_store
+
+
+class SQLiteContainerStoreTest(unittest.TestCase):
+  """Tests for the SQLiteContainerStore class."""
+
+  def setUp(self):
+    # pylint: disable=protected-access
+    self._store = sqlite_store.SQLiteContainerStore(max_containers=2)
+    self._store._READ_CHUNK_SIZE = 2
+
+  def tearDown(self):
+    self._store.Close()
+
+  def _AddFiles(self, number_of_files, prefix='host'):
+    """Adds file containers to the store."""
+    for index in range(number_of_files):
+      name = '{0:s}{1:d}'.format(prefix, index)
+      self._store.AddContainer(containers.File(name=name, path='/tmp/' + name))
+
+  def testNoSpill(self):
+    """Tests that containers stay in memory below the thresholds."""
+    test_file = containers.File(name='host', path='/tmp/host')
+    self._store.AddContainer(test_file)
+    self.assertEqual(self._store.GetContainers('file'), [test_file])
+    # pylint: disable=protected-access
+    self.assertIsNone(self._store._connection)
+
+  def testSpill(self):
+    """Tests that containers are spilled and read back lazily."""
+    self._AddFiles(5)
+    files = self._store.GetContainers('file')
+    self.assertIsInstance(files, sqlite_store.SQLiteContainerView)
+    self.assertEqual(len(files), 5)
+    self.assertEqual(
+        [container.name for container in files],
+        ['host0', 'host1', 'host2', 'host3', 'host4'])
+    self.assertIsInstance(files[3], containers.File)
+    self.assertEqual(files[3].path, '/tmp/host3')
+    self.assertEqual(files[-1].name, 'host4')
+    self.assertEqual(
+        [container.name for container in files[1:3]], ['host1', 'host2'])
+
+    by_name = self._store.GetContainersByAttribute('file', 'name', 'host2')
+    self.assertEqual(len(by_name), 1)
+    self.assertEqual(by_name[0].path, '/tmp/host2')
+
+  def testSlice(self):
+    """Tests that slices of spilled containers only read the rows needed."""
+    self._AddFiles(6)
+    files = self._store.GetContainers('file')
+    self.assertEqual(
+        [container.name for container in files[::2]],
+        ['host0', 'host2', 'host4'])
+    self.assertEqual(
+        [container.name for container in files[4:1:-2]], ['host4', 'host2'])
+    self.assertEqual(
+        [container.name for container in files[::-1]],
+        ['host5', 'host4', 'host3', 'host2', 'host1', 'host0'])
+    self.assertEqual(files[4:2], [])
+
+    # pylint: disable=protected-access
+    with mock.patch.object(
+        self._store, 'ReadRows', wraps=self._store.ReadRows) as mock_read:
+      self.assertEqual(
+          [container.name for container in files[-2:]], ['host4', 'host5'])
+      mock_read.assert_called_once_with(
+          'file', files._first_row, files._last_row, limit=2, offset=4)
+
+  def testBackUpRestore(self):
+    """Tests that spilled containers are restored from a copy."""
+    directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, directory)
+    path = os.path.join(directory, 'backup.sqlite')
+
+    self.assertEqual(self._store.BackUp(path), {})
+    self.assertFalse(os.path.exists(path))
+
+    self._AddFiles(4)
+    self._store.GetContainers('file', pop=True)
+    self._AddFiles(3, prefix='new')
+    spilled_types = self._store.BackUp(path)
+    self.assertEqual(list(spilled_types), ['file'])
+
+    restored_store = sqlite_store.SQLiteContainerStore(max_containers=2)
+    self.addCleanup(restored_store.Close)
+    restored_store.Restore(path, spilled_types)
+    self._AddFiles(1, prefix='late')
+    restored_store.AddContainer(containers.File(name='added', path='/tmp/a'))
+    self.assertEqual(
+        [container.name for container in restored_store.GetContainers('file')],
+        ['new0', 'new1', 'new2', 'added'])
+    # pylint: disable=protected-access
+    self.assertNotEqual(restored_store._path, path)
+
+  def testPop(self):
+    """Tests that popped spilled containers are hidden from new views."""
+    self._AddFiles(4)
+    popped = self._store.GetContainers('file', pop=True)
+    self._AddFiles(1, prefix='new')
+    self.assertEqual(len(popped), 4)
+    self.assertEqual(
+        [container.name for container in self._store.GetContainers('file')],
+        ['new0'])
+
+  def testUnspillable(self):
+    """Tests that containers that cannot be serialized stay in memory."""
+    for _ in range(3):
+      self._store.AddContainer(containers.ForensicsVM(
+          name='vm', evidence_disk=lambda: None, platform='gcp'))
+    self.assertEqual(len(self._store.GetContainers('forensics_vm')), 3)
+
+  def testClose(self):
+    """Tests that the temporary SQLite file is removed on close."""
+    self._AddFiles(3)
+    # pylint: disable=protected-access
+    path = self._store._path
+    self.assertTrue(os.path.exists(path))
+    self._store.Close()
+    self.assertFalse(os.path.exists(path))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for the container store."""
+
+import unittest
+
+from dftimewolf.lib.containers import containers
+from dftimewolf.lib.containers import store
+
+
+class ContainerStoreTest(unittest.TestCase):
+  """Tests for the ContainerStore class."""
+
+  def testAddAndGetContainers(self):
+    """Tests that containers are grouped per type."""
+    container_store = store.ContainerStore()
+    test_file = containers.File(name='host1', path='/tmp/host1')
+    container_store.AddContainer(test_file)
+    container_store.AddContainer(
+        containers.Report(module_name='foo', text='bar'))
+
+    self.assertEqual(len(container_store), 2)
+    self.assertIn('file', container_store)
+    self.assertEqual(container_store.GetContainers('file'), [test_file])
+    self.assertEqual(len(container_store.GetContainers('url')), 0)
+
+  def testSnapshotViews(self):
+    """Tests that views are not affected by later changes to the store."""
+    container_store = store.ContainerStore()
+    first_file = containers.File(name='host1', path='/tmp/host1')
+    container_store.AddContainer(first_file)
+    view = container_store.GetContainers('file')
+    container_store.AddContainer(
+        containers.File(name='host2', path='/tmp/host2'))
+
+    self.assertEqual(len(view), 1)
+    self.assertEqual(list(view), [first_file])
+    self.assertEqual(view[-1], first_file)
+    with self.assertRaises(IndexError):
+      _ = view[1]
+    with self.assertRaises(TypeError):
+      view[0] = first_file  # pylint: disable=unsupported-assignment-operation
+
+  def testPop(self):
+    """Tests that popped containers are removed from the store."""
+    container_store = store.ContainerStore()
+    test_file = containers.File(name='host1', path='/tmp/host1')
+    container_store.AddContainer(test_file)
+    popped = container_store.GetContainers('file', pop=True)
+    container_store.AddContainer(
+        containers.File(name='host2', path='/tmp/host2'))
+
+    self.assertEqual(popped, [test_file])
+    self.assertEqual(len(container_store.GetContainers('file')), 1)
+    self.assertEqual(
+        len(container_store.GetContainersByAttribute('file', 'name', 'host1')),
+        0)
+
+  def testGetContainersByAttribute(self):
+    """Tests that containers can be looked up by attribute value."""
+    container_store = store.ContainerStore()
+    for index in range(10):
+      container_store.AddContainer(containers.TicketAttribute(
+          type_='text', name='attribute{0:d}'.format(index), value=index))
+
+    attributes = container_store.GetContainersByAttribute(
+        'ticketattribute', 'name', 'attribute3')
+    self.assertEqual(len(attributes), 1)
+    self.assertEqual(attributes[0].value, 3)
+
+    # Containers added after the index was built are indexed too.
+    container_store.AddContainer(containers.TicketAttribute(
+        type_='text', name='attribute3', value=42))
+    attributes = container_store.GetContainersByAttribute(
+        'ticketattribute', 'name', 'attribute3')
+    self.assertEqual([attribute.value for attribute in attributes], [3, 42])
+
+    self.assertEqual(len(container_store.GetContainersByAttribute(
+        'ticketattribute', 'name', 'unknown')), 0)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests the reading and merging of GRR timelines."""
+
+import gzip
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from grr_response_proto import timeline_pb2
+
+from dftimewolf.lib import grr_timeline
+
+
+def _BodyLine(path, mtime):
+  """Builds a line of a BODY timeline.
+
+  Args:
+    path (str): path of the entry.
+    mtime (int): modification time of the entry, in seconds.
+
+  Returns:
+    str: line of the timeline.
+  """
+  return '0|{0:s}|1|-rw-r--r--|0|0|10|{1:d}|{1:d}|{1:d}|0\n'.format(
+      path, mtime)
+
+
+class GRRTimelineTest(unittest.TestCase):
+  """Tests for the GRR timeline functions."""
+
+  def setUp(self):
+    self._directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self._directory)
+
+  def _WriteFile(self, name, data, mode='w'):
+    """Writes a file in the test directory.
+
+    Args:
+      name (str): name of the file.
+      data (str|bytes): data of the file.
+      mode (Optional[str]): mode to open the file with.
+
+    Returns:
+      str: path of the file.
+    """
+    path = os.path.join(self._directory, name)
+    with open(path, mode) as file_object:
+      file_object.write(data)
+    return path
+
+  def testGetTimelineFormat(self):
+    """Tests that timeline formats are determined from extensions."""
+    self.assertEqual(
+        grr_timeline.GetTimelineFormat('F:1.body'), grr_timeline.BODY_FORMAT)
+    self.assertEqual(
+        grr_timeline.GetTimelineFormat('F:1.raw'), grr_timeline.RAW_FORMAT)
+    self.assertIsNone(grr_timeline.GetTimelineFormat('F:1.zip'))
+
+  def testReadTimelineMalformed(self):
+    """Tests that malformed BODY timelines are rejected."""
+    path = self._WriteFile('F:1.body', '0|/etc|1|-rw-r--r--\n')
+    with self.assertRaises(ValueError):
+      list(grr_timeline.ReadTimeline(path, grr_timeline.BODY_FORMAT))
+
+  def testWriteTimeline(self):
+    """Tests that GRR timeline entries are written in both formats."""
+    entries = [
+        timeline_pb2.TimelineEntry(
+            path=b'/vmlinuz', mode=0o120777, size=30, ino=12, uid=0, gid=0,
+            atime_ns=1000000000, mtime_ns=2000000000, ctime_ns=3000000000),
+        timeline_pb2.TimelineEntry(
+            path=b'/a|b', mode=0o100644, size=10, ino=13, uid=1000, gid=100,
+            mtime_ns=5500000000)]
+    for timeline_format, name in (
+        (grr_timeline.BODY_FORMAT, 'C.1_root.body'),
+        (grr_timeline.RAW_FORMAT, 'C.1_root.raw')):
+      path = os.path.join(self._directory, name)
+      grr_timeline.WriteTimeline(entries, path, timeline_format)
+      read_entries = list(grr_timeline.ReadTimeline(path, timeline_format))
+      self.assertEqual(
+          [entry.path for entry in read_entries], ['/vmlinuz', '/a|b'])
+      self.assertEqual(read_entries[0].mode, 'lrwxrwxrwx')
+      self.assertEqual(read_entries[0].mtime, 2000000)
+      self.assertEqual(read_entries[1].uid, 1000)
+
+    with open(os.path.join(self._directory, 'C.1_root.body')) as file_object:
+      self.assertEqual(
+          file_object.read(),
+          '0|/vmlinuz|12|lrwxrwxrwx|0|0|30|1|2|3|0\n'
+          '0|"/a|b"|13|-rw-r--r--|1000|100|10|0|5|0|0\n')
+
+  def testMergeBodyTimelines(self):
+    """Tests that BODY timelines are merged by concatenation."""
+    first_path = self._WriteFile('F:1.body', ''.join([
+        _BodyLine('/etc/c', 30), _BodyLine('/etc/a', 10),
+        _BodyLine('/etc/e', 50)]).rstrip('\n'))
+    second_path = self._WriteFile('F:2.body', ''.join([
+        _BodyLine('"/var/b|x"', 20), _BodyLine('/var/d', 40)]))
+    output_path = os.path.join(self._directory, 'C.1.body')
+    grr_timeline.MergeTimelines(
+        [first_path, second_path], output_path, grr_timeline.BODY_FORMAT)
+
+    entries = list(grr_timeline.ReadTimeline(
+        output_path, grr_timeline.BODY_FORMAT))
+    self.assertEqual(
+        [entry.path for entry in entries],
+        ['/etc/c', '/etc/a', '/etc/e', '/var/b|x', '/var/d'])
+    self.assertEqual(entries[3].mtime, 20000000)
+    # Only the timelines and the merged timeline are left.
+    self.assertEqual(len(os.listdir(self._directory)), 3)
+
+  def testMergeRawTimelines(self):
+    """Tests that RAW timelines are merged by concatenation."""
+    paths = []
+    for name, mtimes in (('F:1.raw', [3, 1]), ('F:2.raw', [2])):
+      data = b''
+      for mtime in mtimes:
+        entry = timeline_pb2.TimelineEntry(
+            path='/{0:d}'.format(mtime).encode(), mtime_ns=mtime * 1000)
+        data += struct.pack('>Q', entry.ByteSize()) + entry.SerializeToString()
+      paths.append(self._WriteFile(name, gzip.compress(data), mode='wb'))
+    output_path = os.path.join(self._directory, 'C.1.raw')
+    grr_timeline.MergeTimelines(paths, output_path, grr_timeline.RAW_FORMAT)
+
+    entries = list(grr_timeline.ReadTimeline(
+        output_path, grr_timeline.RAW_FORMAT))
+    self.assertEqual([entry.path for entry in entries], ['/3', '/1', '/2'])
+    self.assertEqual([entry.mtime for entry in entries], [3, 1, 2])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests the logging formatters and pipeline."""
+
+import logging
+import unittest
+
+from dftimewolf.lib import logging_utils
+
+
+class _ListHandler(logging.Handler):
+  """Handler that keeps the formatted records."""
+
+  def __init__(self):
+    """Initializes the handler."""
+    super(_ListHandler, self).__init__()
+    self.messages = []
+
+  def emit(self, record):
+    """Keeps a formatted record."""
+    self.messages.append(self.format(record))
+
+
+class WolfFormatterTest(unittest.TestCase):
+  """Tests for the WolfFormatter class."""
+
+  def testFormat(self):
+    """Tests that records are colorized without being modified."""
+    formatter = logging_utils.WolfFormatter(
+        random_color=True, logger_colors={'dftimewolf': ''})
+    record = logging.makeLogRecord({
+        'args': ('world',), 'levelname': 'ERROR', 'msg': 'hello %s',
+        'name': 'TestModule'})
+
+    message = formatter.format(record)
+    self.assertIn(logging_utils.RED + 'hello world', message)
+    self.assertEqual(record.msg, 'hello %s')
+    # pylint: disable=protected-access
+    color = formatter._GetLoggerColor('TestModule')
+    self.assertIn(color, logging_utils.COLOR_SEQS)
+    self.assertIn(color + 'TestModule', message)
+
+    record.name = 'dftimewolf'
+    message = formatter.format(record)
+    self.assertIn(logging_utils.BOLD + 'dftimewolf', message)
+
+    uncolored_formatter = logging_utils.WolfFormatter(colorize=False)
+    self.assertNotIn(
+        logging_utils.RESET_SEQ, uncolored_formatter.format(record))
+
+
+class QueueListenerTest(unittest.TestCase):
+  """Tests for the queue-based logging pipeline."""
+
+  def testQueueListener(self):
+    """Tests that queued records are written by the listener's handlers."""
+    handler = _ListHandler()
+    handler.setFormatter(logging_utils.WolfFormatter(colorize=False))
+    logging_utils.StartQueueListener([handler])
+    self.addCleanup(logging_utils.StopQueueListener)
+
+    logger = logging.getLogger('QueueListenerTest')
+    logger.setLevel(logging.INFO)
+    logger.addHandler(logging_utils.GetQueueHandler())
+    self.addCleanup(logger.removeHandler, logging_utils.GetQueueHandler())
+    logger.info('queued %d', 1)
+
+    logging_utils.StopQueueListener()
+    self.assertEqual(len(handler.messages), 1)
+    self.assertIn('[QueueListenerTest', handler.messages[0])
+    self.assertIn('queued 1', handler.messages[0])
+
+
+if __name__ == '__main__':
+  unittest.main()
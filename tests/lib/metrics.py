@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests the module metrics."""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from dftimewolf.lib import metrics
+
+
+class MetricsCollectorTest(unittest.TestCase):
+  """Tests for the MetricsCollector class."""
+
+  def setUp(self):
+    """Creates a directory for the reports."""
+    self._directory = tempfile.mkdtemp()
+
+  def tearDown(self):
+    """Removes the directory for the reports."""
+    shutil.rmtree(self._directory)
+
+  def testMeasure(self):
+    """Tests that a module phase is measured."""
+    collector = metrics.MetricsCollector()
+    with collector.Measure('Module', 'Process'):
+      sum(range(10000))
+    collector.AddBlockedTime('Module', 'Process', 1.5)
+    collector.AddQueuedTime('Module', 'Process', 0.5)
+    collector.CountContainers('Module', 'Process', consumed=2, produced=3)
+
+    module_metrics = collector.GetMetrics()
+    self.assertEqual(len(module_metrics), 1)
+    self.assertEqual(module_metrics[0].module_name, 'Module')
+    self.assertGreater(module_metrics[0].wall_seconds, 0)
+    self.assertGreaterEqual(module_metrics[0].cpu_seconds, 0)
+    self.assertEqual(module_metrics[0].blocked_seconds, 1.5)
+    self.assertEqual(module_metrics[0].queued_seconds, 0.5)
+    self.assertEqual(module_metrics[0].containers_consumed, 2)
+    self.assertEqual(module_metrics[0].containers_produced, 3)
+
+  def testWriteJSON(self):
+    """Tests that metrics are written to a JSON report."""
+    collector = metrics.MetricsCollector()
+    collector.CountContainers('Module', 'SetUp', produced=1)
+    path = os.path.join(self._directory, 'metrics.json')
+    collector.WriteJSON(path, 'recipe')
+    with open(path) as file_object:
+      report = json.load(file_object)
+    self.assertEqual(report['recipe'], 'recipe')
+    self.assertEqual(report['modules'][0]['module_name'], 'Module')
+    self.assertEqual(report['modules'][0]['phase'], 'SetUp')
+    self.assertEqual(report['modules'][0]['containers_produced'], 1)
+
+  def testWritePrometheusTextfile(self):
+    """Tests that metrics are written in the Prometheus text format."""
+    collector = metrics.MetricsCollector()
+    collector.CountContainers('Module', 'Process', consumed=4)
+    path = os.path.join(self._directory, 'dftimewolf.prom')
+    collector.WritePrometheusTextfile(path, 'recipe')
+    with open(path) as file_object:
+      lines = file_object.read().splitlines()
+    self.assertIn(
+        '# TYPE dftimewolf_module_containers_consumed gauge', lines)
+    self.assertIn(
+        'dftimewolf_module_containers_consumed{recipe="recipe",'
+        'module="Module",phase="Process"} 4', lines)
+
+
+if __name__ == '__main__':
+  unittest.main()
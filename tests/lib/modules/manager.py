@@ -56,7 +56,29 @@ class ModulesManagerTest(unittest.TestCase):
     self.assertEqual(
         len(manager.ModulesManager._module_classes), number_of_module_classes)
 
-  # TODO: add tests for GetModuleByName
+  def testGetModuleByName(self):
+    """Tests the GetModuleByName function."""
+    manager.ModulesManager.RegisterModule(TestModule)
+    self.assertEqual(
+        manager.ModulesManager.GetModuleByName('TestModule'), TestModule)
+    self.assertIsNone(manager.ModulesManager.GetModuleByName('Unknown'))
+    manager.ModulesManager.DeregisterModule(TestModule)
+
+  def testGetModuleByNameImport(self):
+    """Tests that GetModuleByName imports registered Python modules."""
+    manager.ModulesManager.RegisterModuleImportPaths({
+        'FilesystemCollector': 'dftimewolf.lib.collectors.filesystem',
+        'MissingModule': 'dftimewolf.lib.collectors.missing'})
+    self.assertIn('MissingModule', manager.ModulesManager.GetModuleNames())
+
+    module_class = manager.ModulesManager.GetModuleByName(
+        'FilesystemCollector')
+    self.assertEqual(module_class.__name__, 'FilesystemCollector')
+    with self.assertRaises(ImportError):
+      manager.ModulesManager.GetModuleByName('MissingModule')
+
+    del manager.ModulesManager._module_import_paths['FilesystemCollector']
+    del manager.ModulesManager._module_import_paths['MissingModule']
 
   def testRegisterModules(self):
     """Tests the RegisterModules function."""
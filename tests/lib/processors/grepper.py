@@ -2,8 +2,13 @@
 # -*- coding: utf-8 -*-
 """Tests the activity_triage recipe and grepper processor."""
 
+import os
+import shutil
+import tempfile
 import unittest
 
+import mock
+
 from dftimewolf import config
 from dftimewolf.lib import state
 from dftimewolf.lib.containers import containers
@@ -37,3 +42,50 @@ class GrepperTest(unittest.TestCase):
         'tests/lib/collectors/test_data/grepper_test_dir/1test.pdf:homebrew\n'
         'tests/lib/collectors/test_data/grepper_test_dir/grepper_test.txt:bar,foo,lorem,triage\n'
         'tests/lib/collectors/test_data/grepper_test_dir/grepper_test2.txt:foo')
+
+  def testHardLinkedFiles(self):
+    """Tests that hard linked files are only searched once."""
+    directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, directory)
+    test_state = state.DFTimewolfState(config.Config)
+    base_grepper_search = grepper.GrepperSearch(test_state)
+    base_grepper_search.SetUp(keywords='foo|bar')
+    for host in ('host1', 'host2'):
+      os.makedirs(os.path.join(directory, host))
+      test_state.StoreContainer(containers.File(
+          name=host, path=os.path.join(directory, host)))
+    with open(os.path.join(directory, 'host1', 'test.txt'), 'w') as fp:
+      fp.write('foo bar baz\n')
+    os.link(os.path.join(directory, 'host1', 'test.txt'),
+            os.path.join(directory, 'host2', 'test.txt'))
+
+    with mock.patch.object(
+        base_grepper_search, '_GrepFile',
+        wraps=base_grepper_search._GrepFile) as mock_GrepFile:
+      base_grepper_search.Process()
+    self.assertEqual(mock_GrepFile.call_count, 1)
+    self.assertEqual(
+        base_grepper_search._final_output,
+        '{0:s}/host1/test.txt:bar,foo\n{0:s}/host2/test.txt:bar,foo'.format(
+            directory))
+
+  def testHardLinkedFilesParsers(self):
+    """Tests that hard linked files are searched once per parser."""
+    directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, directory)
+    test_state = state.DFTimewolfState(config.Config)
+    base_grepper_search = grepper.GrepperSearch(test_state)
+    base_grepper_search.SetUp(keywords='foo|bar')
+    test_state.StoreContainer(containers.File(name='host1', path=directory))
+    with open(os.path.join(directory, 'test.txt'), 'w') as fp:
+      fp.write('foo bar baz\n')
+    os.link(os.path.join(directory, 'test.txt'),
+            os.path.join(directory, 'test.pdf'))
+
+    with mock.patch.object(
+        base_grepper_search, 'GrepPDF', return_value={'foo'}) as mock_GrepPDF:
+      base_grepper_search.Process()
+    mock_GrepPDF.assert_called_once_with(os.path.join(directory, 'test.pdf'))
+    self.assertEqual(
+        base_grepper_search._final_output,
+        '{0:s}/test.pdf:foo\n{0:s}/test.txt:bar,foo'.format(directory))
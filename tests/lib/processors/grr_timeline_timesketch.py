@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests the GRR timeline Timesketch processor."""
+
+import gzip
+import json
+import os
+import shutil
+import stat
+import struct
+import tempfile
+import unittest
+
+from grr_response_proto import timeline_pb2
+
+from dftimewolf import config
+from dftimewolf.lib import state
+from dftimewolf.lib.containers import containers
+from dftimewolf.lib.processors import grr_timeline_timesketch
+
+
+# Timeline in BODY format, as GRR generates it.
+_BODY_TIMELINE = (
+    '0|/etc/passwd|1234|-rw-r--r--|0|0|2048|1600000300|1600000200|'
+    '1600000200|0\n'
+    '0|"/tmp/with|separator and ""quotes""\nand newline"|5678|drwxr-xr-x|'
+    '1000|1000|4096|1600000000|1600000000|1600000000|0\n')
+
+
+def _CreateRawTimeline(entries, entries_per_member=1):
+  """Creates a timeline in RAW format, as GRR generates it.
+
+  Args:
+    entries (list[timeline_pb2.TimelineEntry]): timeline entries.
+    entries_per_member (Optional[int]): number of entries per gzip member.
+
+  Returns:
+    bytes: timeline.
+  """
+  members = []
+  for index in range(0, len(entries), entries_per_member):
+    data = b''.join(
+        struct.pack('>Q', entry.ByteSize()) + entry.SerializeToString()
+        for entry in entries[index:index + entries_per_member])
+    members.append(gzip.compress(data))
+  return b''.join(members)
+
+
+class GRRTimelineTimesketchTest(unittest.TestCase):
+  """Tests for the GRR timeline Timesketch processor."""
+
+  def setUp(self):
+    self._directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self._directory)
+    self._state = state.DFTimewolfState(config.Config)
+    self._processor = grr_timeline_timesketch.GRRTimelineTimesketch(
+        self._state)
+    self._processor.SetUp()
+    # pylint: disable=protected-access
+    self.addCleanup(shutil.rmtree, self._processor._output_path)
+
+  def _StoreTimeline(self, name, data):
+    """Stores a timeline container.
+
+    Args:
+      name (str): name of the timeline file.
+      data (bytes): timeline.
+    """
+    path = os.path.join(self._directory, name)
+    with open(path, 'wb') as file_object:
+      file_object.write(data)
+    self._state.StoreContainer(containers.File('host.example.com', path))
+
+  def _ReadEvents(self):
+    """Reads the events of the JSONL file output by the processor.
+
+    Returns:
+      list[dict[str, object]]: events.
+    """
+    jsonl_containers = self._state.GetContainers(containers.File)
+    self.assertEqual(len(jsonl_containers), 1)
+    self.assertEqual(jsonl_containers[0].name, 'host.example.com')
+    self.assertTrue(jsonl_containers[0].path.endswith('.jsonl'))
+    with open(jsonl_containers[0].path, 'r') as jsonl_file:
+      return [json.loads(line) for line in jsonl_file]
+
+  def testInitialization(self):
+    """Tests that the processor can be initialized."""
+    self.assertIsNotNone(self._processor)
+
+  def testProcessBody(self):
+    """Tests that BODY timelines are converted into MACB events."""
+    self._StoreTimeline('F:12345678.body', _BODY_TIMELINE.encode('utf-8'))
+    self._processor.Process()
+
+    events = self._ReadEvents()
+    self.assertEqual(len(events), 3)
+    self.assertEqual(events[0], {
+        'message': '/etc/passwd',
+        'timestamp': 1600000200000000,
+        'datetime': '2020-09-13T12:30:00+00:00',
+        'timestamp_desc': 'Content Modification Time; '
+                          'Metadata Modification Time',
+        'macb': 'M.C.',
+        'data_type': 'fs:stat',
+        'filename': '/etc/passwd',
+        'inode': 1234,
+        'mode': '-rw-r--r--',
+        'uid': 0,
+        'gid': 0,
+        'size': 2048})
+    self.assertEqual(events[1]['macb'], '.A..')
+    self.assertEqual(events[1]['timestamp_desc'], 'Last Access Time')
+    self.assertEqual(
+        events[2]['filename'],
+        '/tmp/with|separator and "quotes"\nand newline')
+    self.assertEqual(events[2]['macb'], 'MAC.')
+
+  def testProcessRaw(self):
+    """Tests that RAW timelines are converted into MACB events."""
+    entries = [
+        timeline_pb2.TimelineEntry(
+            path=b'/bin/ls', mode=stat.S_IFREG | 0o755, size=1024, ino=42,
+            uid=0, gid=0, atime_ns=1600000000123456789,
+            mtime_ns=1500000000000000000, ctime_ns=1500000000000000000),
+        timeline_pb2.TimelineEntry(
+            path=b'/bin', mode=stat.S_IFDIR | 0o755, ino=43,
+            atime_ns=1600000000000000000, mtime_ns=1600000000000000000,
+            ctime_ns=1600000000000000000)]
+    self._StoreTimeline('F:12345678.raw', _CreateRawTimeline(entries))
+    self._processor.Process()
+
+    events = self._ReadEvents()
+    self.assertEqual(len(events), 3)
+    self.assertEqual(events[0]['macb'], 'M.C.')
+    self.assertEqual(events[0]['mode'], '-rwxr-xr-x')
+    self.assertEqual(events[1]['timestamp'], 1600000000123456)
+    self.assertEqual(
+        events[1]['datetime'], '2020-09-13T12:26:40.123456+00:00')
+    self.assertEqual(events[2]['filename'], '/bin')
+    self.assertEqual(events[2]['macb'], 'MAC.')
+
+  def testProcessCorruptedTimeline(self):
+    """Tests that corrupted timelines are reported and other files kept."""
+    entry = timeline_pb2.TimelineEntry(path=b'/bin/ls', mtime_ns=1)
+    self._StoreTimeline('F:12345678.raw', _CreateRawTimeline([entry])[:-30])
+    self._state.StoreContainer(containers.File('other', '/tmp/other.txt'))
+    self._processor.Process()
+
+    file_containers = self._state.GetContainers(containers.File)
+    self.assertEqual(len(file_containers), 1)
+    self.assertEqual(file_containers[0].path, '/tmp/other.txt')
+    self.assertEqual(len(self._state.errors), 1)
+    self.assertFalse(self._state.errors[0].critical)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests the rate limiting of requests."""
+
+import unittest
+
+import mock
+
+from dftimewolf.lib import rate_limit
+
+
+class TokenBucketTest(unittest.TestCase):
+  """Tests for the token bucket rate limiter."""
+
+  @mock.patch('time.sleep')
+  @mock.patch('time.monotonic')
+  def testAcquire(self, mock_monotonic, mock_sleep):
+    """Tests that tokens are taken within the rate."""
+    mock_monotonic.return_value = 100.0
+    bucket = rate_limit.TokenBucket(2)
+    self.assertEqual(bucket.Acquire(), 0)
+    self.assertEqual(bucket.Acquire(), 0)
+    mock_sleep.assert_not_called()
+
+    # The bucket is empty, the next callers wait in turn.
+    self.assertEqual(bucket.Acquire(), 0.5)
+    self.assertEqual(bucket.Acquire(), 1.0)
+    mock_sleep.assert_called_with(1.0)
+
+    # Tokens are added at the rate, up to the capacity.
+    mock_monotonic.return_value = 110.0
+    self.assertEqual(bucket.Acquire(), 0)
+    self.assertEqual(bucket.Acquire(), 0)
+    self.assertEqual(bucket.Acquire(), 0.5)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -3,6 +3,10 @@
 """Tests for the recipes manager."""
 
 import io
+import json
+import os
+import shutil
+import tempfile
 import unittest
 
 from dftimewolf.lib import resources
@@ -73,7 +77,43 @@ class RecipesManagerTest(unittest.TestCase):
     self.assertEqual(recipe.contents['modules'][0]['name'], 'TestModule')
     self.assertEqual(len(recipe.args), 1)
 
-  # TODO: add tests for ReadRecipesFromDirectory.
+  def testReadRecipesFromDirectoryWithIndex(self):
+    """Tests that ReadRecipesFromDirectory caches recipes in an index."""
+    directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, directory)
+    recipe_path = os.path.join(directory, 'test.json')
+    with io.open(recipe_path, 'w', encoding='utf-8') as file_object:
+      file_object.write(self._JSON)
+    index_path = os.path.join(directory, 'index', 'recipes.json')
+
+    test_manager = manager.RecipesManager()
+    test_manager.ReadRecipesFromDirectory(directory, index_path=index_path)
+    recipe = test_manager.GetRecipe('TEST')
+    self.assertEqual(recipe.description, 'test recipe')
+    test_manager.DeregisterRecipe(recipe)
+
+    with io.open(index_path, 'r', encoding='utf-8') as file_object:
+      index = json.load(file_object)
+    self.assertIn(recipe_path, index['recipes'])
+
+    # Unchanged recipe files are read from the index.
+    index['recipes'][recipe_path]['json_dict']['description'] = 'cached'
+    with io.open(index_path, 'w', encoding='utf-8') as file_object:
+      json.dump(index, file_object)
+    test_manager.ReadRecipesFromDirectory(directory, index_path=index_path)
+    recipe = test_manager.GetRecipe('test')
+    self.assertEqual(recipe.description, 'cached')
+    self.assertEqual(recipe.args, [['test', 'Test argument', None]])
+    test_manager.DeregisterRecipe(recipe)
+
+    # Modified recipe files are parsed again.
+    with io.open(recipe_path, 'w', encoding='utf-8') as file_object:
+      file_object.write(self._JSON.replace('test recipe', 'modified'))
+    os.utime(recipe_path, ns=(0, 0))
+    test_manager.ReadRecipesFromDirectory(directory, index_path=index_path)
+    recipe = test_manager.GetRecipe('test')
+    self.assertEqual(recipe.description, 'modified')
+    test_manager.DeregisterRecipe(recipe)
 
   def testRecipeRegistration(self):
     """Tests the RegisterRecipe and DeregisterRecipe functions."""
@@ -2,11 +2,15 @@
 # -*- coding: utf-8 -*-
 """Tests State."""
 
+import os
+import shutil
+import tempfile
 import unittest
 
 import mock
 
 from dftimewolf import config
+from dftimewolf.lib import errors
 from dftimewolf.lib import resources
 from dftimewolf.lib import state
 from dftimewolf.lib.containers import containers
@@ -69,6 +73,31 @@ class StateTest(unittest.TestCase):
     self.assertEqual(len(reports), 1)
     self.assertIsInstance(reports[0], containers.Report)
 
+  def testGetContainersByAttribute(self):
+    """Tests that containers can be retrieved by attribute value."""
+    test_state = state.DFTimewolfState(config.Config)
+    test_state.StoreContainer(containers.TicketAttribute(
+        type_='text', name='sketch', value='sketch/1/'))
+    test_state.StoreContainer(containers.TicketAttribute(
+        type_='text', name='other', value='asd'))
+    attributes = test_state.GetContainersByAttribute(
+        containers.TicketAttribute, 'name', 'sketch')
+    self.assertEqual(len(attributes), 1)
+    self.assertEqual(attributes[0].value, 'sketch/1/')
+
+  @mock.patch('time.time')
+  def testCacheExpiry(self, mock_time):
+    """Tests that cache entries added with a TTL expire."""
+    mock_time.return_value = 1000
+    test_state = state.DFTimewolfState(config.Config)
+    test_state.AddToCache('expiring', 'value', ttl=60)
+    test_state.AddToCache('permanent', 'value')
+    mock_time.return_value = 1059
+    self.assertEqual(test_state.GetFromCache('expiring'), 'value')
+    mock_time.return_value = 1061
+    self.assertIsNone(test_state.GetFromCache('expiring'))
+    self.assertEqual(test_state.GetFromCache('permanent'), 'value')
+
   @mock.patch('tests.test_modules.modules.DummyPreflightModule.Process')
   @mock.patch('tests.test_modules.modules.DummyPreflightModule.SetUp')
   def testProcessPreflightModules(self, mock_setup, mock_process):
@@ -125,6 +154,87 @@ class StateTest(unittest.TestCase):
                   error.message)
     self.assertTrue(error.critical)
 
+  @mock.patch('tests.test_modules.modules.DummyModule2.Process')
+  @mock.patch('tests.test_modules.modules.DummyModule1.Process')
+  def testProcessModulesLegacyScheduler(self, mock_process1, mock_process2):
+    """Tests that modules can still be run with one thread per module."""
+    test_state = state.DFTimewolfState(config.Config)
+    test_state.legacy_scheduler = True
+    test_state.command_line_options = {}
+    test_state.LoadRecipe(test_recipe.contents)
+    test_state.SetupModules()
+    test_state.RunModules()
+    mock_process1.assert_called_with()
+    mock_process2.assert_called_with()
+
+  def testModuleTimings(self):
+    """Tests that modules run after what they want and timings are kept."""
+    test_state = state.DFTimewolfState(config.Config)
+    test_state.max_workers = 1
+    test_state.command_line_options = {}
+    test_state.LoadRecipe(test_recipe.contents)
+    test_state.SetupModules()
+    test_state.RunModules()
+    timings = test_state.module_timings[state.PHASE_PROCESS]
+    self.assertEqual(
+        sorted(timings['DummyModule1']), ['finished', 'queued', 'started'])
+    self.assertLessEqual(
+        timings['DummyModule1']['finished'],
+        timings['DummyModule2']['queued'])
+    self.assertIn('DummyModule2', test_state.module_timings[state.PHASE_SETUP])
+
+  @mock.patch('tests.test_modules.modules.DummyModule1.Process')
+  def testModuleMetrics(self, mock_process1):
+    """Tests that module metrics are collected and written."""
+    run_directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, run_directory)
+
+    test_state = state.DFTimewolfState(config.Config)
+    test_state.run_directory = run_directory
+    test_state.command_line_options = {}
+    test_state.LoadRecipe(test_recipe.contents)
+    mock_process1.side_effect = lambda: test_state.StoreContainer(
+        containers.Report(module_name='DummyModule1', text='report'))
+    test_state.SetupModules()
+    test_state.RunModules()
+
+    module_metrics = {
+        (module_metrics.phase, module_metrics.module_name): module_metrics
+        for module_metrics in test_state.metrics.GetMetrics()}
+    process_metrics = module_metrics[(state.PHASE_PROCESS, 'DummyModule1')]
+    self.assertEqual(process_metrics.containers_produced, 1)
+    self.assertGreater(process_metrics.wall_seconds, 0)
+    self.assertIn((state.PHASE_SETUP, 'DummyModule2'), module_metrics)
+    self.assertTrue(os.path.isfile(
+        os.path.join(run_directory, state.METRICS_FILENAME)))
+    self.assertTrue(os.path.isfile(
+        os.path.join(run_directory, state.TRACE_FILENAME)))
+    span_names = [event['name'] for event in test_state.tracer.GetEvents()]
+    self.assertIn('DummyModule1', span_names)
+
+  def testSortModuleDefinitions(self):
+    """Tests that module definitions are sorted by dependencies."""
+    module_definitions = [
+        {'name': 'C', 'wants': ['A', 'B']},
+        {'name': 'A', 'wants': []},
+        {'name': 'B', 'wants': ['A']},
+        {'name': 'D', 'wants': []}]
+    sorted_definitions = state.DFTimewolfState.SortModuleDefinitions(
+        module_definitions)
+    self.assertEqual(
+        [definition['name'] for definition in sorted_definitions],
+        ['A', 'D', 'B', 'C'])
+
+  def testSortModuleDefinitionsErrors(self):
+    """Tests that unresolvable dependencies are reported."""
+    with self.assertRaises(errors.RecipeParseError):
+      state.DFTimewolfState.SortModuleDefinitions([
+          {'name': 'A', 'wants': ['B']},
+          {'name': 'B', 'wants': ['A']}])
+    with self.assertRaises(errors.RecipeParseError):
+      state.DFTimewolfState.SortModuleDefinitions([
+          {'name': 'A', 'wants': ['Unknown']}])
+
   @mock.patch('tests.test_modules.modules.DummyModule1.Callback')
   def testStreamingCallback(self, mock_callback):
     """Tests that registered callbacks are appropriately called."""
@@ -150,5 +260,117 @@ class StateTest(unittest.TestCase):
     test_state.StreamContainer(attributes)
     mock_callback.assert_not_called()
 
+  def testStreamingMode(self):
+    """Tests that stored containers are streamed in streaming mode."""
+    test_state = state.DFTimewolfState(config.Config)
+    test_state.streaming = True
+    test_state.command_line_options = {}
+    test_state.LoadRecipe(test_recipe.contents)
+    streamed = []
+    test_state.RegisterStreamingCallback(streamed.append, containers.Report)
+    test_state.SetupModules()
+    report = containers.Report(module_name='foo', text='bar')
+    test_state.StoreContainer(report)
+    test_state.RunModules()
+    self.assertEqual(streamed, [report])
+    self.assertEqual(test_state.GetContainers(containers.Report), [report])
+
+  @mock.patch('tests.test_modules.modules.DummyPreflightModule.Process')
+  @mock.patch('tests.test_modules.modules.DummyModule2.Process')
+  @mock.patch('tests.test_modules.modules.DummyModule1.Process')
+  @mock.patch('sys.exit')
+  def testCheckpointResume(
+      self, mock_exit, mock_process1, mock_process2, mock_preflight):
+    """Tests that a run can be resumed after its completed modules."""
+    run_directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, run_directory)
+
+    test_state = state.DFTimewolfState(config.Config)
+    test_state.run_directory = run_directory
+    test_state.command_line_options = {'foo': 'bar'}
+    test_state.LoadRecipe(test_recipe.contents)
+    test_state.AddToCache('cached', 'value')
+    mock_process1.side_effect = lambda: test_state.StoreContainer(
+        containers.Report(module_name='DummyModule1', text='report'))
+
+    def _FailAfterReport():
+      test_state.StoreContainer(
+          containers.Report(module_name='DummyModule2', text='partial'))
+      raise Exception('asd')
+
+    mock_process2.side_effect = _FailAfterReport
+    test_state.SetupModules()
+    test_state.RunModules()
+    mock_exit.assert_called_with(1)
+    self.assertTrue(os.path.isfile(
+        os.path.join(run_directory, state.CHECKPOINT_FILENAME)))
+    self.assertEqual(len(test_state.GetContainers(containers.Report)), 2)
+
+    mock_process1.reset_mock()
+    mock_process2.reset_mock()
+    mock_process2.side_effect = None
+    resumed_state = state.DFTimewolfState(config.Config)
+    resumed_state.LoadCheckpoint(run_directory)
+    self.assertEqual(resumed_state.recipe['name'], 'dummy_recipe')
+    self.assertEqual(resumed_state.command_line_options, {'foo': 'bar'})
+    self.assertEqual(resumed_state.GetFromCache('cached'), 'value')
+    resumed_state.RunPreflights()
+    resumed_state.SetupModules()
+    resumed_state.RunModules()
+    mock_preflight.assert_not_called()
+    mock_process1.assert_not_called()
+    mock_process2.assert_called_with()
+    reports = resumed_state.GetContainers(containers.Report)
+    self.assertEqual(len(reports), 1)
+    self.assertEqual(reports[0].text, 'report')
+
+  @mock.patch('tests.test_modules.modules.DummyModule2.Process')
+  @mock.patch('tests.test_modules.modules.DummyModule1.Process')
+  @mock.patch('sys.exit')
+  def testCheckpointSpilledContainers(
+      self, mock_exit, mock_process1, mock_process2):
+    """Tests that containers spilled to disk are checkpointed by copy."""
+    config.Config.LoadExtraData(
+        '{"container_store": "sqlite", "max_containers_in_memory": 2}')
+    self.addCleanup(config.Config.ClearExtra)
+    run_directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, run_directory)
+
+    test_state = state.DFTimewolfState(config.Config)
+    test_state.run_directory = run_directory
+    test_state.LoadRecipe(test_recipe.contents)
+
+    def _StoreReports():
+      for index in range(5):
+        test_state.StoreContainer(containers.Report(
+            module_name='DummyModule1', text='report{0:d}'.format(index)))
+
+    mock_process1.side_effect = _StoreReports
+    mock_process2.side_effect = Exception('asd')
+    test_state.SetupModules()
+    with mock.patch.object(test_state.store, 'Close') as mock_close:
+      test_state.RunModules()
+      mock_close.assert_called_once_with()
+    test_state.store.Close()
+    mock_exit.assert_called_with(1)
+    self.assertTrue(os.path.isfile(
+        os.path.join(run_directory, state.CHECKPOINT_CONTAINERS_FILENAME)))
+
+    config.Config.ClearExtra()
+    resumed_state = state.DFTimewolfState(config.Config)
+    resumed_state.LoadCheckpoint(run_directory)
+    self.assertEqual(
+        [report.text for report in resumed_state.GetContainers(
+            containers.Report)],
+        ['report0', 'report1', 'report2', 'report3', 'report4'])
+
+  def testLoadCheckpointError(self):
+    """Tests that a missing checkpoint raises an error."""
+    run_directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, run_directory)
+    test_state = state.DFTimewolfState(config.Config)
+    with self.assertRaises(errors.CheckpointError):
+      test_state.LoadCheckpoint(run_directory)
+
 if __name__ == '__main__':
   unittest.main()
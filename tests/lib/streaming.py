@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests the container streaming queues."""
+
+import threading
+import unittest
+
+from dftimewolf.lib import streaming
+from dftimewolf.lib.containers import containers
+
+
+class StreamConsumerTest(unittest.TestCase):
+  """Tests for the StreamConsumer class."""
+
+  def testConsumeUntilEndOfStream(self):
+    """Tests that containers are consumed until all producers have ended."""
+    consumed = []
+    consumer = streaming.StreamConsumer(
+        consumed.append, containers.Report, ['Producer1', 'Producer2'])
+    consumer.Start()
+    report = containers.Report(module_name='foo', text='bar')
+    self.assertTrue(consumer.Put(report))
+    consumer.EndOfStream('Producer1')
+    # Modules that the consumer does not wait for are ignored.
+    consumer.EndOfStream('Unrelated')
+    self.assertFalse(consumer.IsDone())
+    consumer.EndOfStream('Producer2')
+    consumer.Join()
+    self.assertEqual(consumed, [report])
+    self.assertFalse(consumer.Put(report))
+
+  def testNoProducers(self):
+    """Tests that a consumer without producers is done immediately."""
+    consumer = streaming.StreamConsumer(
+        lambda container: None, containers.Report, [])
+    consumer.Start()
+    self.assertTrue(consumer.IsDone())
+
+  def testBackpressure(self):
+    """Tests that producers are blocked while the queue is full."""
+    release_callback = threading.Event()
+    consumer = streaming.StreamConsumer(
+        lambda container: release_callback.wait(), containers.Report,
+        ['Producer'], queue_size=1)
+    consumer.Start()
+    report = containers.Report(module_name='foo', text='bar')
+    # The first container is being consumed, the second one fills the queue.
+    consumer.Put(report)
+    consumer.Put(report)
+    producer = threading.Thread(target=consumer.Put, args=(report, ))
+    producer.start()
+    producer.join(timeout=0.2)
+    self.assertTrue(producer.is_alive())
+    release_callback.set()
+    producer.join()
+    consumer.EndOfStream('Producer')
+    consumer.Join()
+
+  def testCallbackError(self):
+    """Tests that callback errors are reported and consumption continues."""
+    reported_errors = []
+    consumed = []
+
+    def _Callback(container):
+      if container.text == 'fail':
+        raise ValueError('asd')
+      consumed.append(container)
+
+    consumer = streaming.StreamConsumer(
+        _Callback, containers.Report, ['Producer'],
+        error_callback=lambda _, exception: reported_errors.append(exception))
+    consumer.Start()
+    consumer.Put(containers.Report(module_name='foo', text='fail'))
+    consumer.Put(containers.Report(module_name='foo', text='ok'))
+    consumer.Close()
+    consumer.Join()
+    self.assertEqual(len(reported_errors), 1)
+    self.assertEqual(len(consumed), 1)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests the execution spans."""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from dftimewolf.lib import tracing
+
+
+class _TracedModule(object):
+  """Object with a state and a traced method, like a module."""
+
+  def __init__(self, tracer):
+    """Initializes the object."""
+    self.state = type('State', (object,), {'tracer': tracer})
+
+  @tracing.TraceMethod(category='test')
+  def Method(self, value):
+    """Returns the value."""
+    return value
+
+
+class TracerTest(unittest.TestCase):
+  """Tests for the Tracer class."""
+
+  def testSpans(self):
+    """Tests that nested spans are recorded as complete events."""
+    tracer = tracing.Tracer()
+    with tracer.Span('outer', category='module', key='value'):
+      with tracer.Span('inner'):
+        pass
+    with self.assertRaises(ValueError):
+      with tracer.Span('failed'):
+        raise ValueError()
+
+    events = tracer.GetEvents()
+    self.assertEqual(events[0]['ph'], 'M')
+    self.assertEqual(events[0]['name'], 'thread_name')
+    inner, outer, failed = events[1:]
+    self.assertEqual(inner['name'], 'inner')
+    self.assertEqual(outer['cat'], 'module')
+    self.assertEqual(outer['args'], {'key': 'value'})
+    self.assertEqual(failed['args'], {'error': 'ValueError'})
+    self.assertLessEqual(outer['ts'], inner['ts'])
+    self.assertGreaterEqual(outer['dur'], inner['dur'])
+
+  def testTraceMethod(self):
+    """Tests that decorated methods are recorded by the state's tracer."""
+    tracer = tracing.Tracer()
+    self.assertEqual(_TracedModule(tracer).Method(1), 1)
+    event = tracer.GetEvents()[-1]
+    self.assertEqual(event['name'], '_TracedModule.Method')
+    self.assertEqual(event['cat'], 'test')
+
+  def testWrite(self):
+    """Tests that the trace is written in the Chrome trace event format."""
+    directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, directory)
+    tracer = tracing.Tracer()
+    with tracer.Span('span'):
+      pass
+    path = os.path.join(directory, 'trace.json')
+    tracer.Write(path)
+    with open(path) as file_object:
+      trace = json.load(file_object)
+    self.assertEqual(trace['traceEvents'][-1]['name'], 'span')
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests the extraction of ZIP archives from a stream of bytes."""
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from dftimewolf.lib import zip_stream
+
+
+class _UnseekableStream(io.RawIOBase):
+  """Writable stream that cannot seek, like a network stream."""
+
+  def __init__(self):
+    super(_UnseekableStream, self).__init__()
+    self.data = io.BytesIO()
+
+  def writable(self):
+    return True
+
+  def write(self, b):
+    return self.data.write(b)
+
+
+def _CreateArchive(files, compression, seekable=True, force_zip64=False):
+  """Creates a ZIP archive.
+
+  Args:
+    files (dict[str, bytes]): data of the files per name.
+    compression (int): compression method.
+    seekable (Optional[bool]): False to write the archive to an unseekable
+        stream, in which case entries are followed by data descriptors.
+    force_zip64 (Optional[bool]): True to write ZIP64 local headers.
+
+  Returns:
+    bytes: ZIP archive.
+  """
+  stream = io.BytesIO() if seekable else _UnseekableStream()
+  with zipfile.ZipFile(stream, 'w', compression) as archive:
+    for name, data in files.items():
+      zip_info = zipfile.ZipInfo(name)
+      zip_info.compress_type = compression
+      with archive.open(zip_info, 'w', force_zip64=force_zip64) as entry:
+        entry.write(data)
+  if seekable:
+    return stream.getvalue()
+  return stream.data.getvalue()
+
+
+def _Chunks(data, size=7):
+  """Splits data in chunks.
+
+  Args:
+    data (bytes): data to split.
+    size (Optional[int]): size of the chunks.
+
+  Returns:
+    list[bytes]: chunks.
+  """
+  return [data[offset:offset + size] for offset in range(0, len(data), size)]
+
+
+class ExtractZipStreamTest(unittest.TestCase):
+  """Tests for the ExtractZipStream function."""
+
+  _FILES = {
+      'dir/': b'',
+      'dir/first.txt': b'first file\n' * 100,
+      'dir/sub/second.bin': bytes(range(256)) * 10,
+      'empty': b''}
+
+  def setUp(self):
+    self._directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self._directory)
+
+  def _AssertExtracted(self, extracted_paths):
+    """Asserts that the test files were extracted.
+
+    Args:
+      extracted_paths (list[str]): paths of the extracted files.
+    """
+    expected_paths = []
+    for name, data in self._FILES.items():
+      path = os.path.join(self._directory, *name.rstrip('/').split('/'))
+      if name.endswith('/'):
+        self.assertTrue(os.path.isdir(path))
+        continue
+      expected_paths.append(path)
+      with open(path, 'rb') as file_object:
+        self.assertEqual(file_object.read(), data)
+    self.assertEqual(sorted(extracted_paths), sorted(expected_paths))
+
+  def testDeflatedWithDataDescriptors(self):
+    """Tests deflated entries of unknown sizes, as GRR generates them."""
+    archive = _CreateArchive(
+        self._FILES, zipfile.ZIP_DEFLATED, seekable=False)
+    self._AssertExtracted(
+        zip_stream.ExtractZipStream(_Chunks(archive), self._directory))
+
+  def testZip64(self):
+    """Tests entries with ZIP64 local headers and data descriptors."""
+    archive = _CreateArchive(
+        self._FILES, zipfile.ZIP_DEFLATED, seekable=False, force_zip64=True)
+    self._AssertExtracted(
+        zip_stream.ExtractZipStream(_Chunks(archive), self._directory))
+
+  def testStored(self):
+    """Tests stored entries of known sizes."""
+    archive = _CreateArchive(self._FILES, zipfile.ZIP_STORED)
+    self._AssertExtracted(
+        zip_stream.ExtractZipStream(_Chunks(archive), self._directory))
+
+  def testStoredWithDataDescriptors(self):
+    """Tests that stored entries of unknown sizes are rejected."""
+    archive = _CreateArchive(
+        self._FILES, zipfile.ZIP_STORED, seekable=False)
+    with self.assertRaises(zipfile.BadZipFile):
+      zip_stream.ExtractZipStream(_Chunks(archive), self._directory)
+
+  def testPathTraversal(self):
+    """Tests that entries are extracted within the output directory."""
+    archive = _CreateArchive(
+        {'../../outside': b'data', '/absolute': b'data'},
+        zipfile.ZIP_DEFLATED)
+    extracted_paths = zip_stream.ExtractZipStream(
+        _Chunks(archive), self._directory)
+    self.assertEqual(sorted(extracted_paths), [
+        os.path.join(self._directory, 'absolute'),
+        os.path.join(self._directory, 'outside')])
+
+  def testHardLinkedFiles(self):
+    """Tests that existing files are replaced, not their hard links."""
+    path = os.path.join(self._directory, 'empty')
+    link_path = os.path.join(self._directory, 'link')
+    with open(path, 'wb') as file_object:
+      file_object.write(b'linked')
+    os.link(path, link_path)
+
+    archive = _CreateArchive(self._FILES, zipfile.ZIP_DEFLATED)
+    self._AssertExtracted(
+        zip_stream.ExtractZipStream(_Chunks(archive), self._directory))
+    with open(link_path, 'rb') as file_object:
+      self.assertEqual(file_object.read(), b'linked')
+
+  def testCorrupted(self):
+    """Tests that corrupted and truncated archives are rejected."""
+    archive = _CreateArchive(
+        self._FILES, zipfile.ZIP_DEFLATED, seekable=False)
+    with self.assertRaises(zipfile.BadZipFile):
+      zip_stream.ExtractZipStream(_Chunks(archive[:200]), self._directory)
+
+    archive = _CreateArchive({'file': b'data'}, zipfile.ZIP_STORED)
+    # Changes the data of the file, so that it does not match its CRC-32.
+    archive = archive.replace(b'data', b'atad', 1)
+    with self.assertRaises(zipfile.BadZipFile):
+      zip_stream.ExtractZipStream(_Chunks(archive), self._directory)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Script to benchmark the startup time of dftimewolf for each recipe.
+
+For each recipe, compares the time it takes to import the CLI and the modules
+the recipe uses, with the time it takes to import the CLI and every module, as
+dftimewolf did before modules were imported on demand. Each measurement runs
+in a new Python interpreter, so that nothing is already imported.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Change PYTHONPATH to include dependencies.
+sys.path.insert(0, '.')
+
+# pylint: disable=wrong-import-position
+from dftimewolf.cli import dftimewolf_recipes
+
+
+# Modules whose dependencies are not installed are reported, not imported.
+_IMPORT_SCRIPT = '\n'.join([
+    'import json',
+    'import sys',
+    'import time',
+    'start_time = time.perf_counter()',
+    'from dftimewolf.cli import dftimewolf_recipes',
+    'from dftimewolf.lib.modules import manager',
+    'unavailable = []',
+    'for name in sys.argv[1:]:',
+    '  try:',
+    '    manager.ModulesManager.GetModuleByName(name)',
+    '  except ImportError:',
+    '    unavailable.append(name)',
+    'print(json.dumps([time.perf_counter() - start_time, unavailable]))'])
+
+
+def MeasureImportTime(module_names, repeat):
+  """Measures the time to import the CLI and modules in new interpreters.
+
+  Args:
+    module_names (list[str]): names of the modules to import.
+    repeat (int): number of measurements.
+
+  Returns:
+    tuple[float, list[str]]: median import time in seconds, and names of the
+        modules that could not be imported.
+  """
+  durations = []
+  unavailable = []
+  for _ in range(repeat):
+    output = subprocess.check_output(
+        [sys.executable, '-c', _IMPORT_SCRIPT] + module_names,
+        stderr=subprocess.DEVNULL)
+    duration, unavailable = json.loads(output)
+    durations.append(duration)
+  return statistics.median(durations), unavailable
+
+
+def ReadRecipes(recipes_path):
+  """Reads the names of the recipes and of the modules they use.
+
+  Args:
+    recipes_path (str): path of the directory containing the recipes.
+
+  Returns:
+    dict[str, list[str]]: names of the modules used, per recipe name.
+  """
+  recipes = {}
+  for filename in sorted(os.listdir(recipes_path)):
+    if not filename.endswith('.json'):
+      continue
+    with open(os.path.join(recipes_path, filename)) as file_object:
+      contents = json.load(file_object)
+    module_definitions = (
+        contents.get('modules', []) + contents.get('preflights', []))
+    recipes[contents['name']] = sorted(set(
+        module_definition['name'] for module_definition in module_definitions))
+  return recipes
+
+
+def _FormatDuration(duration):
+  """Formats a duration for the report.
+
+  Args:
+    duration (float): duration in seconds.
+
+  Returns:
+    str: duration in milliseconds.
+  """
+  return '{0:.0f} ms'.format(duration * 1000)
+
+
+def Main():
+  """Benchmarks the startup time for each recipe.
+
+  Returns:
+    bool: True if the benchmark was run.
+  """
+  argument_parser = argparse.ArgumentParser(description=__doc__)
+  argument_parser.add_argument(
+      '--recipes', default=os.path.join('data', 'recipes'),
+      help='Path of the directory containing the recipes.')
+  argument_parser.add_argument(
+      '--repeat', default=5, type=int,
+      help='Number of measurements per recipe.')
+  options = argument_parser.parse_args()
+
+  all_module_names = sorted(dftimewolf_recipes.MODULES)
+  eager_duration, unavailable = MeasureImportTime(
+      all_module_names, options.repeat)
+  print('Importing all modules: {0:s}'.format(
+      _FormatDuration(eager_duration)))
+  if unavailable:
+    print('Not imported, dependencies missing: {0:s}'.format(
+        ', '.join(unavailable)))
+
+  print('{0:<35s} {1:>10s} {2:>10s}'.format('Recipe', 'Startup', 'Speed-up'))
+  for recipe_name, module_names in ReadRecipes(options.recipes).items():
+    duration, _ = MeasureImportTime(module_names, options.repeat)
+    print('{0:<35s} {1:>10s} {2:>9.1f}x'.format(
+        recipe_name, _FormatDuration(duration), eager_duration / duration))
+
+  return True
+
+
+if __name__ == '__main__':
+  if not Main():
+    sys.exit(1)
+  else:
+    sys.exit(0)